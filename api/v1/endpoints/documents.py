@@ -1,27 +1,50 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
-from typing import List, Optional
+import asyncio
+import shutil
+import tempfile
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Response
+from typing import List, Optional, Union
 from api.v1.schemas.document import (
     DocumentUploadResponse, 
     DocumentProcessResponse,
+    IngestionJobResponse,
+    SearchRequest,
+    SearchResponse,
+    QueryResult,
+    RetrievedDocument,
     RAGQueryRequest,
     RAGQueryResponse,
     DocumentStatsResponse
 )
 from services.document_service import get_document_service, DocumentService
-from services.vector_store_service import get_vector_store_service, VectorStoreService
+from services.vector_store_service import get_vector_store_service, VectorStoreService, SearchOptions
+from services.ingestion_service import IngestionPipeline, FileProgress
+from services.job_service import get_job_manager, IngestionJobManager, IngestionJob
 # from services.rag_service import get_rag_service, RAGService
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
 
-@router.post("/upload", response_model=DocumentProcessResponse)
+async def _spool_upload(file: UploadFile) -> UploadFile:
+    """Copy an upload into a temp file owned by a background job (the request's file is closed on return)"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    await file.seek(0)
+    await asyncio.to_thread(shutil.copyfileobj, file.file, spooled)
+    spooled.seek(0)
+    return UploadFile(file=spooled, filename=file.filename, headers=file.headers)
+
+
+@router.post("/upload", response_model=Union[DocumentProcessResponse, IngestionJobResponse])
 async def upload_documents(
+    response: Response,
     files: List[UploadFile] = File(...),
     user_id: Optional[int] = Query(None, description="User ID to associate documents with"),
     chunk_size: Optional[int] = Query(None, description="Custom chunk size"),
     chunk_overlap: Optional[int] = Query(None, description="Custom chunk overlap"),
+    background: bool = Query(False, description="Process in the background and return a job id"),
+    dedupe: bool = Query(False, description="Skip unchanged re-uploads; otherwise only embed changed chunks and delete stale ones"),
     doc_service: DocumentService = Depends(get_document_service),
-    vector_service: VectorStoreService = Depends(get_vector_store_service)
+    vector_service: VectorStoreService = Depends(get_vector_store_service),
+    jobs: IngestionJobManager = Depends(get_job_manager)
 ):
     """
     Upload and process documents (PDF or TXT files)
@@ -30,68 +53,64 @@ async def upload_documents(
     - **user_id**: Optional user ID to associate documents with
     - **chunk_size**: Optional custom chunk size
     - **chunk_overlap**: Optional custom chunk overlap
+    - **background**: Return a job id immediately; poll `/documents/jobs/{job_id}` for status
+    - **dedupe**: Skip re-uploads of the same filename whose bytes are unchanged; otherwise diff them against stored chunk hashes
     """
     # Initialize document service with custom settings if provided
     if chunk_size or chunk_overlap:
         doc_service = DocumentService(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     
-    all_documents = []
-    results = []
-    successful = 0
-    failed = 0
+    pipeline = IngestionPipeline(doc_service, vector_service, dedupe=dedupe)
     
-    for file in files:
-        try:
-            # Validate file type
-            if file.content_type not in ["application/pdf", "text/plain"]:
-                results.append(DocumentUploadResponse(
-                    filename=file.filename,
-                    chunks=0,
-                    status="error",
-                    error=f"Unsupported file type: {file.content_type}"
-                ))
-                failed += 1
-                continue
-            
-            # Read file content
-            content = await file.read()
-            
-            # Process file
-            documents, chunk_count = doc_service.process_file(
-                content, 
-                file.filename, 
-                file.content_type,
-                user_id
-            )
-            
-            all_documents.extend(documents)
-            results.append(DocumentUploadResponse(
-                filename=file.filename,
-                chunks=chunk_count,
-                status="success"
-            ))
-            successful += 1
-            
-        except Exception as e:
-            results.append(DocumentUploadResponse(
-                filename=file.filename,
-                chunks=0,
-                status="error",
-                error=str(e)
+    if background:
+        spooled_files = [await _spool_upload(file) for file in files]
+        
+        async def run_job(job: IngestionJob):
+            await asyncio.gather(*(
+                pipeline.ingest_file(file, file.content_type, user_id, progress)
+                for file, progress in zip(spooled_files, job.files)
             ))
-            failed += 1
-    
-    # Add documents to vector store
-    total_chunks_added = 0
-    if all_documents:
+        
+        async def close_spooled_files():
+            for file in spooled_files:
+                await file.close()
+        
         try:
-            await vector_service.add_documents(all_documents)
-            total_chunks_added = len(all_documents)
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to add documents to vector store: {str(e)}"
+            job = jobs.submit(
+                [FileProgress(filename=file.filename) for file in files],
+                run_job,
+                user_id,
+                cleanup=close_spooled_files
             )
+        except asyncio.QueueFull:
+            await close_spooled_files()
+            raise HTTPException(status_code=503, detail="Ingestion queue is full, try again later")
+        
+        response.status_code = 202
+        return IngestionJobResponse(**job.to_dict())
+    
+    progresses = [FileProgress(filename=file.filename) for file in files]
+    
+    # Each file streams through the pipeline and commits its own chunks
+    await asyncio.gather(*(
+        pipeline.ingest_file(file, file.content_type, user_id, progress)
+        for file, progress in zip(files, progresses)
+    ))
+    
+    results = [
+        DocumentUploadResponse(
+            filename=progress.filename,
+            chunks=progress.chunks_added,
+            status=progress.status,
+            error=progress.error,
+            chunks_skipped=progress.chunks_skipped,
+            chunks_deleted=progress.chunks_deleted
+        )
+        for progress in progresses
+    ]
+    successful = sum(1 for progress in progresses if progress.status in ("success", "unchanged"))
+    failed = len(progresses) - successful
+    total_chunks_added = sum(progress.chunks_added for progress in progresses)
     
     return DocumentProcessResponse(
         total_files=len(files),
@@ -126,6 +145,68 @@ async def upload_documents(
 #         )
 
 
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(
+    job_id: str,
+    jobs: IngestionJobManager = Depends(get_job_manager)
+):
+    """
+    Get the status of a background ingestion job
+    
+    - **job_id**: Job id returned by `/documents/upload?background=true`
+    """
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return IngestionJobResponse(**job.to_dict())
+
+
+@router.post("/search", response_model=SearchResponse)
+async def search_documents(
+    request: SearchRequest,
+    vector_service: VectorStoreService = Depends(get_vector_store_service)
+):
+    """
+    Similarity search for one or more queries in a single batch
+    
+    - **queries**: Questions to retrieve context for
+    - **k**: Number of documents per query
+    - **user_id**: Optional user ID to filter documents
+    - **search_mode**: approximate, oversample or exact
+    """
+    filter_metadata = {"user_id": request.user_id} if request.user_id is not None else None
+    options = SearchOptions(
+        mode=request.search_mode,
+        ef_search=request.ef_search,
+        probes=request.probes,
+        max_distance=request.max_distance
+    )
+    
+    try:
+        results = await vector_service.similarity_search_many(
+            request.queries,
+            k=request.k,
+            filters=filter_metadata,
+            options=options
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error searching documents: {str(e)}"
+        )
+    
+    return SearchResponse(results=[
+        QueryResult(
+            query=query,
+            documents=[RetrievedDocument(content=doc.page_content, metadata=doc.metadata) for doc in documents]
+        )
+        for query, documents in zip(request.queries, results)
+    ])
+
+
 @router.get("/stats", response_model=DocumentStatsResponse)
 async def get_document_stats(
     user_id: Optional[int] = Query(None, description="User ID to filter stats"),
@@ -154,6 +235,17 @@ async def get_document_stats(
         )
 
 
+@router.get("/cache/stats")
+async def get_cache_stats(
+    vector_service: VectorStoreService = Depends(get_vector_store_service)
+):
+    """Get hit/miss counters for the vector store caches"""
+    return {
+        "embedding_cache": vector_service.embedding_cache.stats(),
+        "query_cache": vector_service.query_cache.stats()
+    }
+
+
 @router.delete("/clear")
 async def clear_documents(
     user_id: Optional[int] = Query(None, description="User ID to clear documents for (if not provided, clears all)"),
@@ -1,64 +1,222 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+import asyncio
 import asyncpg
-from langchain_core.messages import HumanMessage, AIMessage  # Updated import
+import json
+from typing import AsyncIterator, List, Optional
 from api.v1.schemas.message import MessageRequest, AIResponse
 from core.database import get_db_pool
-from services.agent_service import get_agent_service, AgentService
+from core.tracing import traced
+from services.agent_service import get_agent_service, AgentError, AgentService
+from services.history_service import history_service
+from services.tool_executor import ToolStepTimings
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
+INTERNAL_ERROR = {"code": "internal_error", "message": "Internal server error"}
 
-@router.post("/", response_model=AIResponse)
-async def send_message(
-    request: MessageRequest,
-    pool: asyncpg.Pool = Depends(get_db_pool),
-    agent: AgentService = Depends(get_agent_service)
-):
-    """Send a message and get AI response"""
+# Agent events buffered ahead of a slow client
+STREAM_BUFFER_EVENTS = 32
+
+
+@traced("messages.load_chat_history")
+async def load_chat_history(pool: asyncpg.Pool, session_id: Optional[int]) -> List:
+    """Build the token-budgeted agent chat history for a session"""
+    # Holds a connection only for the read; it goes back to the pool before the agent runs
+    return await history_service.load(pool, session_id)
+
+
+@traced("messages.save_exchange")
+async def save_exchange(
+    pool: asyncpg.Pool,
+    session_id: Optional[int],
+    user_id: int,
+    user_message: str,
+    ai_response: str
+) -> int:
+    """Create the session if needed and log both messages in one short transaction"""
     async with pool.acquire() as conn:
-        # Start a transaction
         async with conn.transaction():
-            session_id = request.session_id
             if session_id is None:
                 # Create a new session if one is not provided
                 session_id = await conn.fetchval(
                     "INSERT INTO sessions (user_id, start_time) VALUES ($1, CURRENT_TIMESTAMP) RETURNING session_id",
-                    request.user_id
+                    user_id
                 )
 
-            # Fetch recent messages for context
-            recent_messages = await conn.fetch(
+            rows = await conn.fetch(
                 """
-                SELECT sender, message_text FROM messages
-                WHERE session_id = $1
-                ORDER BY created_at DESC
-                LIMIT 10
+                INSERT INTO messages (session_id, sender, message_text)
+                VALUES ($1, 'User', $2), ($1, 'AI', $3)
+                RETURNING message_id, sender, message_text
                 """,
-                session_id
+                session_id, user_message, ai_response
             )
 
-            # Build chat history for the agent
-            chat_history = []
-            
-            # Add conversation history (in reverse order since we fetched DESC)
-            for message in reversed(recent_messages):
-                if message['sender'] == 'User':
-                    chat_history.append(HumanMessage(content=message['message_text']))
-                elif message['sender'] == 'AI':
-                    chat_history.append(AIMessage(content=message['message_text']))
-
-            # Get AI response using agent service
-            ai_response = await agent.get_response(request.message, chat_history)
-
-            # Log the conversation in the database
-            await conn.execute(
-                "INSERT INTO messages (session_id, sender, message_text) VALUES ($1, $2, $3)",
-                session_id, "User", request.message
-            )
-            await conn.execute(
-                "INSERT INTO messages (session_id, sender, message_text) VALUES ($1, $2, $3)",
-                session_id, "AI", ai_response
+    # Keep the hot-session history cache in step with the database
+    await history_service.record_exchange(session_id, sorted(rows, key=lambda row: row['message_id']))
+
+    # Fold older turns into the rolling summary once the session is long enough
+    history_service.schedule_summary_update(pool, session_id)
+    return session_id
+
+
+@router.get("/cache/stats")
+async def get_chat_cache_stats(agent: AgentService = Depends(get_agent_service)):
+    """Get hit rates of the session history and MCP tool-result caches, and tool execution totals"""
+    return {
+        "history": history_service.stats(),
+        "tool_cache": agent.tool_cache.stats(),
+        "tool_execution": agent.tool_executor.stats()
+    }
+
+
+@router.post("/", response_model=AIResponse)
+@traced("messages.send_message")
+async def send_message(
+    request: MessageRequest,
+    pool: asyncpg.Pool = Depends(get_db_pool),
+    agent: AgentService = Depends(get_agent_service)
+):
+    """
+    Send a message and get AI response
+    
+    A run that times out, exceeds its step budget or fails returns an error
+    status with {"code", "message"} and nothing is saved to the session.
+    """
+    # Read history with a short-lived connection
+    chat_history = await load_chat_history(pool, request.session_id)
+
+    # Get AI response using agent service (no pooled connection is held here)
+    timings = ToolStepTimings()
+    try:
+        ai_response = await agent.get_response(
+            request.message,
+            chat_history,
+            user_id=request.user_id,
+            session_id=request.session_id,
+            timings=timings
+        )
+    except AgentError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.to_dict())
+
+    # Log the conversation in the database
+    session_id = await save_exchange(
+        pool,
+        request.session_id,
+        request.user_id,
+        request.message,
+        ai_response
+    )
+
+    # Return the AI's response along with the current session_id for continuity
+    return AIResponse(ai_response=ai_response, session_id=session_id, tool_steps=timings.summary())
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _wait_for_disconnect(http_request: Request):
+    """Return once the client has gone away (the request body has already been read)"""
+    while (await http_request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _forward_events(stream: AsyncIterator[dict], events: asyncio.Queue):
+    """Consume an agent stream in its own task, queueing its events, then None or the error it raised"""
+    try:
+        async for event in stream:
+            await events.put(event)
+        await events.put(None)
+    except Exception as e:
+        await events.put(e)
+    finally:
+        await stream.aclose()
+
+
+@router.post("/stream")
+async def stream_message(
+    request: MessageRequest,
+    http_request: Request,
+    pool: asyncpg.Pool = Depends(get_db_pool),
+    agent: AgentService = Depends(get_agent_service)
+):
+    """
+    Send a message and stream the AI response as server-sent events
+    
+    Emits `token` events with content deltas, `tool_start`/`tool_end` events
+    around each tool call, and a final `done` event with the full reply and
+    session_id once the exchange has been saved. A failed run or save ends
+    with an `error` event ({"code", "message"}) and nothing is saved.
+    """
+    chat_history = await load_chat_history(pool, request.session_id)
+
+    async def event_stream():
+        stream = agent.stream_response(
+            request.message,
+            chat_history,
+            user_id=request.user_id,
+            session_id=request.session_id
+        )
+        events = asyncio.Queue(maxsize=STREAM_BUFFER_EVENTS)
+        # Both are tasks, so a client that leaves mid-step (say, during a long
+        # model call) cancels the agent run right away
+        run = asyncio.ensure_future(_forward_events(stream, events))
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(http_request))
+        next_event = None
+        ai_response = None
+        tool_steps = []
+        try:
+            while True:
+                next_event = asyncio.ensure_future(events.get())
+                await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_event.done():
+                    return
+                event = next_event.result()
+                if event is None:
+                    break
+                if isinstance(event, Exception):
+                    raise event
+                if event["event"] == "done":
+                    ai_response = event["data"]["content"]
+                    tool_steps = event["data"].get("tool_steps", [])
+                    break
+                yield _sse(event["event"], event["data"])
+        except AgentError as e:
+            yield _sse("error", e.to_dict())
+            return
+        except Exception as e:
+            # The response has started, so the client only learns of it through the stream
+            print(f"Warning: chat stream failed: {e}")
+            yield _sse("error", INTERNAL_ERROR)
+            return
+        finally:
+            pending = [task for task in (next_event, run, disconnected) if task is not None]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if ai_response is None:
+            return
+
+        try:
+            session_id = await save_exchange(
+                pool,
+                request.session_id,
+                request.user_id,
+                request.message,
+                ai_response
             )
+        except Exception as e:
+            print(f"Warning: could not save streamed chat exchange: {e}")
+            yield _sse("error", INTERNAL_ERROR)
+            return
+        yield _sse("done", {"ai_response": ai_response, "session_id": session_id, "tool_steps": tool_steps})
 
-            # Return the AI's response along with the current session_id for continuity
-            return AIResponse(ai_response=ai_response, session_id=session_id)
\ No newline at end of file
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,12 +1,17 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
+# Largest k a search request may ask for per query
+SEARCH_MAX_K = 100
+
 
 class DocumentUploadResponse(BaseModel):
     filename: str
     chunks: int
     status: str
     error: Optional[str] = None
+    chunks_skipped: int = 0
+    chunks_deleted: int = 0
 
 
 class DocumentProcessResponse(BaseModel):
@@ -17,6 +22,33 @@ class DocumentProcessResponse(BaseModel):
     total_chunks_added: int
 
 
+class IngestionFileStatus(BaseModel):
+    filename: str
+    status: str
+    file_id: Optional[str] = None
+    chunks_added: int = 0
+    chunks_skipped: int = 0
+    chunks_deleted: int = 0
+    pages_processed: int = 0
+    total_pages: Optional[int] = None
+    error: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    duration: Optional[float] = None
+
+
+class IngestionJobResponse(BaseModel):
+    job_id: str
+    user_id: Optional[int] = None
+    status: str
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    total_chunks_added: int
+    files: List[IngestionFileStatus]
+
+
 class RAGQueryRequest(BaseModel):
     question: str
     user_id: Optional[int] = None
@@ -27,6 +59,30 @@ class RAGQueryResponse(BaseModel):
     answer: str
 
 
+class SearchRequest(BaseModel):
+    queries: List[str]
+    k: int = Field(4, ge=1, le=SEARCH_MAX_K)
+    user_id: Optional[int] = None
+    search_mode: Optional[str] = None
+    ef_search: Optional[int] = None
+    probes: Optional[int] = None
+    max_distance: Optional[float] = None
+
+
+class RetrievedDocument(BaseModel):
+    content: str
+    metadata: dict
+
+
+class QueryResult(BaseModel):
+    query: str
+    documents: List[RetrievedDocument]
+
+
+class SearchResponse(BaseModel):
+    results: List[QueryResult]
+
+
 class DocumentStatsResponse(BaseModel):
     total_documents: int
     user_documents: Optional[int] = None
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -9,9 +9,24 @@ class MessageRequest(BaseModel):
     message: str
 
 
+class ToolCallTiming(BaseModel):
+    tool: str
+    status: str
+    ms: float
+
+
+class ToolStepTiming(BaseModel):
+    step: Optional[int] = None
+    calls: List[ToolCallTiming]
+    wall_ms: float
+    sequential_ms: float
+    saved_ms: float
+
+
 class AIResponse(BaseModel):
     ai_response: str
     session_id: Optional[int]
+    tool_steps: List[ToolStepTiming] = []
 
 
 class MessageHistory(BaseModel):
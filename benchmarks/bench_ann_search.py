@@ -0,0 +1,108 @@
+"""
+Recall and latency of similarity search modes against a NumPy brute-force baseline.
+
+Loads a random corpus into a scratch table with the configured ANN index
+(VECTOR_INDEX_TYPE), then runs the same queries in approximate mode across
+several ef_search / probes values, in oversample mode and in exact mode. Requires
+numpy. Run from the repository root:
+
+    python -m benchmarks.bench_ann_search --rows 20000 --queries 200 --k 10
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import numpy as np
+from config.settings import get_settings
+from core.database import vector_db
+from services.vector_store_service import SearchOptions, apply_search_settings
+
+settings = get_settings()
+
+TABLE_NAME = "bench_ann_search"
+
+
+def brute_force_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Exact cosine top-k ids (row index + 1 == id)"""
+    corpus_norm = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    query_norm = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    similarity = query_norm @ corpus_norm.T
+    return np.argsort(-similarity, axis=1)[:, :k] + 1
+
+
+async def run_mode(conn, queries: np.ndarray, truth: np.ndarray, k: int, options: SearchOptions) -> dict:
+    latencies = []
+    recalls = []
+    fetch_count = options.fetch_count(k)
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        async with conn.transaction():
+            await apply_search_settings(conn, options, fetch_count)
+            rows = await conn.fetch(
+                f"SELECT id, embedding <=> $1 AS distance FROM {TABLE_NAME} ORDER BY embedding <=> $1 LIMIT $2",
+                query.tolist(),
+                fetch_count
+            )
+        ids = [row['id'] for row in sorted(rows, key=lambda row: row['distance'])[:k]]
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(set(ids) & set(expected.tolist())) / k)
+
+    latencies.sort()
+    return {
+        "mode": options.mode,
+        "ef_search": options.ef_search,
+        "probes": options.probes,
+        "recall": round(statistics.mean(recalls), 4),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "qps": round(len(latencies) / (sum(latencies) / 1000), 1)
+    }
+
+
+async def main(rows: int, queries_count: int, dim: int, k: int):
+    rng = np.random.default_rng(42)
+    corpus = rng.standard_normal((rows, dim), dtype=np.float32)
+    queries = rng.standard_normal((queries_count, dim), dtype=np.float32)
+    truth = brute_force_top_k(corpus, queries, k)
+
+    if settings.VECTOR_INDEX_TYPE == "ivfflat":
+        index = f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = {settings.IVFFLAT_LISTS})"
+        sweep = [SearchOptions(mode="approximate", probes=probes) for probes in (1, 5, 10, 20)]
+    else:
+        index = f"USING hnsw (embedding vector_cosine_ops) WITH (m = {settings.HNSW_M}, ef_construction = {settings.HNSW_EF_CONSTRUCTION})"
+        sweep = [SearchOptions(mode="approximate", ef_search=ef) for ef in (20, 40, 100, 200)]
+    sweep += [SearchOptions(mode="oversample"), SearchOptions(mode="exact")]
+
+    await vector_db.connect()
+    results = {"rows": rows, "queries": queries_count, "dimension": dim, "k": k, "index": settings.VECTOR_INDEX_TYPE, "modes": []}
+    try:
+        async with vector_db.get_pool().acquire() as conn:
+            await conn.execute(f"DROP TABLE IF EXISTS {TABLE_NAME}")
+            await conn.execute(f"CREATE TABLE {TABLE_NAME} (id bigint PRIMARY KEY, embedding vector({dim}))")
+            await conn.copy_records_to_table(
+                TABLE_NAME,
+                records=[(idx + 1, vector.tolist()) for idx, vector in enumerate(corpus)],
+                columns=["id", "embedding"]
+            )
+            await conn.execute(f"CREATE INDEX ON {TABLE_NAME} {index}")
+            await conn.execute(f"ANALYZE {TABLE_NAME}")
+
+            for options in sweep:
+                results["modes"].append(await run_mode(conn, queries, truth, k, options.resolve()))
+
+            await conn.execute(f"DROP TABLE {TABLE_NAME}")
+    finally:
+        await vector_db.disconnect()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIMENSION)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.queries, args.dim, args.k))
@@ -0,0 +1,72 @@
+"""
+Chat throughput and latency percentiles at N concurrent sessions.
+
+Runs the app against the configured Postgres with a fake LLM, fake embedder
+and fake MCP server (see benchmarks.fakes). Every session sends --turns
+messages one after another; sessions run concurrently. Run from the
+repository root:
+
+    python -m benchmarks.bench_chat --sessions 1,8,32 --turns 5
+"""
+import argparse
+import asyncio
+import time
+from config.settings import get_settings
+from benchmarks.harness import bench_app, create_bench_user, delete_bench_users, latency_summary, write_results
+
+settings = get_settings()
+
+
+async def run_session(client, user_id: int, turns: int, latencies: list, errors: list):
+    session_id = None
+    for turn in range(turns):
+        start = time.perf_counter()
+        response = await client.post(
+            f"{settings.API_V1_PREFIX}/messages/",
+            json={"user_id": user_id, "session_id": session_id, "message": f"Show my orders and promotions ({turn})"}
+        )
+        if response.status_code != 200:
+            errors.append(response.status_code)
+            continue
+        latencies.append(time.perf_counter() - start)
+        session_id = response.json()["session_id"]
+
+
+async def run_level(client, sessions: int, turns: int) -> dict:
+    user_ids = [await create_bench_user(client, "chat") for _ in range(sessions)]
+    latencies, errors = [], []
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_session(client, user_id, turns, latencies, errors) for user_id in user_ids))
+        elapsed = time.perf_counter() - start
+    finally:
+        await delete_bench_users(user_ids)
+
+    return {
+        "sessions": sessions,
+        "requests": len(latencies) + len(errors),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 2),
+        **latency_summary(latencies)
+    }
+
+
+async def main(args):
+    levels = [int(value) for value in args.sessions.split(",")]
+    results = []
+    async with bench_app(llm_latency=args.llm_latency, tool_latency=args.tool_latency, mcp_port=args.mcp_port) as client:
+        for sessions in levels:
+            results.append(await run_level(client, sessions, args.turns))
+    write_results("chat", vars(args), {"levels": results}, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", default="1,8,32", help="Comma-separated concurrent session counts")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--tool-latency", type=float, default=0.1)
+    parser.add_argument("--mcp-port", type=int, default=8765)
+    parser.add_argument("--output", default=None, help="JSON output path")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,107 @@
+"""
+Upload ingest rate (MB/s and chunks/s) through POST /documents/upload.
+
+Generates text files (and, with --pdf, PDFs built with PyMuPDF) and uploads
+them against the configured Postgres with a fake embedder. Run from the
+repository root:
+
+    python -m benchmarks.bench_ingest --files 8 --size-kb 512 --concurrency 4
+"""
+import argparse
+import asyncio
+import random
+import time
+import fitz  # PyMuPDF
+from config.settings import get_settings
+from benchmarks.harness import bench_app, create_bench_user, delete_bench_users, latency_summary, write_results
+
+settings = get_settings()
+
+WORDS = (
+    "order product merchant promotion discount delivery return refund warranty catalog "
+    "price stock customer invoice payment shipping size color material policy"
+).split()
+
+
+def make_text(size_bytes: int, seed: int) -> str:
+    rng = random.Random(seed)
+    parts, total = [], 0
+    while total < size_bytes:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + ". "
+        if rng.random() < 0.1:
+            sentence += "\n\n"
+        parts.append(sentence)
+        total += len(sentence)
+    return "".join(parts)
+
+
+def make_pdf(text: str) -> bytes:
+    doc = fitz.open()
+    lines_per_page = 50
+    lines = [text[i:i + 90] for i in range(0, len(text), 90)]
+    for start in range(0, len(lines), lines_per_page):
+        page = doc.new_page()
+        page.insert_text((40, 40), "\n".join(lines[start:start + lines_per_page]), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+async def main(args):
+    files = []
+    for idx in range(args.files):
+        text = make_text(args.size_kb * 1024, idx)
+        if args.pdf:
+            files.append((f"bench-{idx}.pdf", make_pdf(text), "application/pdf"))
+        else:
+            files.append((f"bench-{idx}.txt", text.encode("utf-8"), "text/plain"))
+    total_bytes = sum(len(content) for _, content, _ in files)
+
+    async with bench_app(embed_latency=args.embed_latency, use_mcp=False) as client:
+        user_id = await create_bench_user(client, "ingest")
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies, chunks = [], []
+
+        async def upload(name: str, content: bytes, content_type: str):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    f"{settings.API_V1_PREFIX}/documents/upload",
+                    params={"user_id": user_id},
+                    files=[("files", (name, content, content_type))]
+                )
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+                body = response.json()
+                if body["failed"]:
+                    raise RuntimeError(f"Upload of {name} failed: {body['results']}")
+                chunks.append(body["total_chunks_added"])
+
+        try:
+            start = time.perf_counter()
+            await asyncio.gather(*(upload(*file) for file in files))
+            elapsed = time.perf_counter() - start
+        finally:
+            await delete_bench_users([user_id])
+
+    results = {
+        "files": len(files),
+        "megabytes": round(total_bytes / 1e6, 3),
+        "chunks": sum(chunks),
+        "seconds": round(elapsed, 3),
+        "mb_per_second": round(total_bytes / 1e6 / elapsed, 3),
+        "chunks_per_second": round(sum(chunks) / elapsed, 1),
+        "per_file": latency_summary(latencies)
+    }
+    write_results("ingest", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--size-kb", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pdf", action="store_true", help="Upload PDFs instead of text files")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Fake embedder latency per batch call")
+    parser.add_argument("--output", default=None, help="JSON output path")
+    asyncio.run(main(parser.parse_args()))
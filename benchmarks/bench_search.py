@@ -0,0 +1,95 @@
+"""
+similarity_search QPS and latency versus corpus size.
+
+Grows a benchmark user's corpus through VectorStoreService.add_documents
+(fake embedder, configured Postgres/pgvector and index) and, at each size,
+runs concurrent similarity_search calls with unique queries so the query
+cache never hits. Run from the repository root:
+
+    python -m benchmarks.bench_search --sizes 1000,10000,50000 --queries 500 --concurrency 16
+"""
+import argparse
+import asyncio
+import time
+from uuid import uuid4
+from langchain_core.documents import Document
+from config.settings import get_settings
+from benchmarks.bench_ingest import make_text
+from benchmarks.harness import bench_app, create_bench_user, delete_bench_users, latency_summary, write_results
+
+settings = get_settings()
+
+LOAD_BATCH_SIZE = 1000
+
+
+async def grow_corpus(vector_service, user_id: int, start: int, end: int):
+    file_id = str(uuid4())
+    for batch_start in range(start, end, LOAD_BATCH_SIZE):
+        batch_end = min(batch_start + LOAD_BATCH_SIZE, end)
+        await vector_service.add_documents([
+            Document(
+                page_content=make_text(600, idx),
+                metadata={"source": "bench-search.txt", "file_id": file_id, "chunk_index": idx, "user_id": user_id}
+            )
+            for idx in range(batch_start, batch_end)
+        ])
+
+
+async def measure(vector_service, user_id: int, queries: int, concurrency: int, k: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def search(idx: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await vector_service.similarity_search(
+                f"{make_text(80, -idx - 1)} {uuid4().hex}",
+                k=k,
+                filter_metadata={"user_id": user_id}
+            )
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(search(idx) for idx in range(queries)))
+    elapsed = time.perf_counter() - start
+    return {"qps": round(queries / elapsed, 1), **latency_summary(latencies)}
+
+
+async def main(args):
+    from services.vector_store_service import vector_store_service
+
+    sizes = sorted(int(value) for value in args.sizes.split(","))
+    results = []
+    async with bench_app(embed_latency=0.0, use_mcp=False) as client:
+        user_id = await create_bench_user(client, "search")
+        try:
+            loaded = 0
+            for size in sizes:
+                start = time.perf_counter()
+                await grow_corpus(vector_store_service, user_id, loaded, size)
+                load_seconds = time.perf_counter() - start
+                loaded = size
+                results.append({
+                    "corpus_size": size,
+                    "load_seconds": round(load_seconds, 2),
+                    **await measure(vector_store_service, user_id, args.queries, args.concurrency, args.k)
+                })
+        finally:
+            await delete_bench_users([user_id])
+
+    write_results(
+        "search",
+        {**vars(args), "index_type": settings.VECTOR_INDEX_TYPE, "search_mode": settings.VECTOR_SEARCH_MODE},
+        {"sizes": results},
+        args.output
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated corpus sizes")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--output", default=None, help="JSON output path")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""
+Cold-start time: importing main in a fresh interpreter, and optionally the lifespan.
+
+Each run imports main in a new subprocess and reports the import time
+together with any heavy module that was imported eagerly. Exits non-zero if
+the median import time exceeds --budget-ms or a deferred module was loaded, so
+it can gate CI. --lifespan also times the app startup against the configured
+Postgres with the local stand-ins. Run from the repository root:
+
+    python -m benchmarks.bench_startup --runs 5 --budget-ms 2000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+from benchmarks.harness import write_results
+
+# Import time of main with the deferred modules left out is ~1.4s on a laptop,
+# ~2.6s when they are imported eagerly
+IMPORT_BUDGET_MS = 2000
+
+# Modules that must only be imported on first use, not when main is imported
+DEFERRED_MODULES = (
+    "langchain_google_genai",
+    "langchain_groq",
+    "langgraph.prebuilt",
+    "langchain_mcp_adapters",
+    "fitz",
+    "langchain_text_splitters",
+)
+
+IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "eager": [name for name in {DEFERRED_MODULES!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import() -> dict:
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_PROBE], text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(limit: int = 15) -> list:
+    """Top modules by cumulative import time (python -X importtime)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True,
+        text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative), name.strip()))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in rows[:limit]]
+
+
+async def measure_lifespan() -> float:
+    from benchmarks.harness import bench_app
+
+    started = time.perf_counter()
+    async with bench_app(llm_latency=0.0, tool_latency=0.0):
+        elapsed = time.perf_counter() - started
+    return elapsed
+
+
+def main(args):
+    runs = [measure_import() for _ in range(args.runs)]
+    import_ms = [run["seconds"] * 1000 for run in runs]
+    eager = sorted({name for run in runs for name in run["eager"]})
+    results = {
+        "import_main_ms": {
+            "min": round(min(import_ms), 1),
+            "median": round(statistics.median(import_ms), 1),
+            "max": round(max(import_ms), 1)
+        },
+        "budget_ms": args.budget_ms,
+        "eager_deferred_modules": eager,
+        "slowest_imports": slowest_imports()
+    }
+    if args.lifespan:
+        results["lifespan_seconds"] = round(asyncio.run(measure_lifespan()), 3)
+
+    write_results("startup", vars(args), results, args.output)
+
+    failures = []
+    if results["import_main_ms"]["median"] > args.budget_ms:
+        failures.append(f"median import time {results['import_main_ms']['median']}ms exceeds budget {args.budget_ms}ms")
+    if eager:
+        failures.append(f"deferred modules imported eagerly: {', '.join(eager)}")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--lifespan", action="store_true", help="Also time the app lifespan (needs Postgres)")
+    parser.add_argument("--output", default=None, help="JSON output path")
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+"""
+Compare per-row INSERT against binary COPY for vector ingestion.
+
+Uses the configured vector database (see .env) and a scratch table that is
+dropped afterwards. Run from the repository root:
+
+    python -m benchmarks.bench_vector_ingest --rows 5000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from config.settings import get_settings
+from core.database import vector_db
+
+settings = get_settings()
+
+TABLE_NAME = "bench_vector_ingest"
+
+
+def make_records(rows: int, dim: int):
+    records = []
+    for idx in range(rows):
+        metadata = {"source": "bench.pdf", "chunk_index": idx, "user_id": 1}
+        embedding = [random.random() for _ in range(dim)]
+        records.append((f"chunk {idx} " + "lorem ipsum " * 150, metadata, embedding))
+    return records
+
+
+async def insert_loop(conn, records):
+    """The previous ingestion path: one INSERT per row with a text vector literal"""
+    async with conn.transaction():
+        for text, metadata, embedding in records:
+            embedding_str = '[' + ','.join(map(str, embedding)) + ']'
+            await conn.execute(
+                f"INSERT INTO {TABLE_NAME} (content, metadata, embedding) VALUES ($1, $2::jsonb, $3::text::vector)",
+                text,
+                metadata,
+                embedding_str
+            )
+
+
+async def insert_copy(conn, records):
+    """The current ingestion path used by VectorStoreService.add_documents"""
+    async with conn.transaction():
+        await conn.copy_records_to_table(
+            TABLE_NAME,
+            records=records,
+            columns=["content", "metadata", "embedding"]
+        )
+
+
+async def main(rows: int, dim: int):
+    await vector_db.connect()
+    pool = vector_db.get_pool()
+    records = make_records(rows, dim)
+    results = {"rows": rows, "dimension": dim}
+
+    try:
+        async with pool.acquire() as conn:
+            await conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLE_NAME} "
+                f"(id bigserial PRIMARY KEY, content text, metadata jsonb, embedding vector({dim}))"
+            )
+
+            for name, insert in (("insert_loop", insert_loop), ("copy", insert_copy)):
+                await conn.execute(f"TRUNCATE {TABLE_NAME}")
+                start = time.perf_counter()
+                await insert(conn, records)
+                elapsed = time.perf_counter() - start
+                results[name] = {"seconds": round(elapsed, 3), "rows_per_second": round(rows / elapsed, 1)}
+
+            await conn.execute(f"DROP TABLE {TABLE_NAME}")
+    finally:
+        await vector_db.disconnect()
+
+    results["speedup"] = round(results["copy"]["rows_per_second"] / results["insert_loop"]["rows_per_second"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIMENSION)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.dim))
@@ -0,0 +1,192 @@
+"""
+Chat throughput scaling across gunicorn worker processes.
+
+Starts `gunicorn benchmarks.fake_app:app -c gunicorn.conf.py` for each worker
+count (fake LLM and embedder, fake MCP server in a separate process, the
+configured Postgres), drives it over HTTP with --concurrency sessions for
+--duration seconds, and reports requests per second and the scaling
+efficiency relative to one worker (rps_n / (n * rps_1)). Run from the
+repository root:
+
+    python -m benchmarks.bench_workers --workers 1,2,4 --concurrency 64
+
+Keep the fake latencies low and --llm-cpu-time above zero so a worker is CPU
+bound; otherwise a single event loop keeps up with the load and extra workers
+have nothing to add. The load generator runs in this process, so on small
+machines it can become the bottleneck before the workers do.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+import httpx
+from config.settings import get_settings
+from benchmarks.fakes import serve_fake_mcp
+from benchmarks.harness import delete_bench_users, latency_summary, write_results
+
+settings = get_settings()
+
+
+def run_fake_mcp(port: int, latency: float):
+    async def serve():
+        async with serve_fake_mcp(port, latency):
+            await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def start_server(args, workers: int, mcp_url: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "BIND": f"127.0.0.1:{args.port}",
+        "MCP_SERVER_URL": mcp_url,
+        "SHARED_STATE_BACKEND": args.shared_state,
+        "BENCH_LLM_LATENCY": str(args.llm_latency),
+        "BENCH_LLM_CPU_TIME": str(args.llm_cpu_time),
+        "TRACING_ENABLED": "false"
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "benchmarks.fake_app:app", "-c", "gunicorn.conf.py"],
+        env=env
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, server: subprocess.Popen, workers: int, timeout: float = 120.0):
+    """Wait until the server answers /health"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {server.returncode}")
+        try:
+            response = await client.get("/health")
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"{workers} worker(s) did not become ready in {timeout:.0f}s")
+
+
+def stop_server(server: subprocess.Popen):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def run_session(client: httpx.AsyncClient, user_id: int, deadline: float, latencies: list, errors: list):
+    session_id = None
+    turn = 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.post(
+                f"{settings.API_V1_PREFIX}/messages/",
+                json={"user_id": user_id, "session_id": session_id, "message": f"Show my orders and promotions ({turn})"}
+            )
+        except httpx.TransportError as e:
+            errors.append(type(e).__name__)
+            continue
+        turn += 1
+        if response.status_code != 200:
+            errors.append(response.status_code)
+            continue
+        latencies.append(time.perf_counter() - start)
+        session_id = response.json()["session_id"]
+
+
+async def run_level(args, workers: int, mcp_url: str, user_ids: list) -> dict:
+    server = start_server(args, workers, mcp_url)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None, limits=limits) as client:
+            await wait_ready(client, server, workers)
+            for _ in range(args.concurrency - len(user_ids)):
+                response = await client.post(
+                    f"{settings.API_V1_PREFIX}/users/",
+                    json={"username": f"bench-workers-{os.urandom(4).hex()}"}
+                )
+                response.raise_for_status()
+                user_ids.append(response.json()["user_id"])
+
+            # Warm every worker (agent graph, pools) before measuring
+            warmup_deadline = time.monotonic() + args.warmup
+            await asyncio.gather(*(run_session(client, user_id, warmup_deadline, [], []) for user_id in user_ids))
+
+            latencies, errors = [], []
+            start = time.perf_counter()
+            deadline = time.monotonic() + args.duration
+            await asyncio.gather(*(run_session(client, user_id, deadline, latencies, errors) for user_id in user_ids))
+            elapsed = time.perf_counter() - start
+    finally:
+        stop_server(server)
+
+    return {
+        "workers": workers,
+        "requests": len(latencies) + len(errors),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 2),
+        **latency_summary(latencies)
+    }
+
+
+async def cleanup(user_ids: list):
+    from core.database import db
+
+    await db.connect()
+    try:
+        await delete_bench_users(user_ids, documents=False)
+    finally:
+        await db.disconnect()
+
+
+async def main(args):
+    from models.models import run_migrations
+
+    levels = [int(value) for value in args.workers.split(",")]
+    await run_migrations()
+    mcp = multiprocessing.Process(target=run_fake_mcp, args=(args.mcp_port, args.tool_latency), daemon=True)
+    mcp.start()
+    mcp_url = f"http://127.0.0.1:{args.mcp_port}/mcp"
+    user_ids: list = []
+    results = []
+    try:
+        for workers in levels:
+            results.append(await run_level(args, workers, mcp_url, user_ids))
+    finally:
+        mcp.terminate()
+        mcp.join()
+        if user_ids:
+            await cleanup(user_ids)
+
+    baseline = next((level for level in results if level["workers"] == 1), None)
+    if baseline and baseline["requests_per_second"]:
+        for level in results:
+            speedup = level["requests_per_second"] / baseline["requests_per_second"]
+            level["speedup"] = round(speedup, 2)
+            level["scaling_efficiency"] = round(speedup / level["workers"], 3)
+    write_results("workers", vars(args), {"levels": results}, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent chat sessions")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--llm-latency", type=float, default=0.01)
+    parser.add_argument("--llm-cpu-time", type=float, default=0.005)
+    parser.add_argument("--tool-latency", type=float, default=0.01)
+    parser.add_argument("--shared-state", default="postgres", choices=["memory", "postgres"])
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--mcp-port", type=int, default=8766)
+    parser.add_argument("--output", default=None, help="JSON output path")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+"""
+Compare two benchmark result files written by the benchmarks in this package.
+
+Prints every numeric result side by side with the relative change. Run from
+the repository root:
+
+    python -m benchmarks.compare benchmarks/results/chat-abc123.json benchmarks/results/chat-def456.json
+"""
+import argparse
+import json
+from typing import Dict
+
+
+def flatten(value, prefix: str = "") -> Dict[str, float]:
+    """Flatten nested results to {"levels[0].p95_ms": 123.4, ...}"""
+    items = {}
+    if isinstance(value, dict):
+        for key, child in value.items():
+            items.update(flatten(child, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(value, list):
+        for idx, child in enumerate(value):
+            items.update(flatten(child, f"{prefix}[{idx}]"))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        items[prefix] = value
+    return items
+
+
+def main(baseline_path: str, candidate_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    if baseline["benchmark"] != candidate["benchmark"]:
+        raise SystemExit(f"Different benchmarks: {baseline['benchmark']} vs {candidate['benchmark']}")
+    if baseline["params"] != candidate["params"]:
+        print("Warning: benchmark parameters differ, results may not be comparable")
+
+    before = flatten(baseline["results"])
+    after = flatten(candidate["results"])
+    print(f"{'metric':<40} {baseline['commit'] or 'baseline':>12} {candidate['commit'] or 'candidate':>12} {'change':>9}")
+    for key in before:
+        if key not in after:
+            continue
+        change = f"{(after[key] - before[key]) / before[key] * 100:+.1f}%" if before[key] else "n/a"
+        print(f"{key:<40} {before[key]:>12} {after[key]:>12} {change:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+    main(args.baseline, args.candidate)
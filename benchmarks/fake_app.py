@@ -0,0 +1,18 @@
+"""
+The app with the fake LLM and embedder installed, for running under a real
+server (see benchmarks.bench_workers):
+
+    BENCH_LLM_LATENCY=0.05 gunicorn benchmarks.fake_app:app -c gunicorn.conf.py
+
+MCP_SERVER_URL should point at a fake MCP server (benchmarks.fakes).
+"""
+import os
+from benchmarks.harness import install_fakes
+
+install_fakes(
+    llm_latency=float(os.environ.get("BENCH_LLM_LATENCY", "0.05")),
+    embed_latency=float(os.environ.get("BENCH_EMBED_LATENCY", "0.0")),
+    llm_cpu_time=float(os.environ.get("BENCH_LLM_CPU_TIME", "0.0"))
+)
+
+from main import app  # noqa: E402
@@ -0,0 +1,146 @@
+"""
+Deterministic local stand-ins for the external services used by the app.
+
+- FakeChatModel: a chat model with configurable latency (and optional CPU
+  work per call) that asks for the configured tools on the first turn of a
+  conversation and answers once the tool results are in.
+- FakeEmbeddings: hash-seeded unit vectors with configurable latency.
+- serve_fake_mcp: a streamable-HTTP MCP server with retail-style tools.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, List, Optional, Sequence
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+FAKE_MCP_TOOLS = ("get_user_orders", "list_promotions")
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model: one round of parallel tool calls, then a reply"""
+
+    latency: float = 0.2
+    cpu_time: float = 0.0
+    tool_calls: Sequence[str] = FAKE_MCP_TOOLS
+    bound_tools: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"bound_tools": [tool.name for tool in tools]})
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        # Busy-wait to stand in for CPU spent per model call (parsing, serialization)
+        deadline = time.perf_counter() + self.cpu_time
+        while time.perf_counter() < deadline:
+            pass
+        last = messages[-1]
+        wanted = [name for name in self.tool_calls if name in self.bound_tools]
+        if wanted and not isinstance(last, ToolMessage):
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": name, "args": {"user_id": 1}, "id": f"call_{idx}_{name}", "type": "tool_call"}
+                    for idx, name in enumerate(wanted)
+                ]
+            )
+        tool_results = [message for message in messages if isinstance(message, ToolMessage)]
+        return AIMessage(content=f"Here is what I found ({len(tool_results)} tool results). " + "ok " * 40)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+
+class FakeEmbeddings(Embeddings):
+    """Unit vectors seeded by a hash of the text, so equal texts embed equally"""
+
+    def __init__(self, dimension: int, latency: float = 0.0, per_text_latency: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+
+    def _embed(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        vector = [rng.gauss(0, 1) for _ in range(self.dimension)]
+        norm = sum(value * value for value in vector) ** 0.5
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency + self.per_text_latency * len(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._embed(text)
+
+
+def create_fake_mcp_server(latency: float = 0.1, calls: Optional[Counter] = None):
+    """
+    FastMCP server whose tools sleep for `latency` seconds and return canned JSON.
+
+    Each call is counted by tool name in `calls` when given.
+    """
+    from mcp.server.fastmcp import FastMCP
+
+    server = FastMCP("bench-retail")
+    calls = Counter() if calls is None else calls
+
+    @server.tool()
+    async def get_user_orders(user_id: int) -> str:
+        """List the orders of a user"""
+        calls["get_user_orders"] += 1
+        await asyncio.sleep(latency)
+        return json.dumps([
+            {"order_id": 1000 + idx, "user_id": user_id, "total": 19.99 * (idx + 1), "status": "delivered"}
+            for idx in range(5)
+        ])
+
+    @server.tool()
+    async def list_promotions(user_id: int = 0) -> str:
+        """List active promotions"""
+        calls["list_promotions"] += 1
+        await asyncio.sleep(latency)
+        return json.dumps([
+            {"promotion_id": idx, "title": f"Promotion {idx}", "discount_percent": 5 * (idx + 1)}
+            for idx in range(3)
+        ])
+
+    return server
+
+
+@asynccontextmanager
+async def serve_fake_mcp(port: int, latency: float = 0.1, calls: Optional[Counter] = None):
+    """Run the fake MCP server on localhost; yields its /mcp URL"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(
+        create_fake_mcp_server(latency, calls).streamable_http_app(),
+        host="127.0.0.1",
+        port=port,
+        log_level="warning"
+    ))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}/mcp"
+    finally:
+        server.should_exit = True
+        await task
@@ -0,0 +1,138 @@
+"""
+Shared setup for the end-to-end benchmarks.
+
+bench_app() runs the real FastAPI app (lifespan included) against the
+configured Postgres/pgvector, with the LLM, embedder and MCP server replaced
+by the stand-ins in benchmarks.fakes, and yields an in-process HTTP client.
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import List, Optional
+import httpx
+from config.settings import get_settings
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings, serve_fake_mcp
+
+settings = get_settings()
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def latency_summary(latencies: List[float]) -> dict:
+    """p50/p95/p99/max in milliseconds of latencies given in seconds"""
+    values = sorted(latency * 1000 for latency in latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50), 2),
+        "p95_ms": round(percentile(values, 0.95), 2),
+        "p99_ms": round(percentile(values, 0.99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(name: str, params: dict, results: dict, output: Optional[str] = None) -> str:
+    """Print the results and write them as JSON (default: benchmarks/results/<name>-<commit>.json)"""
+    commit = git_commit()
+    report = {
+        "benchmark": name,
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": results
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{commit or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+    return output
+
+
+def install_fakes(llm_latency: float = 0.2, embed_latency: float = 0.05, llm_cpu_time: float = 0.0):
+    """Point the app's singletons at the fake LLM and embedder"""
+    from services.agent_service import agent_service
+    from services.vector_store_service import vector_store_service
+    from services.embedding_service import AsyncEmbedder
+
+    fake_embeddings = FakeEmbeddings(settings.EMBEDDING_DIMENSION, latency=embed_latency)
+    vector_store_service.embedder = AsyncEmbedder(fake_embeddings)
+    agent_service._create_llm = lambda: FakeChatModel(latency=llm_latency, cpu_time=llm_cpu_time)
+
+
+@asynccontextmanager
+async def bench_app(
+    llm_latency: float = 0.2,
+    tool_latency: float = 0.1,
+    embed_latency: float = 0.05,
+    mcp_port: int = 8765,
+    use_mcp: bool = True
+):
+    """Start the app with local stand-ins and yield an httpx client bound to it"""
+    from main import app, lifespan
+    from models.models import run_migrations
+
+    install_fakes(llm_latency, embed_latency)
+    await run_migrations()
+
+    async with AsyncExitStack() as stack:
+        mcp_url = await stack.enter_async_context(serve_fake_mcp(mcp_port, tool_latency)) if use_mcp else None
+        settings.MCP_SERVER_URL = mcp_url
+        await stack.enter_async_context(lifespan(app))
+        client = await stack.enter_async_context(httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://bench",
+            timeout=None
+        ))
+        yield client
+
+
+async def create_bench_user(client: httpx.AsyncClient, name: str) -> int:
+    """Create a throwaway user through the API"""
+    response = await client.post(
+        f"{settings.API_V1_PREFIX}/users/",
+        json={"username": f"bench-{name}-{os.urandom(4).hex()}"}
+    )
+    response.raise_for_status()
+    return response.json()["user_id"]
+
+
+async def delete_bench_users(user_ids: List[int], documents: bool = True):
+    """Remove benchmark users and their sessions, messages and (optionally) documents"""
+    from core.database import db
+    from services.vector_store_service import vector_store_service
+
+    async with db.get_pool().acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                "DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE user_id = ANY($1::int[]))",
+                user_ids
+            )
+            await conn.execute("DELETE FROM sessions WHERE user_id = ANY($1::int[])", user_ids)
+            await conn.execute("DELETE FROM users WHERE user_id = ANY($1::int[])", user_ids)
+    if not documents:
+        return
+    for user_id in user_ids:
+        await vector_store_service.clear_all_documents(user_id)
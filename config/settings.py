@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
@@ -11,13 +12,56 @@ class Settings(BaseSettings):
     POSTGRES_DB: str
     DB_MIN_POOL_SIZE: int = 10
     DB_MAX_POOL_SIZE: int = 20
+    # Multi-worker deployment: with a budget, each worker's pool max is budget // WEB_CONCURRENCY
+    WEB_CONCURRENCY: int = 1
+    DB_POOL_BUDGET: Optional[int] = None  # chat DB connections across all workers
+    SHARED_STATE_BACKEND: str = "memory"  # memory (single process) or postgres (shared by workers)
     
     MCP_SERVER_URL: str
+    # Read-only MCP tools whose results may be cached: {"tool_name": ttl_seconds}
+    MCP_TOOL_CACHE_TTLS: Dict[str, float] = {}
+    MCP_TOOL_CACHE_MAX_SIZE: int = 1000
+    # Persistent MCP session
+    MCP_CONNECT_TIMEOUT: float = 10.0  # startup wait before continuing without tools
+    MCP_HEALTH_CHECK_INTERVAL: float = 30.0
+    MCP_HEALTH_CHECK_TIMEOUT: float = 10.0
+    MCP_RECONNECT_BASE_DELAY: float = 1.0
+    MCP_RECONNECT_MAX_DELAY: float = 60.0
+    MCP_HTTP_MAX_CONNECTIONS: int = 20
+    MCP_HTTP_KEEPALIVE_SECONDS: float = 60.0
+    # Tool execution (calls of one agent step run concurrently)
+    TOOL_MAX_CONCURRENCY: int = 8  # per agent run
+    TOOL_CALL_TIMEOUT: float = 30.0
+    # Agent run budget
+    AGENT_TIMEOUT_SECONDS: float = 120.0
+    AGENT_MAX_ITERATIONS: int = 8
+    # Tracing
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATE: float = 1.0  # fraction of requests traced
+    TRACING_EXPORTER: str = "log"  # "log" (JSON lines), "otel" or "none"
+    TRACE_HEADER: str = "X-Trace-Id"
+    TRACING_SPAN_MAX_AGE_SECONDS: float = 600.0  # unfinished spans are ended after this
     
     # llm
     GOOGLE_GEMINI_MODEL: str
     GOOGLE_API_KEY: str
     
+    # RAG retrieval tool for the agent
+    RAG_TOOL_ENABLED: bool = True
+    RAG_TOOL_K: int = 4
+    RAG_TOOL_TOKEN_BUDGET: int = 1500
+    
+    # Chat history
+    HISTORY_TOKEN_BUDGET: int = 2000
+    HISTORY_FETCH_LIMIT: int = 50
+    HISTORY_SUMMARY_ENABLED: bool = True
+    HISTORY_SUMMARY_THRESHOLD: int = 20  # unsummarized messages before summarizing
+    HISTORY_KEEP_RECENT: int = 10  # newest messages always kept verbatim
+    HISTORY_SUMMARY_SHUTDOWN_TIMEOUT: float = 10.0  # wait for running summaries on shutdown, then cancel
+    HISTORY_CACHE_BACKEND: str = "memory"  # memory (per process) or none
+    HISTORY_CACHE_MAX_SESSIONS: int = 1000
+    HISTORY_CACHE_IDLE_SECONDS: float = 900.0
+    
     # API
     API_V1_PREFIX: str = "/api/v1"
     PROJECT_NAME: str = "FastAPI Chat"
@@ -36,16 +80,66 @@ class Settings(BaseSettings):
     VECTOR_DB_NAME: str = ""
     VECTOR_DB_MIN_POOL_SIZE: int = 10
     VECTOR_DB_MAX_POOL_SIZE: int = 20
+    VECTOR_DB_POOL_BUDGET: Optional[int] = None  # vector DB connections across all workers
+    VECTOR_EXTENSION_SCHEMA: str = "public"  # Supabase installs pgvector in "extensions"
+    VECTOR_INDEX_TYPE: str = "hnsw"  # hnsw or ivfflat
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 64
+    IVFFLAT_LISTS: int = 100
+    
+    # Similarity search tuning
+    VECTOR_SEARCH_MODE: str = "approximate"  # approximate, oversample or exact
+    HNSW_EF_SEARCH: int = 40
+    IVFFLAT_PROBES: int = 1
+    VECTOR_OVERSAMPLE_FACTOR: int = 4
+    VECTOR_MAX_DISTANCE: Optional[float] = None
+    # Filters matching at most this many rows are searched exactly: the ANN index
+    # filters after its scan and can return too few rows (pgvector < 0.8 only;
+    # newer versions use iterative index scans instead). 0 disables the fallback.
+    VECTOR_EXACT_SEARCH_MAX_ROWS: int = 5000
+    RUN_MIGRATIONS: bool = False  # otherwise run `python -m models.models` as a deploy step
+    # Direct (not transaction-pooled) connections for migrations; default: the database settings above
+    MIGRATIONS_DSN: str = ""
+    VECTOR_MIGRATIONS_DSN: str = ""
     
     # Embeddings
     EMBEDDING_MODEL: str = "models/text-embedding-004"
     EMBEDDING_DIMENSION: int = 768
+    EMBEDDING_BATCH_SIZE: int = 100
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 5
+    EMBEDDING_RETRY_BASE_DELAY: float = 1.0
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_PERSISTENT: bool = True
+    EMBEDDING_CACHE_TABLE_NAME: str = "embedding_cache"
+    # Persistent entries older than the TTL are deleted every interval (TTL 0 keeps them forever)
+    EMBEDDING_CACHE_TTL_SECONDS: float = 30 * 24 * 3600.0
+    EMBEDDING_CACHE_EVICT_INTERVAL_SECONDS: float = 3600.0
+    EMBEDDING_CACHE_EVICT_BATCH_SIZE: int = 10000
+    
+    # Similarity search result cache (size 0 disables it)
+    QUERY_CACHE_SIZE: int = 1000
+    QUERY_CACHE_TTL_SECONDS: float = 300.0
 
     # Document Processing
     DEFAULT_CHUNK_SIZE: int = 2000
     DEFAULT_CHUNK_OVERLAP: int = 200
     MAX_CHUNK_SIZE: int = 2000
     MIN_CHUNK_SIZE: int = 500
+    DOCUMENT_PROCESS_WORKERS: int = 4  # 0 runs extraction in a thread instead of a process pool
+    PDF_PAGES_PER_TASK: int = 20
+    
+    # Streaming ingestion
+    INGEST_BATCH_SIZE: int = 64  # chunks per embed/insert batch
+    INGEST_QUEUE_SIZE: int = 4  # batches buffered between chunking and insertion
+    INGEST_MAX_CONCURRENT_FILES: int = 2
+    INGEST_READ_BLOCK_SIZE: int = 1024 * 1024
+    INGEST_SOURCE_LOCK_TIMEOUT: float = 600.0  # wait for a concurrent re-ingest of the same source
+    
+    # Background ingestion jobs
+    INGEST_JOB_CONCURRENCY: int = 1  # jobs processed at once per worker process
+    INGEST_JOB_QUEUE_SIZE: int = 100
+    INGEST_JOB_RETENTION_SECONDS: float = 3600.0
     
     class Config:
         env_file = ".env"
@@ -1,25 +1,162 @@
 import asyncpg
-from typing import Optional
+import json
+import struct
+import time
+from typing import List, Optional, Tuple
 from config.settings import get_settings
+from core.metrics import DB_POOL_ACQUIRE_SECONDS, query_logger, record_pool_usage, sql_operation, track_pool
+from core.tracing import tracer
 
 settings = get_settings()
 
 
+def encode_vector(value: List[float]) -> bytes:
+    """Encode a list of floats to pgvector's binary format"""
+    dim = len(value)
+    return struct.pack(f"!HH{dim}f", dim, 0, *value)
+
+
+def decode_vector(data: bytes) -> List[float]:
+    """Decode pgvector's binary format to a list of floats"""
+    dim, _ = struct.unpack_from("!HH", data)
+    return list(struct.unpack_from(f"!{dim}f", data, 4))
+
+
+def encode_jsonb(value) -> bytes:
+    """Encode a Python object to jsonb's binary format (version byte + JSON text)"""
+    return b"\x01" + json.dumps(value).encode("utf-8")
+
+
+def decode_jsonb(data: bytes):
+    """Decode jsonb's binary format to a Python object"""
+    return json.loads(data[1:])
+
+
+def trace_query(name: str):
+    """asyncpg query logger recording each statement as a span of the active trace"""
+
+    def log_query(record) -> None:
+        # Runs via call_soon, which carries over the querying task's current span
+        finished = time.time()
+        tracer.record_span(
+            "db.query",
+            finished - record.elapsed,
+            finished,
+            **{"db.pool": name, "db.operation": sql_operation(record.query), "db.statement": record.query[:500]}
+        )
+
+    return log_query
+
+
+def instrument_connection(name: str):
+    """Pool init callback that records the latency (and trace spans) of every query on a connection"""
+
+    async def init(conn: asyncpg.Connection):
+        # Query loggers need asyncpg >= 0.29
+        if hasattr(conn, "add_query_logger"):
+            conn.add_query_logger(query_logger(name))
+            if tracer.enabled:
+                conn.add_query_logger(trace_query(name))
+
+    return init
+
+
+async def init_vector_connection(conn: asyncpg.Connection):
+    """Register vector and jsonb codecs (and the query logger) on each new vector DB connection"""
+    await instrument_connection("vector")(conn)
+    await conn.set_type_codec(
+        "jsonb",
+        encoder=encode_jsonb,
+        decoder=decode_jsonb,
+        schema="pg_catalog",
+        format="binary"
+    )
+    try:
+        await conn.set_type_codec(
+            "vector",
+            encoder=encode_vector,
+            decoder=decode_vector,
+            schema=settings.VECTOR_EXTENSION_SCHEMA,
+            format="binary"
+        )
+    except ValueError:
+        # pgvector not installed yet; the vector migrations create it and expire the pool
+        print("Warning: vector type not found, codec not registered")
+
+
+class _TimedAcquire:
+    """Acquire context that records the wait for a pooled connection"""
+
+    def __init__(self, pool: asyncpg.Pool, name: str, timeout: Optional[float]):
+        self.pool = pool
+        self.name = name
+        self.timeout = timeout
+        self.connection = None
+
+    async def _acquire(self) -> asyncpg.Connection:
+        started = time.perf_counter()
+        connection = await self.pool.acquire(timeout=self.timeout)
+        DB_POOL_ACQUIRE_SECONDS.labels(pool=self.name).observe(time.perf_counter() - started)
+        record_pool_usage(self.name, self.pool)
+        return connection
+
+    async def __aenter__(self) -> asyncpg.Connection:
+        self.connection = await self._acquire()
+        return self.connection
+
+    async def __aexit__(self, *exc_info):
+        connection, self.connection = self.connection, None
+        await self.pool.release(connection)
+        record_pool_usage(self.name, self.pool)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+
+class InstrumentedPool:
+    """asyncpg pool wrapper that times acquire() and keeps the pool size gauges current"""
+
+    def __init__(self, pool: asyncpg.Pool, name: str):
+        self._pool = pool
+        self._name = name
+        track_pool(name, pool)
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _TimedAcquire:
+        return _TimedAcquire(self._pool, self._name, timeout)
+
+    async def release(self, connection: asyncpg.Connection, *, timeout: Optional[float] = None):
+        await self._pool.release(connection, timeout=timeout)
+        record_pool_usage(self._name, self._pool)
+
+    def __getattr__(self, attr):
+        return getattr(self._pool, attr)
+
+
+def worker_pool_sizes(min_size: int, max_size: int, budget: Optional[int]) -> Tuple[int, int]:
+    """Pool bounds for one worker; a connection budget is split evenly across WEB_CONCURRENCY workers"""
+    if budget:
+        max_size = max(1, budget // max(1, settings.WEB_CONCURRENCY))
+    return min(min_size, max_size), max_size
+
+
 class Database:
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
     
     async def connect(self):
         """Create database connection pool"""
-        self.pool = await asyncpg.create_pool(
+        min_size, max_size = worker_pool_sizes(settings.DB_MIN_POOL_SIZE, settings.DB_MAX_POOL_SIZE, settings.DB_POOL_BUDGET)
+        pool = await asyncpg.create_pool(
             host=settings.POSTGRES_HOST,
             port=settings.POSTGRES_PORT,
             user=settings.POSTGRES_USER,
             password=settings.POSTGRES_PASSWORD,
             database=settings.POSTGRES_DB,
-            min_size=settings.DB_MIN_POOL_SIZE,
-            max_size=settings.DB_MAX_POOL_SIZE
+            min_size=min_size,
+            max_size=max_size,
+            init=instrument_connection("chat")
         )
+        self.pool = InstrumentedPool(pool, "chat")
     
     async def disconnect(self):
         """Close database connection pool"""
@@ -33,6 +170,41 @@ class Database:
         return self.pool
 
 
+async def connect_for_migrations(vector: bool = False) -> asyncpg.Connection:
+    """
+    Open a dedicated connection for schema migrations.
+
+    Migrations hold a session advisory lock and build indexes outside a
+    transaction, so they must not go through pgbouncer transaction pooling:
+    MIGRATIONS_DSN / VECTOR_MIGRATIONS_DSN point at the database directly.
+    Without them the chat / vector database settings are used.
+    """
+    if not vector:
+        dsn = settings.MIGRATIONS_DSN
+    elif settings.VECTOR_DB_HOST or settings.VECTOR_DB_NAME:
+        dsn = settings.VECTOR_MIGRATIONS_DSN
+    else:
+        # The vector store lives in the chat database
+        dsn = settings.VECTOR_MIGRATIONS_DSN or settings.MIGRATIONS_DSN
+    if dsn:
+        return await asyncpg.connect(dsn)
+    if vector:
+        return await asyncpg.connect(
+            host=settings.VECTOR_DB_HOST or settings.POSTGRES_HOST,
+            port=settings.VECTOR_DB_PORT or settings.POSTGRES_PORT,
+            user=settings.VECTOR_DB_USER or settings.POSTGRES_USER,
+            password=settings.VECTOR_DB_PASSWORD or settings.POSTGRES_PASSWORD,
+            database=settings.VECTOR_DB_NAME or settings.POSTGRES_DB
+        )
+    return await asyncpg.connect(
+        host=settings.POSTGRES_HOST,
+        port=settings.POSTGRES_PORT,
+        user=settings.POSTGRES_USER,
+        password=settings.POSTGRES_PASSWORD,
+        database=settings.POSTGRES_DB
+    )
+
+
 class VectorDatabase:
     """Separate database connection for vector store (optional)"""
     def __init__(self):
@@ -46,17 +218,24 @@ class VectorDatabase:
         user = settings.VECTOR_DB_USER or settings.POSTGRES_USER
         password = settings.VECTOR_DB_PASSWORD or settings.POSTGRES_PASSWORD
         database = settings.VECTOR_DB_NAME or settings.POSTGRES_DB
+        min_size, max_size = worker_pool_sizes(
+            settings.VECTOR_DB_MIN_POOL_SIZE,
+            settings.VECTOR_DB_MAX_POOL_SIZE,
+            settings.VECTOR_DB_POOL_BUDGET
+        )
         
-        self.pool = await asyncpg.create_pool(
+        pool = await asyncpg.create_pool(
             host=host,
             port=port,
             user=user,
             password=password,
             database=database,
-            min_size=settings.VECTOR_DB_MIN_POOL_SIZE,
-            max_size=settings.VECTOR_DB_MAX_POOL_SIZE,
-            statement_cache_size=0  # Disable prepared statements for pgbouncer compatibility
+            min_size=min_size,
+            max_size=max_size,
+            statement_cache_size=0,  # Disable prepared statements for pgbouncer compatibility
+            init=init_vector_connection
         )
+        self.pool = InstrumentedPool(pool, "vector")
     
     async def disconnect(self):
         """Close vector database connection pool"""
@@ -0,0 +1,127 @@
+"""
+Application metrics, exposed at /metrics with prometheus_client.
+
+With several worker processes, point PROMETHEUS_MULTIPROC_DIR at an empty
+directory before the app is imported (gunicorn.conf.py does): every worker
+then writes its samples there and /metrics reports the sum over all workers,
+whichever worker answers the scrape.
+"""
+import os
+import re
+from typing import Callable
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+STEP_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+_SQL_VERB = re.compile(r"^\s*(?:--[^\n]*\n\s*)*(\w+)")
+
+
+def sql_operation(query: str) -> str:
+    """First keyword of a statement (SELECT, INSERT, ...), a low-cardinality query label"""
+    match = _SQL_VERB.match(query)
+    return match.group(1).upper() if match else "OTHER"
+
+
+def render() -> bytes:
+    """Current metrics in the Prometheus text format, aggregated over workers in multiprocess mode"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+APP_STARTUP_SECONDS = Gauge(
+    "app_startup_seconds", "Time the application lifespan took to start", multiprocess_mode="max"
+)
+DB_POOL_ACQUIRE_SECONDS = Histogram(
+    "db_pool_acquire_seconds", "Time spent waiting for a pooled connection", ["pool"], buckets=LATENCY_BUCKETS
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds", "Database query latency", ["pool", "operation"], buckets=LATENCY_BUCKETS
+)
+DB_QUERY_ERRORS = Counter(
+    "db_query_errors_total", "Database queries that raised", ["pool", "operation"]
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Pool connections by state (open, idle, in_use, max)", ["pool", "state"],
+    multiprocess_mode="livesum"
+)
+EMBEDDING_SECONDS = Histogram(
+    "embedding_request_seconds", "Embedding provider call latency", ["kind"], buckets=LATENCY_BUCKETS
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "embedding_batch_size", "Texts per embedding provider call", ["kind"], buckets=SIZE_BUCKETS
+)
+EMBEDDING_ERRORS = Counter(
+    "embedding_errors_total", "Embedding provider calls that failed after retries", ["kind"]
+)
+PDF_PAGE_SECONDS = Histogram(
+    "pdf_extract_page_seconds", "PDF text extraction time per page", buckets=LATENCY_BUCKETS
+)
+LLM_SECONDS = Histogram(
+    "llm_request_seconds", "Chat model call latency", buckets=LATENCY_BUCKETS
+)
+LLM_ERRORS = Counter(
+    "llm_errors_total", "Chat model calls that raised"
+)
+AGENT_RUN_SECONDS = Histogram(
+    "agent_run_seconds", "End-to-end agent run latency", ["outcome"], buckets=LATENCY_BUCKETS
+)
+AGENT_STEPS = Histogram(
+    "agent_steps", "ReAct iterations (model calls) per agent run", buckets=STEP_BUCKETS
+)
+TOOL_SECONDS = Histogram(
+    "tool_call_seconds", "Agent tool call latency", ["tool"], buckets=LATENCY_BUCKETS
+)
+TOOL_ERRORS = Counter(
+    "tool_call_errors_total", "Agent tool calls that failed or timed out", ["tool", "status"]
+)
+TOOL_CACHE_LOOKUPS = Counter(
+    "tool_cache_lookups_total",
+    "MCP tool result cache lookups by result (hit, miss, coalesced, bypassed; shared_hit for misses served by another worker)",
+    ["result"]
+)
+TOOL_CACHE_ENTRIES = Gauge(
+    "tool_cache_entries", "Results held in the MCP tool result cache", multiprocess_mode="livesum"
+)
+HISTORY_CACHE_LOOKUPS = Counter(
+    "history_cache_lookups_total", "Session history cache lookups by result (hit, miss)", ["result"]
+)
+HISTORY_CACHE_EVICTIONS = Counter(
+    "history_cache_evictions_total", "Sessions dropped from the history cache (LRU or idle)"
+)
+HISTORY_CACHE_SESSIONS = Gauge(
+    "history_cache_sessions", "Sessions held in the history cache", multiprocess_mode="livesum"
+)
+
+
+def track_pool(name: str, pool) -> None:
+    """Start reporting connection counts of an asyncpg pool"""
+    DB_POOL_CONNECTIONS.labels(pool=name, state="max").set(pool.get_max_size())
+    record_pool_usage(name, pool)
+
+
+def record_pool_usage(name: str, pool) -> None:
+    """Update the pool's connection gauges (called on acquire and release)"""
+    size, idle = pool.get_size(), pool.get_idle_size()
+    DB_POOL_CONNECTIONS.labels(pool=name, state="open").set(size)
+    DB_POOL_CONNECTIONS.labels(pool=name, state="idle").set(idle)
+    DB_POOL_CONNECTIONS.labels(pool=name, state="in_use").set(size - idle)
+
+
+def query_logger(name: str) -> Callable:
+    """asyncpg query logger recording per-statement latency for a pool"""
+
+    def log_query(record) -> None:
+        operation = sql_operation(record.query)
+        DB_QUERY_SECONDS.labels(pool=name, operation=operation).observe(record.elapsed)
+        if record.exception is not None:
+            DB_QUERY_ERRORS.labels(pool=name, operation=operation).inc()
+
+    return log_query
@@ -0,0 +1,142 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+import asyncpg
+from config.settings import get_settings
+
+settings = get_settings()
+
+SHARED_STATE_TABLE = "shared_state"
+
+
+class SharedStateBackend(ABC):
+    """
+    Key/value store for state shared by all worker processes (tool list, caches).
+
+    Values must be JSON-serializable. `shared` tells callers whether other
+    processes see the same data; process-local caches in front of a shared
+    backend only need to write through when it is.
+    """
+    shared = False
+
+    async def initialize(self, pool: asyncpg.Pool):
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "shared": self.shared}
+
+
+class InMemorySharedState(SharedStateBackend):
+    """Process-local store; the default for single-process deployments"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "entries": len(self._entries)}
+
+
+class PostgresSharedState(SharedStateBackend):
+    """
+    Store shared by every worker in an UNLOGGED table of the chat database.
+
+    Needs no extra service; expired rows are ignored on read and purged
+    every PURGE_EVERY writes.
+    """
+    shared = True
+    PURGE_EVERY = 500
+
+    def __init__(self):
+        self.pool: Optional[asyncpg.Pool] = None
+        self._writes = 0
+
+    async def initialize(self, pool: asyncpg.Pool):
+        self.pool = pool
+
+    def _get_pool(self) -> asyncpg.Pool:
+        if self.pool is None:
+            raise RuntimeError("Shared state not initialized")
+        return self.pool
+
+    async def get(self, key: str) -> Optional[Any]:
+        async with self._get_pool().acquire() as conn:
+            value = await conn.fetchval(
+                f"""
+                SELECT value FROM {SHARED_STATE_TABLE}
+                WHERE key = $1 AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
+                """,
+                key
+            )
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        async with self._get_pool().acquire() as conn:
+            await conn.execute(
+                f"""
+                INSERT INTO {SHARED_STATE_TABLE} (key, value, expires_at)
+                VALUES ($1, $2::jsonb, CASE WHEN $3::float8 IS NULL THEN NULL
+                                            ELSE CURRENT_TIMESTAMP + make_interval(secs => $3::float8) END)
+                ON CONFLICT (key) DO UPDATE
+                SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at
+                """,
+                key,
+                json.dumps(value),
+                ttl
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                await conn.execute(f"DELETE FROM {SHARED_STATE_TABLE} WHERE expires_at <= CURRENT_TIMESTAMP")
+
+    async def delete(self, key: str):
+        async with self._get_pool().acquire() as conn:
+            await conn.execute(f"DELETE FROM {SHARED_STATE_TABLE} WHERE key = $1", key)
+
+
+def create_shared_state(backend: str = None) -> SharedStateBackend:
+    """Build the configured shared state backend"""
+    backend = backend or settings.SHARED_STATE_BACKEND
+    if backend == "memory":
+        return InMemorySharedState()
+    if backend == "postgres":
+        return PostgresSharedState()
+    raise ValueError(f"Unsupported shared state backend: {backend}")
+
+
+# Global shared state instance (initialized with the chat pool in lifespan)
+shared_state = create_shared_state()
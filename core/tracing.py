@@ -0,0 +1,335 @@
+import functools
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+from config.settings import get_settings
+
+settings = get_settings()
+
+
+class Span:
+    """A timed operation within a trace"""
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end", "attributes", "status", "exporter_data")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any], start: float = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start = time.time() if start is None else start
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.status = "ok"
+        self.exporter_data = None
+
+    @property
+    def sampled(self) -> bool:
+        return True
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException):
+        self.status = "error"
+        self.attributes["error.type"] = type(error).__name__
+        self.attributes["error.message"] = str(error)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(((self.end or time.time()) - self.start) * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class _NoopSpan:
+    """Stand-in for unsampled or disabled tracing; every operation is a no-op"""
+    trace_id = None
+    span_id = None
+    sampled = False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_exception(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+# Innermost active span of the current task (NOOP_SPAN inside an unsampled trace)
+_current_span: ContextVar[Any] = ContextVar("current_span", default=None)
+
+
+class _NoopContext:
+    """Reusable context manager returned when nothing is recorded"""
+
+    def __enter__(self):
+        return NOOP_SPAN
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_CONTEXT = _NoopContext()
+
+
+class _UnsampledContext:
+    """Marks the current task as inside an unsampled trace so children skip sampling"""
+
+    def __enter__(self):
+        self._token = _current_span.set(NOOP_SPAN)
+        return NOOP_SPAN
+
+    def __exit__(self, *exc_info):
+        _current_span.reset(self._token)
+        return False
+
+
+class _SpanContext:
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self._token = _current_span.set(self.span)
+        self.tracer.exporter.on_start(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc is not None:
+            self.span.record_exception(exc)
+        _current_span.reset(self._token)
+        self.tracer.finish(self.span)
+        return False
+
+
+class SpanExporter:
+    """Receives spans as they start and end"""
+
+    def on_start(self, span: Span):
+        pass
+
+    def on_end(self, span: Span):
+        pass
+
+
+class LogSpanExporter(SpanExporter):
+    """Print each finished span as one JSON line"""
+
+    def on_end(self, span: Span):
+        print(json.dumps(span.to_dict(), default=str))
+
+
+class OpenTelemetrySpanExporter(SpanExporter):
+    """
+    Mirror spans into OpenTelemetry.
+
+    Spans are recorded on the globally configured TracerProvider. If none is
+    configured and the OTLP exporter package is installed, a provider that
+    exports over OTLP (configured by the standard OTEL_* environment
+    variables) is set up. Trace ids are taken from OpenTelemetry so the id
+    returned to clients matches the exported trace.
+
+    Spans still open after TRACING_SPAN_MAX_AGE_SECONDS (a run whose callbacks
+    never reported its end) are ended as unfinished and forgotten, so they
+    are still exported and do not accumulate.
+    """
+
+    def __init__(self):
+        from opentelemetry import trace
+
+        if isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+            try:
+                from opentelemetry.sdk.resources import Resource
+                from opentelemetry.sdk.trace import TracerProvider
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+                provider = TracerProvider(resource=Resource.create({"service.name": settings.PROJECT_NAME}))
+                provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+                trace.set_tracer_provider(provider)
+            except ImportError:
+                print("Warning: no OpenTelemetry TracerProvider configured and OTLP exporter not installed")
+
+        self._trace = trace
+        self._tracer = trace.get_tracer("chatbot")
+        # span_id -> (OpenTelemetry span, start time), oldest first
+        self._spans: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+
+    def _evict_stale(self, now: float):
+        while self._spans:
+            otel_span, start = next(iter(self._spans.values()))
+            if now - start < settings.TRACING_SPAN_MAX_AGE_SECONDS:
+                return
+            self._spans.popitem(last=False)
+            otel_span.set_attribute("span.unfinished", True)
+            otel_span.end()
+
+    def on_start(self, span: Span):
+        self._evict_stale(time.time())
+        parent = self._spans.get(span.parent_id, (None, None))[0] if span.parent_id else None
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self._tracer.start_span(
+            span.name,
+            context=context,
+            start_time=int(span.start * 1e9)
+        )
+        span.exporter_data = otel_span
+        self._spans[span.span_id] = (otel_span, span.start)
+        if parent is None:
+            span.trace_id = format(otel_span.get_span_context().trace_id, "032x")
+
+    def on_end(self, span: Span):
+        entry = self._spans.pop(span.span_id, None)
+        if entry is None:
+            return
+        otel_span = entry[0]
+        for key, value in span.attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                otel_span.set_attribute(key, value)
+        if span.status == "error":
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        otel_span.end(end_time=int(span.end * 1e9))
+
+
+def create_exporter(name: str = None) -> SpanExporter:
+    """Build the configured span exporter"""
+    name = name or settings.TRACING_EXPORTER
+    if name == "log":
+        return LogSpanExporter()
+    if name == "otel":
+        try:
+            return OpenTelemetrySpanExporter()
+        except ImportError:
+            print("Warning: opentelemetry is not installed, spans will not be exported")
+            return SpanExporter()
+    if name == "none":
+        return SpanExporter()
+    raise ValueError(f"Unsupported tracing exporter: {name}")
+
+
+class Tracer:
+    """
+    Lightweight span tracer.
+
+    A root span decides sampling once (TRACING_SAMPLE_RATE); its children
+    follow that decision. When tracing is disabled or a trace is not sampled,
+    span() returns a shared no-op context, so instrumented code pays only a
+    flag check and a context variable lookup.
+    """
+
+    def __init__(self, enabled: bool = None, sample_rate: float = None, exporter: SpanExporter = None):
+        self.enabled = settings.TRACING_ENABLED if enabled is None else enabled
+        self.sample_rate = settings.TRACING_SAMPLE_RATE if sample_rate is None else sample_rate
+        self._exporter = exporter
+
+    @property
+    def exporter(self) -> SpanExporter:
+        # Built on first use so optional exporter imports only happen when tracing runs
+        if self._exporter is None:
+            self._exporter = create_exporter()
+        return self._exporter
+
+    def current_span(self):
+        """The active span of this task, or NOOP_SPAN"""
+        return _current_span.get() or NOOP_SPAN
+
+    def span(self, name: str, **attributes):
+        """Context manager recording a span under the current one"""
+        if not self.enabled:
+            return _NOOP_CONTEXT
+        parent = _current_span.get()
+        if parent is NOOP_SPAN:
+            return _NOOP_CONTEXT
+        if parent is None:
+            if random.random() >= self.sample_rate:
+                return _UnsampledContext()
+            return _SpanContext(self, Span(name, os.urandom(16).hex(), None, attributes))
+        return _SpanContext(self, Span(name, parent.trace_id, parent.span_id, attributes))
+
+    def start_span(self, name: str, parent=None, **attributes):
+        """Start a span that is ended explicitly with finish() (for callback-style code)"""
+        parent = parent if parent is not None else self.current_span()
+        if not self.enabled or not parent.sampled:
+            return NOOP_SPAN
+        span = Span(name, parent.trace_id, parent.span_id, attributes)
+        self.exporter.on_start(span)
+        return span
+
+    def record_span(self, name: str, start: float, end: float, **attributes):
+        """Record an already finished operation under the current span"""
+        parent = _current_span.get()
+        if not self.enabled or parent is None or parent is NOOP_SPAN:
+            return
+        span = Span(name, parent.trace_id, parent.span_id, attributes, start=start)
+        self.exporter.on_start(span)
+        span.end = end
+        self.exporter.on_end(span)
+
+    def finish(self, span):
+        """End a span started with start_span()"""
+        if span is NOOP_SPAN:
+            return
+        span.end = time.time()
+        self.exporter.on_end(span)
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware opening the root span of each HTTP request.
+
+    The span stays open until the response body has been sent, so streamed
+    responses are timed in full, and its trace id is returned in a header.
+    """
+
+    def __init__(self, app, tracer: Tracer = None):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        active = self.tracer or tracer
+        method = scope["method"]
+        with active.span(f"{method} {scope['path']}", **{"http.method": method}) as span:
+
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if span.trace_id:
+                        header = (settings.TRACE_HEADER.lower().encode("latin-1"), span.trace_id.encode("latin-1"))
+                        message = {**message, "headers": [*message.get("headers", []), header]}
+                await send(message)
+
+            await self.app(scope, receive, send_traced)
+
+
+def traced(name: str = None) -> Callable:
+    """Decorator recording a span around every call of an async function"""
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# Global tracer instance
+tracer = Tracer()
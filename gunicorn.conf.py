@@ -0,0 +1,79 @@
+"""
+Multi-worker deployment: gunicorn managing uvicorn workers.
+
+    python -m models.models
+    WEB_CONCURRENCY=4 SHARED_STATE_BACKEND=postgres DB_POOL_BUDGET=80 \
+        gunicorn main:app -c gunicorn.conf.py
+
+Migrations run as that separate deploy step (over MIGRATIONS_DSN /
+VECTOR_MIGRATIONS_DSN when the pools go through pgbouncer), not in each worker.
+
+The app is imported once in the master (preload_app) together with the heavy
+modules the app otherwise loads on first use, so forked workers share those
+pages and start quickly. Everything holding sockets or an event loop (database
+pools, the MCP session, HTTP clients, the document process pool) is created in
+each worker's lifespan, after the fork.
+
+Run with SHARED_STATE_BACKEND=postgres so workers share the MCP tool list and
+tool cache and an ingest or clear on one worker invalidates the search result
+cache (QUERY_CACHE_SIZE) of all of them; with the memory backend other workers
+can serve stale results for up to QUERY_CACHE_TTL_SECONDS, so set
+QUERY_CACHE_SIZE=0. Use HISTORY_CACHE_BACKEND=none unless the load balancer
+keeps sessions sticky. Metrics at /metrics cover all workers: they are
+written to PROMETHEUS_MULTIPROC_DIR (its *.db files are removed when the
+server starts).
+"""
+import glob
+import importlib
+import multiprocessing
+import os
+import tempfile
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Settings split DB_POOL_BUDGET / VECTOR_DB_POOL_BUDGET by the worker count
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Set before the preloaded app creates its metrics; stale files from a previous run would add to the totals.
+# Only prometheus_client's own *.db files are removed, in case the directory holds anything else
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "chat-api-metrics"))
+os.makedirs(metrics_dir, exist_ok=True)
+for stale in glob.glob(os.path.join(metrics_dir, "*.db")):
+    os.remove(stale)
+
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "180"))  # above AGENT_TIMEOUT_SECONDS
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth; jitter avoids simultaneous restarts
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = max_requests // 10
+
+# Imported lazily by the app; loaded in the master so workers inherit them
+PRELOAD_MODULES = (
+    "langchain_google_genai",
+    "langchain_groq",
+    "langgraph.prebuilt",
+    "langchain_mcp_adapters.client",
+    "langchain_mcp_adapters.tools",
+    "langchain_text_splitters",
+    "fitz",
+)
+
+
+def on_starting(server):
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            server.log.warning(f"Could not preload {name}: {e}")
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges (pool connections) from the totals
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,10 +1,19 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from config.settings import get_settings
 from core.database import db, vector_db
+from core.metrics import APP_STARTUP_SECONDS, CONTENT_TYPE, render as render_metrics
+from core.shared_state import shared_state
+from core.tracing import TraceMiddleware
+from models.models import run_migrations
 from services.agent_service import agent_service
 from services.vector_store_service import vector_store_service
+from services.document_service import shutdown_process_pool
+from services.job_service import job_manager
+from services.history_service import history_service
 from api.v1.endpoints import users, sessions, messages, documents
 
 settings = get_settings()
@@ -14,12 +23,28 @@ settings = get_settings()
 async def lifespan(app: FastAPI):
     """Manage application startup and shutdown"""
     # Startup
-    await db.connect()  # Chat database
-    await vector_db.connect()  # Vector database (can be same or different)
-    await agent_service.initialize()
+    started = time.perf_counter()
     
-    # Initialize vector store service with vector database pool
-    await vector_store_service.initialize(vector_db.get_pool())
+    async def init_databases():
+        if settings.RUN_MIGRATIONS:
+            # Before the pools connect, so vector connections register the codec the migrations create
+            await run_migrations()
+        # Chat and vector databases (can be same or different)
+        await asyncio.gather(db.connect(), vector_db.connect())
+        # State shared by worker processes lives in the chat database
+        await shared_state.initialize(db.get_pool())
+        # Initialize vector store service with vector database pool
+        await vector_store_service.initialize(vector_db.get_pool())
+    
+    # Database setup and the agent's MCP connection do not depend on each other
+    await asyncio.gather(init_databases(), agent_service.initialize())
+    history_service.set_summarizer(agent_service.summarize_conversation)
+    
+    # Start background ingestion workers
+    await job_manager.start()
+    
+    APP_STARTUP_SECONDS.set(time.perf_counter() - started)
+    print(f"Startup completed in {time.perf_counter() - started:.2f}s")
     
     # Initialize RAG service
     # await initialize_rag_service(vector_store_service)
@@ -27,8 +52,14 @@ async def lifespan(app: FastAPI):
     yield
     
     # Shutdown
+    await job_manager.stop()
+    # Summaries use the agent's model and the chat pool, so they finish first
+    await history_service.shutdown()
+    await agent_service.shutdown()
+    await vector_store_service.shutdown()
     await db.disconnect()
     await vector_db.disconnect()
+    shutdown_process_pool()
 
 
 app = FastAPI(
@@ -48,9 +79,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],              # Allow all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],              # Allow all headers
+    expose_headers=[settings.TRACE_HEADER],
 )
 
 
+if settings.TRACING_ENABLED:
+    # Registered only when tracing is on, so disabled tracing adds no middleware hop
+    app.add_middleware(TraceMiddleware)
+
+
 app.include_router(users.router, prefix=settings.API_V1_PREFIX)
 app.include_router(sessions.router, prefix=settings.API_V1_PREFIX)
 app.include_router(messages.router, prefix=settings.API_V1_PREFIX)
@@ -72,5 +109,12 @@ async def health_check():
     return {
         "status": "healthy",
         "database": "connected" if db.pool else "disconnected",
-        "agent": "initialized" if agent_service.agent_executor else "not initialized"
-    }
\ No newline at end of file
+        "agent": "initialized" if agent_service.agent_executor else "not initialized",
+        "mcp": agent_service.mcp_manager.status() if agent_service.mcp_manager else "not configured"
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
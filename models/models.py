@@ -0,0 +1,270 @@
+"""
+Database schema and migrations.
+
+Migrations are (version, name, statements) tuples applied in order and
+recorded in a schema_migrations table, one transaction per migration. A
+migration containing a ConcurrentIndex runs statement by statement outside a
+transaction instead, so index builds do not block writes; its statements must
+be idempotent. A session advisory lock makes concurrent runs safe.
+
+run_migrations() uses its own connections (MIGRATIONS_DSN /
+VECTOR_MIGRATIONS_DSN), never the app's pools, which may sit behind pgbouncer
+transaction pooling. Run it as a deploy step:
+
+    python -m models.models
+
+or set RUN_MIGRATIONS=true to run it at startup.
+"""
+import asyncio
+import asyncpg
+from typing import List, NamedTuple, Tuple, Union
+from config.settings import get_settings
+from core.database import connect_for_migrations
+
+settings = get_settings()
+
+
+class ConcurrentIndex(NamedTuple):
+    """An index built with CREATE INDEX CONCURRENTLY"""
+    name: str
+    definition: str  # everything after the index name: "ON table USING ..."
+
+    def statement(self) -> str:
+        return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.name} {self.definition}"
+
+
+Migration = Tuple[int, str, List[Union[str, ConcurrentIndex]]]
+
+MIGRATION_LOCK_ID = 7_246_001
+MIGRATION_LOCK_POLL_SECONDS = 0.5
+
+
+def get_chat_migrations() -> List[Migration]:
+    """Migrations for the chat memory database"""
+    return [
+        (1, "create chat tables", [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                user_id SERIAL PRIMARY KEY,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id SERIAL PRIMARY KEY,
+                user_id INTEGER REFERENCES users(user_id),
+                start_time TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                end_time TIMESTAMP WITH TIME ZONE
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                message_id SERIAL PRIMARY KEY,
+                session_id INTEGER REFERENCES sessions(session_id),
+                sender VARCHAR(50) NOT NULL,
+                message_text TEXT NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        ]),
+        (2, "index chat history lookups", [
+            "CREATE INDEX IF NOT EXISTS idx_messages_session_created ON messages (session_id, created_at DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id, start_time DESC)",
+        ]),
+        (3, "rolling session summaries", [
+            """
+            CREATE TABLE IF NOT EXISTS session_summaries (
+                session_id INTEGER PRIMARY KEY REFERENCES sessions(session_id) ON DELETE CASCADE,
+                summary TEXT NOT NULL,
+                summarized_until INTEGER NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        ]),
+        (4, "state shared across worker processes", [
+            # Unlogged: cache-like data that may be lost on a crash
+            """
+            CREATE UNLOGGED TABLE IF NOT EXISTS shared_state (
+                key TEXT PRIMARY KEY,
+                value JSONB NOT NULL,
+                expires_at TIMESTAMP WITH TIME ZONE
+            )
+            """,
+        ]),
+    ]
+
+
+def _ann_index() -> ConcurrentIndex:
+    """The configured approximate nearest neighbour index"""
+    table = settings.SUPABASE_TABLE_NAME
+    if settings.VECTOR_INDEX_TYPE == "ivfflat":
+        return ConcurrentIndex(
+            f"idx_{table}_embedding_ivfflat",
+            f"ON {table} USING ivfflat (embedding vector_cosine_ops) WITH (lists = {settings.IVFFLAT_LISTS})"
+        )
+    return ConcurrentIndex(
+        f"idx_{table}_embedding_hnsw",
+        f"ON {table} USING hnsw (embedding vector_cosine_ops) "
+        f"WITH (m = {settings.HNSW_M}, ef_construction = {settings.HNSW_EF_CONSTRUCTION})"
+    )
+
+
+def get_vector_migrations() -> List[Migration]:
+    """Migrations for the vector store database"""
+    table = settings.SUPABASE_TABLE_NAME
+    query_name = settings.SUPABASE_QUERY_NAME
+    return [
+        (1, "create vector store table", [
+            "CREATE EXTENSION IF NOT EXISTS vector",
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id BIGSERIAL PRIMARY KEY,
+                content TEXT,
+                metadata JSONB,
+                embedding vector({settings.EMBEDDING_DIMENSION})
+            )
+            """,
+            f"""
+            CREATE TABLE IF NOT EXISTS {settings.EMBEDDING_CACHE_TABLE_NAME} (
+                cache_key TEXT PRIMARY KEY,
+                embedding vector NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        ]),
+        (2, "typed user_id column and metadata indexes", [
+            # Generated from metadata so every writer (COPY included) keeps it in sync
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS user_id BIGINT "
+            f"GENERATED ALWAYS AS ((metadata->>'user_id')::bigint) STORED",
+            ConcurrentIndex(f"idx_{table}_user_id", f"ON {table} (user_id)"),
+            ConcurrentIndex(f"idx_{table}_metadata", f"ON {table} USING gin (metadata jsonb_path_ops)"),
+            ConcurrentIndex(f"idx_{table}_source", f"ON {table} ((metadata->>'source'), user_id)"),
+            ConcurrentIndex(f"idx_{table}_file_id", f"ON {table} ((metadata->>'file_id'))"),
+        ]),
+        (3, "approximate nearest neighbour index", [
+            _ann_index(),
+        ]),
+        (4, "match function using the user_id column", [
+            f"DROP FUNCTION IF EXISTS {query_name}(vector, integer, jsonb)",
+            f"""
+            CREATE FUNCTION {query_name}(
+                query_embedding vector,
+                match_count integer DEFAULT NULL,
+                filter jsonb DEFAULT '{{}}'
+            ) RETURNS TABLE (
+                id bigint,
+                content text,
+                metadata jsonb,
+                similarity float
+            )
+            LANGUAGE sql STABLE
+            AS $$
+                SELECT
+                    t.id,
+                    t.content,
+                    t.metadata,
+                    1 - (t.embedding <=> query_embedding) AS similarity
+                FROM {table} t
+                WHERE (filter->>'user_id' IS NULL OR t.user_id = (filter->>'user_id')::bigint)
+                  AND t.metadata @> (filter - 'user_id')
+                ORDER BY t.embedding <=> query_embedding
+                LIMIT match_count
+            $$
+            """,
+        ]),
+        (5, "embedding cache expiry index", [
+            ConcurrentIndex(
+                f"idx_{settings.EMBEDDING_CACHE_TABLE_NAME}_created_at",
+                f"ON {settings.EMBEDDING_CACHE_TABLE_NAME} (created_at)"
+            ),
+        ]),
+    ]
+
+
+async def _acquire_migration_lock(conn: asyncpg.Connection):
+    """
+    Take the session-level migration lock.
+
+    Polls instead of blocking: a session waiting in pg_advisory_lock holds a
+    snapshot, and CREATE INDEX CONCURRENTLY in the lock holder would wait for it.
+    """
+    while not await conn.fetchval("SELECT pg_try_advisory_lock($1)", MIGRATION_LOCK_ID):
+        await asyncio.sleep(MIGRATION_LOCK_POLL_SECONDS)
+
+
+async def _create_index_concurrently(conn: asyncpg.Connection, index: ConcurrentIndex):
+    """Build an index without blocking writes, replacing one left invalid by a failed build"""
+    invalid = await conn.fetchval(
+        "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)",
+        index.name
+    )
+    if invalid:
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}")
+    await conn.execute(index.statement())
+
+
+async def _record_migration(conn: asyncpg.Connection, scope: str, version: int, name: str):
+    await conn.execute(
+        "INSERT INTO schema_migrations (scope, version, name) VALUES ($1, $2, $3)",
+        scope,
+        version,
+        name
+    )
+
+
+async def apply_migrations(conn: asyncpg.Connection, migrations: List[Migration], scope: str):
+    """Apply pending migrations for one database over a dedicated connection"""
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            scope TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (scope, version)
+        )
+        """
+    )
+
+    await _acquire_migration_lock(conn)
+    try:
+        for version, name, statements in migrations:
+            applied = await conn.fetchval(
+                "SELECT EXISTS(SELECT 1 FROM schema_migrations WHERE scope = $1 AND version = $2)",
+                scope,
+                version
+            )
+            if applied:
+                continue
+
+            if any(isinstance(statement, ConcurrentIndex) for statement in statements):
+                # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+                for statement in statements:
+                    if isinstance(statement, ConcurrentIndex):
+                        await _create_index_concurrently(conn, statement)
+                    else:
+                        await conn.execute(statement)
+                await _record_migration(conn, scope, version, name)
+            else:
+                async with conn.transaction():
+                    for statement in statements:
+                        await conn.execute(statement)
+                    await _record_migration(conn, scope, version, name)
+            print(f"Applied {scope} migration {version}: {name}")
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+
+async def run_migrations():
+    """Bring both databases up to the current schema"""
+    for scope, migrations, vector in (("chat", get_chat_migrations(), False), ("vector", get_vector_migrations(), True)):
+        conn = await connect_for_migrations(vector)
+        try:
+            await apply_migrations(conn, migrations, scope)
+        finally:
+            await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migrations())
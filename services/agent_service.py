@@ -1,15 +1,23 @@
+import asyncio
 import os
-from typing import List, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_mcp_adapters.client import MultiServerMCPClient
-from langgraph.prebuilt import create_react_agent
+import time
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional
+from langgraph.errors import GraphRecursionError
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.callbacks import BaseCallbackHandler
 from config.settings import get_settings
+from core.metrics import AGENT_RUN_SECONDS, AGENT_STEPS, LLM_ERRORS, LLM_SECONDS
+from core.tracing import tracer
+from services.rag_tool import build_retrieval_tool
+from services.tool_cache import ToolResultCache, wrap_tools
+from services.tool_executor import ToolExecutor, ToolStepTimings, wrap_tools as wrap_executed_tools
+from services.vector_store_service import vector_store_service
 import os
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from services.mcp_service import MCPConnectionManager
+
 TOKEN = os.getenv('BEARER_TOKEN')
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 
@@ -27,87 +35,416 @@ When answering a question, follow these guidelines:
 - If a tool call fails, explain the error to the user in a helpful way.
 - Always check for a user's purchase history before suggesting a new purchase.
 - Display JSON as tables if the JSON contains more than one record.
+- Use the search_documents tool for questions about documents the user has uploaded.
+"""
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and a retail assistant.
+Update the current summary with the new messages. Keep facts the assistant may need later
+(user preferences, products, orders, ids, decisions, open questions) and drop small talk.
+Reply with the updated summary only, in at most 200 words.
 """
 
 
+class AgentError(Exception):
+    """An agent run that produced no reply; reported to the client, never saved as an AI message"""
+    code = "agent_error"
+    status_code = 502
+
+    def to_dict(self) -> dict:
+        return {"code": self.code, "message": str(self)}
+
+
+class AgentTimeoutError(AgentError):
+    code = "agent_timeout"
+    status_code = 504
+
+
+class AgentStepLimitError(AgentError):
+    code = "agent_step_limit"
+    status_code = 500
+
+
+class AgentRunMetrics(BaseCallbackHandler):
+    """Per-run callback recording chat model latency and the number of ReAct steps"""
+    run_inline = True
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.llm_calls = 0
+        self._llm_started = {}
+    
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.llm_calls += 1
+        self._llm_started[run_id] = time.perf_counter()
+    
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._llm_started.pop(run_id, None)
+        if started is not None:
+            LLM_SECONDS.observe(time.perf_counter() - started)
+    
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._llm_started.pop(run_id, None)
+        LLM_ERRORS.inc()
+    
+    def finish(self, outcome: str):
+        """Record the finished agent run"""
+        AGENT_STEPS.observe(self.llm_calls)
+        AGENT_RUN_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - self.started)
+
+
+class AgentTraceHandler(BaseCallbackHandler):
+    """Per-run callback recording a span for each LangGraph node and chat model call"""
+    run_inline = True
+    
+    def __init__(self, parent):
+        self.parent = parent
+        self._spans = {}
+        self._parents = {}
+    
+    def _parent_span(self, parent_run_id):
+        # Nearest traced ancestor run, else the span the run was started under
+        while parent_run_id is not None:
+            if parent_run_id in self._spans:
+                return self._spans[parent_run_id]
+            parent_run_id = self._parents.get(parent_run_id)
+        return self.parent
+    
+    def _start(self, name: str, run_id, parent_run_id, **attributes):
+        self._spans[run_id] = tracer.start_span(name, parent=self._parent_span(parent_run_id), **attributes)
+    
+    def _end(self, run_id, error: BaseException = None):
+        self._parents.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        if error is not None:
+            span.record_exception(error)
+        tracer.finish(span)
+    
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._parents[run_id] = parent_run_id
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._start(f"agent.node.{node}", run_id, parent_run_id, step=metadata.get("langgraph_step"))
+    
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+    
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+    
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start("agent.llm", run_id, parent_run_id)
+    
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+    
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+
 class AgentService:
     def __init__(self):
         self.agent_executor = None
+        self.llm = None
+        self.tool_cache = ToolResultCache()
+        self.tool_executor = ToolExecutor()
+        self.mcp_tools = []
+        self.mcp_manager: Optional["MCPConnectionManager"] = None
         self.system_message = SystemMessage(content=SYSTEM_PROMPT)
     
     async def initialize(self):
         """Initialize the agent with MCP client and tools"""
-        tools = []
+        # Initialize chat model
+        self.llm = self._create_llm()
+        self._build_agent()
         
         # Only try to connect if MCP_SERVER_URL is provided
         if settings.MCP_SERVER_URL:
-            try:
-                mcp_client = MultiServerMCPClient(
-                    {
-                        "retailmcp": {
-                            "url": "https://airetail-mcp.codeoffice.net/mcp",
-                            "transport": "streamable_http",
-                            "headers": {
-                                "Authorization": f"Bearer {TOKEN}"
-                            }
-                        }
-                    }
-                )
-                
-                # Fetch tools from MCP client
-                tools = await mcp_client.get_tools()
-                print(f"Successfully loaded {len(tools)} tools from MCP server")
-            except Exception as e:
-                print(f"Warning: Could not connect to MCP server: {e}")
-                print("Agent will initialize without MCP tools")
+            from services.mcp_service import MCPConnectionManager
+            
+            # Persistent, supervised session; tools are swapped in whenever it (re)connects
+            self.mcp_manager = MCPConnectionManager(
+                url=settings.MCP_SERVER_URL,
+                headers={"Authorization": f"Bearer {TOKEN}"},
+                on_tools=self.set_mcp_tools
+            )
+            await self.mcp_manager.start()
         else:
             print("No MCP_SERVER_URL configured, agent will run without MCP tools")
+    
+    def _create_llm(self):
+        """Build the chat model used by the agent"""
+        from langchain_groq import ChatGroq
         
-        # Initialize chat model
-        llm = ChatGroq(
+        return ChatGroq(
             model="openai/gpt-oss-20b",
             temperature=0.1,
             api_key=GROQ_API_KEY,
         )
+    
+    async def shutdown(self):
+        """Close the MCP session"""
+        if self.mcp_manager:
+            await self.mcp_manager.stop()
+    
+    def set_mcp_tools(self, tools: List):
+        """Hot-swap the MCP tool list; in-flight requests keep the agent they started with"""
+        self.mcp_tools = wrap_tools(tools, self.tool_cache)
+        self._build_agent()
+    
+    def _build_agent(self):
+        """(Re)build the ReAct agent from the current tool list"""
+        from langgraph.prebuilt import create_react_agent
+        
+        tools = list(self.mcp_tools)
+        
+        # In-process RAG retrieval, scoped per call through the run config
+        if settings.RAG_TOOL_ENABLED:
+            tools.append(build_retrieval_tool(vector_store_service))
+        
+        # Tool calls of one step run concurrently, capped and individually timed out
+        tools = wrap_executed_tools(tools, self.tool_executor)
         
         # Create agent using langgraph (no state_modifier parameter)
         self.agent_executor = create_react_agent(
-            model=llm,
+            model=self.llm,
             tools=tools
         )
     
-    async def get_response(self, user_input: str, chat_history: List) -> str:
-        """Get response from the agent with chat history"""
+    def _build_messages(self, user_input: str, chat_history: List) -> List:
+        """Build messages list with system message first"""
+        messages = [self.system_message]
+        
+        # Add chat history (a SystemMessage here is the rolling session summary)
+        for msg in chat_history:
+            if isinstance(msg, (HumanMessage, AIMessage, SystemMessage)):
+                messages.append(msg)
+        
+        # Add current user input
+        messages.append(HumanMessage(content=user_input))
+        return messages
+    
+    def _build_config(
+        self,
+        user_id: Optional[int],
+        session_id: Optional[int],
+        timings: Optional[ToolStepTimings] = None,
+        callbacks: Optional[List[BaseCallbackHandler]] = None
+    ) -> dict:
+        """Per-turn run config read by in-process tools and the tool executor"""
+        return {
+            "callbacks": callbacks or [],
+            # Each ReAct iteration is a model step plus a tools step
+            "recursion_limit": settings.AGENT_MAX_ITERATIONS * 2 + 1,
+            "configurable": {
+                "user_id": user_id,
+                "session_id": session_id,
+                "retrieval_memo": {},
+                "tool_timings": timings,
+                "tool_slots": self.tool_executor.run_slots()
+            }
+        }
+    
+    async def summarize_conversation(self, previous_summary: str, messages: List) -> str:
+        """Extend a rolling conversation summary with new messages"""
+        if not self.llm:
+            raise RuntimeError("Agent not initialized")
+        
+        transcript = "\n".join(
+            f"{'User' if isinstance(msg, HumanMessage) else 'AI'}: {msg.content}"
+            for msg in messages
+        )
+        prompt = [
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}")
+        ]
+        result = await self.llm.ainvoke(prompt, config={"callbacks": [AgentRunMetrics()]})
+        return result.content
+    
+    async def get_response(
+        self,
+        user_input: str,
+        chat_history: List,
+        user_id: Optional[int] = None,
+        session_id: Optional[int] = None,
+        timings: Optional[ToolStepTimings] = None
+    ) -> str:
+        """
+        Get response from the agent with chat history; tool call timings are recorded into `timings`
+        
+        Raises AgentTimeoutError after AGENT_TIMEOUT_SECONDS (cancelling in-flight
+        LLM and tool calls), AgentStepLimitError after AGENT_MAX_ITERATIONS ReAct
+        iterations, and AgentError for any other failure of the run.
+        """
+        if not self.agent_executor:
+            raise RuntimeError("Agent not initialized")
+        
+        timings = timings if timings is not None else ToolStepTimings()
+        run_metrics = AgentRunMetrics()
+        outcome = "error"
+        messages = self._build_messages(user_input, chat_history)
+        with tracer.span("agent.get_response") as span:
+            callbacks = [run_metrics, AgentTraceHandler(span)] if span.sampled else [run_metrics]
+            try:
+                # Invoke agent; the deadline cancels the graph run and everything it awaits
+                async with asyncio.timeout(settings.AGENT_TIMEOUT_SECONDS) as deadline:
+                    result = await self.agent_executor.ainvoke(
+                        {"messages": messages},
+                        config=self._build_config(user_id, session_id, timings, callbacks)
+                    )
+                outcome = "ok"
+            except TimeoutError as e:
+                if not deadline.expired():
+                    # A timeout raised inside the run (e.g. by the LLM client), not our deadline
+                    print(f"Agent error: {e}")
+                    raise AgentError(str(e) or type(e).__name__) from e
+                outcome = "timeout"
+                raise AgentTimeoutError(f"The agent did not finish within {settings.AGENT_TIMEOUT_SECONDS:g}s")
+            except GraphRecursionError:
+                outcome = "step_limit"
+                raise AgentStepLimitError(f"The agent did not finish within {settings.AGENT_MAX_ITERATIONS} steps")
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            except Exception as e:
+                print(f"Agent error: {e}")
+                raise AgentError(str(e) or type(e).__name__) from e
+            finally:
+                self.tool_executor.record_turn(timings)
+                run_metrics.finish(outcome)
+                span.set_attribute("outcome", outcome)
+        
+        # Extract response from result
+        if "messages" in result and len(result["messages"]) > 0:
+            # Get the last AI message
+            for msg in reversed(result["messages"]):
+                if isinstance(msg, AIMessage):
+                    return msg.content
+        
+        return "I apologize, but I couldn't generate a response."
+    
+    async def stream_response(
+        self,
+        user_input: str,
+        chat_history: List,
+        user_id: Optional[int] = None,
+        session_id: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Stream the agent run as events.
+        
+        Yields dicts of the form {"event": ..., "data": ...} where event is one of
+        "token", "tool_start", "tool_end" or "done". The "done" event carries the
+        full final reply and per-step tool timings. Closing the iterator cancels
+        the underlying agent run. Deadline, step-limit and run failures raise the
+        same AgentError types as get_response.
+        """
         if not self.agent_executor:
             raise RuntimeError("Agent not initialized")
         
+        messages = self._build_messages(user_input, chat_history)
+        final_response = ""
+        timings = ToolStepTimings()
+        run_metrics = AgentRunMetrics()
+        # Stays "cancelled" if the consumer closes the stream early
+        outcome = "cancelled"
+        deadline = asyncio.get_running_loop().time() + settings.AGENT_TIMEOUT_SECONDS
+        
+        # Started explicitly: a context-managed span cannot stay current across yields
+        span = tracer.start_span("agent.stream_response")
+        callbacks = [run_metrics, AgentTraceHandler(span)] if span.sampled else [run_metrics]
+        
+        events = self.agent_executor.astream_events(
+            {"messages": messages},
+            config=self._build_config(user_id, session_id, timings, callbacks),
+            version="v2"
+        )
         try:
-            # Build messages list with system message first
-            messages = [self.system_message]
-            
-            # Add chat history
-            for msg in chat_history:
-                if isinstance(msg, (HumanMessage, AIMessage)):
-                    messages.append(msg)
-            
-            # Add current user input
-            messages.append(HumanMessage(content=user_input))
-            
-            # Invoke agent
-            result = await self.agent_executor.ainvoke({"messages": messages})
-            
-            # Extract response from result
-            if "messages" in result and len(result["messages"]) > 0:
-                # Get the last AI message
-                for msg in reversed(result["messages"]):
-                    if isinstance(msg, AIMessage):
-                        return msg.content
-            
-            return "I apologize, but I couldn't generate a response."
-            
-        except Exception as e:
-            print(f"Agent error: {e}")
-            return f"I encountered an error: {str(e)}"
+            while True:
+                # The deadline only covers the agent, not time spent by the consumer
+                remaining = deadline - asyncio.get_running_loop().time()
+                try:
+                    event = await asyncio.wait_for(events.__anext__(), timeout=max(remaining, 0))
+                except StopAsyncIteration:
+                    outcome = "ok"
+                    break
+                except asyncio.TimeoutError as e:
+                    if deadline - asyncio.get_running_loop().time() > 0:
+                        # A timeout raised inside the run (e.g. by the LLM client), not our deadline
+                        outcome = "error"
+                        print(f"Agent stream error: {e}")
+                        span.record_exception(e)
+                        raise AgentError(str(e) or type(e).__name__) from e
+                    outcome = "timeout"
+                    raise AgentTimeoutError(f"The agent did not finish within {settings.AGENT_TIMEOUT_SECONDS:g}s")
+                except GraphRecursionError:
+                    outcome = "step_limit"
+                    raise AgentStepLimitError(f"The agent did not finish within {settings.AGENT_MAX_ITERATIONS} steps")
+                except Exception as e:
+                    outcome = "error"
+                    print(f"Agent stream error: {e}")
+                    span.record_exception(e)
+                    raise AgentError(str(e) or type(e).__name__) from e
+                
+                kind = event["event"]
+                
+                if kind == "on_chat_model_stream":
+                    content = _content_text(event["data"]["chunk"].content)
+                    if content:
+                        yield {"event": "token", "data": {"content": content}}
+                
+                elif kind == "on_chat_model_end":
+                    # Only a model turn without tool calls is the final answer
+                    output = event["data"].get("output")
+                    if isinstance(output, AIMessage) and not output.tool_calls:
+                        final_response = _content_text(output.content)
+                
+                elif kind == "on_tool_start":
+                    yield {
+                        "event": "tool_start",
+                        "data": {
+                            "name": event["name"],
+                            "run_id": event["run_id"],
+                            "input": event["data"].get("input")
+                        }
+                    }
+                
+                elif kind == "on_tool_end":
+                    output = event["data"].get("output")
+                    yield {
+                        "event": "tool_end",
+                        "data": {
+                            "name": event["name"],
+                            "run_id": event["run_id"],
+                            "output": getattr(output, "content", output)
+                        }
+                    }
+        finally:
+            # Propagates cancellation into the graph when the consumer stops early
+            await events.aclose()
+            self.tool_executor.record_turn(timings)
+            run_metrics.finish(outcome)
+            span.set_attribute("outcome", outcome)
+            tracer.finish(span)
+        
+        if not final_response:
+            final_response = "I apologize, but I couldn't generate a response."
+        
+        yield {"event": "done", "data": {"content": final_response, "tool_steps": timings.summary()}}
+
+
+def _content_text(content) -> str:
+    """Normalize message content (str or list of content blocks) to plain text"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            block if isinstance(block, str) else block.get("text", "")
+            for block in content
+        )
+    return ""
 
 
 agent_service = AgentService()
@@ -1,16 +1,125 @@
-import fitz  # PyMuPDF
-import tempfile
+import asyncio
+import codecs
+import hashlib
 import os
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
 from uuid import uuid4
 from datetime import datetime
-from typing import List, BinaryIO
-# from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import TYPE_CHECKING, AsyncIterator, Callable, List, BinaryIO, Optional
 from langchain_core.documents import Document
 from config.settings import get_settings
+from core.metrics import PDF_PAGE_SECONDS
+
+if TYPE_CHECKING:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 settings = get_settings()
 
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> Optional[Executor]:
+    """Get the shared extraction process pool (None means run in a thread instead)"""
+    global _process_pool
+    if settings.DOCUMENT_PROCESS_WORKERS <= 0:
+        return None
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.DOCUMENT_PROCESS_WORKERS)
+    return _process_pool
+
+
+def shutdown_process_pool():
+    """Shut down the extraction process pool"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """Count pages of a PDF on disk"""
+    import fitz  # PyMuPDF, imported on first use (usually in a worker process)
+
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        return doc.page_count
+
+
+def extract_pdf_pages(pdf_path: str, start: int = 0, end: Optional[int] = None) -> str:
+    """Extract text from pages [start, end) of a PDF on disk"""
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        end = doc.page_count if end is None else min(end, doc.page_count)
+        return "\n".join(doc[page_number].get_text() for page_number in range(start, end))
+
+
+@lru_cache(maxsize=8)
+def _get_text_splitter(chunk_size: int, chunk_overlap: int) -> "RecursiveCharacterTextSplitter":
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        add_start_index=True,
+        separators=["\n\n", "\n", ".", " ", ""],
+    )
+
+
+def split_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """Split text into chunks (module-level so it can run in a worker process)"""
+    return _get_text_splitter(chunk_size, chunk_overlap).split_text(text)
+
+
+def hash_text(text: str) -> str:
+    """Content hash used to detect unchanged chunks on re-upload"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+async def run_in_pool(func, *args):
+    """Run a CPU-bound function in the process pool, or a thread if the pool is disabled"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+
+async def extract_pdf_range(pdf_path: str, start: int, end: int, page_count: int) -> str:
+    """Extract a page range in the pool, recording extraction time per page"""
+    started = time.perf_counter()
+    text = await run_in_pool(extract_pdf_pages, pdf_path, start, end)
+    pages = min(end, page_count) - start
+    if pages > 0:
+        elapsed = time.perf_counter() - started
+        for _ in range(pages):
+            PDF_PAGE_SECONDS.observe(elapsed / pages)
+    return text
+
+
+async def spool_to_disk(file: BinaryIO, suffix: str = "", file_hash=None) -> str:
+    """
+    Copy an upload into a named temp file and return its path.
+    
+    Pool workers open the file by path, so a page range costs a few bytes of
+    IPC instead of a pickled copy of the whole document. The caller removes
+    the file when done.
+    """
+    spool = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        while True:
+            block = await file.read(settings.INGEST_READ_BLOCK_SIZE)
+            if not block:
+                break
+            if file_hash is not None:
+                file_hash.update(block)
+            await asyncio.to_thread(spool.write, block)
+        spool.close()
+    except BaseException:
+        spool.close()
+        os.unlink(spool.name)
+        raise
+    return spool.name
+
 
 class DocumentService:
     """Handle document extraction, chunking, and metadata creation"""
@@ -18,26 +127,18 @@ class DocumentService:
     def __init__(self, chunk_size: int = None, chunk_overlap: int = None):
         self.chunk_size = chunk_size or settings.DEFAULT_CHUNK_SIZE
         self.chunk_overlap = chunk_overlap or settings.DEFAULT_CHUNK_OVERLAP
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            add_start_index=True,
-            separators=["\n\n", "\n", ".", " ", ""],
-        )
+    
+    @property
+    def text_splitter(self) -> "RecursiveCharacterTextSplitter":
+        """Shared splitter for this chunk configuration, built on first use"""
+        return _get_text_splitter(self.chunk_size, self.chunk_overlap)
     
     def extract_text_from_pdf(self, pdf_content: bytes) -> str:
         """Extract text from PDF bytes"""
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(pdf_content)
-            tmp_file_path = tmp_file.name
+        import fitz  # PyMuPDF
         
-        try:
-            doc = fitz.open(tmp_file_path)
-            text = "\n".join([page.get_text() for page in doc])
-            doc.close()
-            return text
-        finally:
-            os.unlink(tmp_file_path)
+        with fitz.open(stream=pdf_content, filetype="pdf") as doc:
+            return "\n".join(page.get_text() for page in doc)
     
     def extract_text_from_txt(self, txt_content: bytes) -> str:
         """Extract text from TXT bytes"""
@@ -56,13 +157,22 @@ class DocumentService:
         """Split text into chunks"""
         return self.text_splitter.split_text(text)
     
-    def create_documents(self, chunks: List[str], filename: str, file_type: str, user_id: int = None) -> List[Document]:
+    def create_documents(
+        self,
+        chunks: List[str],
+        filename: str,
+        file_type: str,
+        user_id: int = None,
+        file_id: str = None,
+        start_index: int = 0,
+        total_chunks: int = None
+    ) -> List[Document]:
         """Create Document objects with metadata"""
         documents = []
-        file_id = str(uuid4())
-        total_chunks = len(chunks)
+        file_id = file_id or str(uuid4())
+        total_chunks = len(chunks) if total_chunks is None else total_chunks
         
-        for idx, chunk in enumerate(chunks):
+        for idx, chunk in enumerate(chunks, start=start_index):
             lines_from = idx * (self.chunk_size // 50)
             lines_to = lines_from + (len(chunk) // 50)
             
@@ -73,6 +183,7 @@ class DocumentService:
                 "chunk_index": idx,
                 "total_chunks": total_chunks,
                 "chunk_size": len(chunk),
+                "chunk_hash": hash_text(chunk),
                 "timestamp": datetime.now().isoformat(),
                 "user_id": user_id,
                 "loc": {
@@ -98,6 +209,79 @@ class DocumentService:
         documents = self.create_documents(chunks, filename, file_type, user_id)
         
         return documents, len(chunks)
+    
+    async def iter_text_segments(
+        self,
+        file: BinaryIO,
+        content_type: str,
+        on_pages: Callable[[int, int], None] = None,
+        file_hash=None
+    ) -> AsyncIterator[str]:
+        """
+        Yield the text of an upload piece by piece.
+        
+        PDFs are yielded per page range (the next range is extracted while the
+        current one is consumed); text files are decoded block by block.
+        on_pages(done, total) is called after each PDF page range, and
+        file_hash (a hashlib object) is updated with the raw bytes read.
+        """
+        if content_type == "application/pdf":
+            path = await spool_to_disk(file, ".pdf", file_hash)
+            next_range = None
+            try:
+                page_count = await run_in_pool(count_pdf_pages, path)
+                pages_per_task = settings.PDF_PAGES_PER_TASK
+                starts = list(range(0, page_count, pages_per_task))
+                if starts:
+                    next_range = asyncio.ensure_future(extract_pdf_range(path, 0, pages_per_task, page_count))
+                for position, start in enumerate(starts):
+                    text = await next_range
+                    next_range = None
+                    if position + 1 < len(starts):
+                        following = starts[position + 1]
+                        next_range = asyncio.ensure_future(
+                            extract_pdf_range(path, following, following + pages_per_task, page_count)
+                        )
+                    if on_pages:
+                        on_pages(min(start + pages_per_task, page_count), page_count)
+                    yield text if position == 0 else "\n" + text
+            finally:
+                if next_range is not None:
+                    next_range.cancel()
+                os.unlink(path)
+        elif content_type in ["text/plain", "text/txt"]:
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            while True:
+                block = await file.read(settings.INGEST_READ_BLOCK_SIZE)
+                if not block:
+                    break
+                if file_hash is not None:
+                    file_hash.update(block)
+                yield decoder.decode(block)
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+        else:
+            raise ValueError(f"Unsupported file type: {content_type}")
+    
+    async def iter_chunks(self, segments: AsyncIterator[str]) -> AsyncIterator[List[str]]:
+        """
+        Chunk a stream of text segments without materializing the whole text.
+        
+        The last chunk of every segment is carried over and re-split together
+        with the next segment, so chunk boundaries match a one-shot split closely.
+        """
+        carry = ""
+        async for segment in segments:
+            chunks = await run_in_pool(split_text, carry + segment, self.chunk_size, self.chunk_overlap)
+            if not chunks:
+                continue
+            carry = chunks.pop()
+            if chunks:
+                yield chunks
+        
+        if carry.strip():
+            yield await run_in_pool(split_text, carry, self.chunk_size, self.chunk_overlap)
 
 
 # Global document service instance
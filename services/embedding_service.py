@@ -0,0 +1,95 @@
+import asyncio
+import inspect
+import random
+import time
+from functools import partial
+from typing import List
+from langchain_core.embeddings import Embeddings
+from config.settings import get_settings
+from core.metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_ERRORS, EMBEDDING_SECONDS
+
+settings = get_settings()
+
+RATE_LIMIT_ERRORS = ("ResourceExhausted", "TooManyRequests", "RateLimitError")
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an embedding provider error is a rate-limit / quota error"""
+    if type(error).__name__ in RATE_LIMIT_ERRORS:
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or "rate limit" in message.lower()
+
+
+class AsyncEmbedder:
+    """
+    Run a synchronous LangChain embedder off the event loop.
+
+    Texts are split into batches of `batch_size`, at most `max_concurrency`
+    batches are embedded at once in worker threads, and rate-limit errors are
+    retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = None,
+        max_concurrency: int = None,
+        max_retries: int = None,
+        retry_base_delay: float = None
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.max_concurrency = max_concurrency or settings.EMBEDDING_MAX_CONCURRENCY
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_base_delay = settings.EMBEDDING_RETRY_BASE_DELAY if retry_base_delay is None else retry_base_delay
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _call_with_retry(self, kind: str, func, texts):
+        """Run func in a worker thread, retrying on rate-limit errors"""
+        EMBEDDING_BATCH_SIZE.labels(kind=kind).observe(len(texts) if isinstance(texts, list) else 1)
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    started = time.perf_counter()
+                    result = await asyncio.to_thread(func, texts)
+                    EMBEDDING_SECONDS.labels(kind=kind).observe(time.perf_counter() - started)
+                    return result
+            except Exception as e:
+                if attempt >= self.max_retries or not is_rate_limit_error(e):
+                    EMBEDDING_ERRORS.labels(kind=kind).inc()
+                    raise
+                delay = self.retry_base_delay * (2 ** attempt)
+                delay += random.uniform(0, delay / 2)
+                print(f"Embedding rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in concurrent batches, preserving input order"""
+        if not texts:
+            return []
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(
+            *(self._call_with_retry("documents", self.embeddings.embed_documents, batch) for batch in batches)
+        )
+        return [embedding for batch in results for embedding in batch]
+
+    async def embed_query(self, text: str) -> List[float]:
+        """Embed a single query"""
+        return await self._call_with_retry("query", self.embeddings.embed_query, text)
+
+    async def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries, in one batch call when the embedder supports query task types"""
+        if not texts:
+            return []
+
+        if "task_type" in inspect.signature(self.embeddings.embed_documents).parameters:
+            batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+            embed = partial(self.embeddings.embed_documents, task_type="RETRIEVAL_QUERY")
+            results = await asyncio.gather(*(self._call_with_retry("query", embed, batch) for batch in batches))
+            return [embedding for batch in results for embedding in batch]
+
+        return list(await asyncio.gather(*(self.embed_query(text) for text in texts)))
@@ -0,0 +1,363 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncpg
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from config.settings import get_settings
+from core.metrics import HISTORY_CACHE_EVICTIONS, HISTORY_CACHE_LOOKUPS, HISTORY_CACHE_SESSIONS
+from services.rag_tool import estimate_tokens
+
+settings = get_settings()
+
+Summarizer = Callable[[str, List[BaseMessage]], Awaitable[str]]
+
+
+def to_chat_message(sender: str, text: str) -> Optional[BaseMessage]:
+    """Convert a stored message row to a LangChain message"""
+    if sender == 'User':
+        return HumanMessage(content=text)
+    elif sender == 'AI':
+        return AIMessage(content=text)
+    return None
+
+
+@dataclass
+class HistoryEntry:
+    """Cached history of one session: summary plus recent messages (oldest first)"""
+    summary: Optional[str]
+    summarized_until: int
+    messages: List[Tuple[int, BaseMessage]] = field(default_factory=list)
+
+
+class HistoryCacheBackend(ABC):
+    """Interface for hot-session history caches"""
+
+    @abstractmethod
+    async def get(self, session_id: int) -> Optional[HistoryEntry]:
+        ...
+
+    @abstractmethod
+    async def set(self, session_id: int, entry: HistoryEntry):
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: int):
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+
+class NullHistoryCache(HistoryCacheBackend):
+    """Disabled cache: every turn reads history from the database"""
+
+    async def get(self, session_id: int) -> Optional[HistoryEntry]:
+        return None
+
+    async def set(self, session_id: int, entry: HistoryEntry):
+        pass
+
+    async def delete(self, session_id: int):
+        pass
+
+
+class InMemoryHistoryCache(HistoryCacheBackend):
+    """
+    Per-process LRU of session histories, evicted after an idle timeout.
+
+    Only correct when a session's turns stay on one worker process; use "none"
+    for multi-worker deployments without sticky sessions.
+    """
+
+    def __init__(self, max_sessions: int = None, idle_seconds: float = None):
+        self.max_sessions = max_sessions or settings.HISTORY_CACHE_MAX_SESSIONS
+        self.idle_seconds = idle_seconds or settings.HISTORY_CACHE_IDLE_SECONDS
+        self._entries: "OrderedDict[int, Tuple[float, HistoryEntry]]" = OrderedDict()
+        self.evictions = 0
+
+    async def get(self, session_id: int) -> Optional[HistoryEntry]:
+        item = self._entries.get(session_id)
+        if item is None:
+            return None
+        last_used, entry = item
+        if time.monotonic() - last_used > self.idle_seconds:
+            del self._entries[session_id]
+            self.evictions += 1
+            HISTORY_CACHE_EVICTIONS.inc()
+            HISTORY_CACHE_SESSIONS.set(len(self._entries))
+            return None
+        self._entries[session_id] = (time.monotonic(), entry)
+        self._entries.move_to_end(session_id)
+        return entry
+
+    async def set(self, session_id: int, entry: HistoryEntry):
+        self._entries[session_id] = (time.monotonic(), entry)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            HISTORY_CACHE_EVICTIONS.inc()
+        HISTORY_CACHE_SESSIONS.set(len(self._entries))
+
+    async def delete(self, session_id: int):
+        self._entries.pop(session_id, None)
+        HISTORY_CACHE_SESSIONS.set(len(self._entries))
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._entries),
+            "max_sessions": self.max_sessions,
+            "idle_seconds": self.idle_seconds,
+            "evictions": self.evictions
+        }
+
+
+def create_history_cache(backend: str = None) -> HistoryCacheBackend:
+    """Build the configured history cache backend"""
+    backend = backend or settings.HISTORY_CACHE_BACKEND
+    if backend == "memory":
+        return InMemoryHistoryCache()
+    if backend == "none":
+        return NullHistoryCache()
+    raise ValueError(f"Unsupported history cache backend: {backend}")
+
+
+class HistoryService:
+    """
+    Build token-budgeted chat history and maintain rolling session summaries.
+
+    History is filled from the newest message backwards until
+    HISTORY_TOKEN_BUDGET is used. Once a session has more than
+    HISTORY_SUMMARY_THRESHOLD unsummarized messages, everything except the
+    newest HISTORY_KEEP_RECENT messages is folded into the stored summary,
+    extending the previous summary instead of recomputing it.
+
+    Hot sessions are served from a history cache of built message objects,
+    appended to on every write, so active chats skip the history query.
+    """
+
+    def __init__(self, token_budget: int = None, cache: HistoryCacheBackend = None):
+        self.token_budget = token_budget or settings.HISTORY_TOKEN_BUDGET
+        self.cache = cache or create_history_cache()
+        self.summarizer: Optional[Summarizer] = None
+        # Sequence number of each session's latest write, oldest first; entries
+        # evicted from it are covered by _evicted_seq
+        self._write_seq = 0
+        self._write_versions: "OrderedDict[int, int]" = OrderedDict()
+        self._evicted_seq = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._summary_locks: Dict[int, asyncio.Lock] = {}
+        self._summary_tasks: set = set()
+
+    def set_summarizer(self, summarizer: Summarizer):
+        """Register the coroutine used to extend a summary with new messages"""
+        self.summarizer = summarizer
+
+    async def load(self, pool: asyncpg.Pool, session_id: Optional[int]) -> List[BaseMessage]:
+        """Load history for a session within the token budget"""
+        if session_id is None:
+            return []
+
+        entry = await self.cache.get(session_id)
+        if entry is not None:
+            self.cache_hits += 1
+            HISTORY_CACHE_LOOKUPS.labels(result="hit").inc()
+        else:
+            self.cache_misses += 1
+            HISTORY_CACHE_LOOKUPS.labels(result="miss").inc()
+            entry = await self._load_entry(pool, session_id)
+
+        return self._apply_budget(entry)
+
+    async def _load_entry(self, pool: asyncpg.Pool, session_id: int) -> HistoryEntry:
+        """Read summary and recent messages from the database and cache them"""
+        started = self._write_seq
+
+        async with pool.acquire() as conn:
+            summary_row = await conn.fetchrow(
+                "SELECT summary, summarized_until FROM session_summaries WHERE session_id = $1",
+                session_id
+            )
+            summarized_until = summary_row['summarized_until'] if summary_row else 0
+            recent_messages = await conn.fetch(
+                """
+                SELECT message_id, sender, message_text FROM messages
+                WHERE session_id = $1 AND message_id > $2
+                ORDER BY created_at DESC, message_id DESC
+                LIMIT $3
+                """,
+                session_id,
+                summarized_until,
+                settings.HISTORY_FETCH_LIMIT
+            )
+
+        messages = []
+        for row in reversed(recent_messages):
+            message = to_chat_message(row['sender'], row['message_text'])
+            if message is not None:
+                messages.append((row['message_id'], message))
+
+        entry = HistoryEntry(
+            summary=summary_row['summary'] if summary_row else None,
+            summarized_until=summarized_until,
+            messages=messages
+        )
+
+        # Skip caching if a write for this session (or an evicted one) landed while we were reading
+        if self._write_versions.get(session_id, 0) <= started and self._evicted_seq <= started:
+            await self.cache.set(session_id, entry)
+        return entry
+
+    def _apply_budget(self, entry: HistoryEntry) -> List[BaseMessage]:
+        """Select the newest messages that fit in the token budget"""
+        budget = self.token_budget
+        summary_message = None
+        if entry.summary:
+            summary_message = SystemMessage(
+                content=f"Summary of the earlier conversation:\n{entry.summary}"
+            )
+            budget -= estimate_tokens(summary_message.content)
+
+        # Walk newest -> oldest until the budget is used up
+        selected = []
+        for _, message in reversed(entry.messages):
+            cost = estimate_tokens(message.content)
+            if cost > budget:
+                if not selected and budget > 0:
+                    # Always keep (a truncated copy of) the latest message
+                    selected.append(message.model_copy(update={"content": message.content[:budget * 4]}))
+                break
+            selected.append(message)
+            budget -= cost
+
+        history = list(reversed(selected))
+        if summary_message:
+            history.insert(0, summary_message)
+        return history
+
+    async def record_exchange(self, session_id: int, rows: List) -> None:
+        """Append newly saved message rows (message_id, sender, message_text) to the cached history"""
+        self._write_seq += 1
+        self._write_versions[session_id] = self._write_seq
+        self._write_versions.move_to_end(session_id)
+        while len(self._write_versions) > settings.HISTORY_CACHE_MAX_SESSIONS * 2:
+            _, self._evicted_seq = self._write_versions.popitem(last=False)
+
+        entry = await self.cache.get(session_id)
+        if entry is None:
+            return
+
+        for row in rows:
+            message = to_chat_message(row['sender'], row['message_text'])
+            if message is not None:
+                entry.messages.append((row['message_id'], message))
+        del entry.messages[:-settings.HISTORY_FETCH_LIMIT]
+        await self.cache.set(session_id, entry)
+
+    def stats(self) -> dict:
+        """Cache hit rate and database reads saved"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "backend": type(self.cache).__name__,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+            "db_reads_saved": self.cache_hits,
+            **self.cache.stats()
+        }
+
+    def schedule_summary_update(self, pool: asyncpg.Pool, session_id: int):
+        """Update the session summary in the background if it has grown past the threshold"""
+        if not settings.HISTORY_SUMMARY_ENABLED or self.summarizer is None:
+            return
+        task = asyncio.create_task(self.update_summary(pool, session_id))
+        self._summary_tasks.add(task)
+        task.add_done_callback(self._summary_tasks.discard)
+
+    async def shutdown(self, timeout: float = None):
+        """Give running summary updates `timeout` seconds to finish, then cancel the rest"""
+        timeout = settings.HISTORY_SUMMARY_SHUTDOWN_TIMEOUT if timeout is None else timeout
+        tasks = list(self._summary_tasks)
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def update_summary(self, pool: asyncpg.Pool, session_id: int):
+        """Fold older unsummarized messages into the stored summary"""
+        lock = self._summary_locks.setdefault(session_id, asyncio.Lock())
+        if lock.locked():
+            # Another turn is already summarizing this session
+            return
+
+        async with lock:
+            try:
+                async with pool.acquire() as conn:
+                    summary_row = await conn.fetchrow(
+                        "SELECT summary, summarized_until FROM session_summaries WHERE session_id = $1",
+                        session_id
+                    )
+                    summarized_until = summary_row['summarized_until'] if summary_row else 0
+                    rows = await conn.fetch(
+                        """
+                        SELECT message_id, sender, message_text FROM messages
+                        WHERE session_id = $1 AND message_id > $2
+                        ORDER BY created_at ASC, message_id ASC
+                        """,
+                        session_id,
+                        summarized_until
+                    )
+
+                if len(rows) <= settings.HISTORY_SUMMARY_THRESHOLD:
+                    return
+
+                to_fold = rows[:len(rows) - settings.HISTORY_KEEP_RECENT]
+                messages = [
+                    message for message in (to_chat_message(row['sender'], row['message_text']) for row in to_fold)
+                    if message is not None
+                ]
+                previous = summary_row['summary'] if summary_row else ""
+
+                # The LLM call runs without holding a pooled connection
+                summary = await self.summarizer(previous, messages)
+
+                async with pool.acquire() as conn:
+                    await conn.execute(
+                        """
+                        INSERT INTO session_summaries (session_id, summary, summarized_until, updated_at)
+                        VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
+                        ON CONFLICT (session_id) DO UPDATE
+                        SET summary = EXCLUDED.summary,
+                            summarized_until = EXCLUDED.summarized_until,
+                            updated_at = EXCLUDED.updated_at
+                        """,
+                        session_id,
+                        summary,
+                        to_fold[-1]['message_id']
+                    )
+
+                entry = await self.cache.get(session_id)
+                if entry is not None:
+                    entry.summary = summary
+                    entry.summarized_until = to_fold[-1]['message_id']
+                    entry.messages = [item for item in entry.messages if item[0] > entry.summarized_until]
+                    await self.cache.set(session_id, entry)
+            except Exception as e:
+                print(f"Warning: Could not update summary for session {session_id}: {e}")
+            finally:
+                self._summary_locks.pop(session_id, None)
+
+
+# Global history service instance
+history_service = HistoryService()
+
+
+def get_history_service() -> HistoryService:
+    """Dependency for getting history service"""
+    return history_service
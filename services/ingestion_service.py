@@ -0,0 +1,237 @@
+import asyncio
+import contextlib
+import hashlib
+import time
+from dataclasses import dataclass, asdict
+from typing import List, Optional
+from uuid import uuid4
+from langchain_core.documents import Document
+from config.settings import get_settings
+from services.document_service import DocumentService, hash_text
+from services.vector_store_service import VectorStoreService
+
+settings = get_settings()
+
+SUPPORTED_CONTENT_TYPES = ["application/pdf", "text/plain"]
+
+# Files ingested at once across all requests and jobs of this process
+_file_semaphore = asyncio.Semaphore(settings.INGEST_MAX_CONCURRENT_FILES)
+
+
+@dataclass
+class FileProgress:
+    """Progress of a single file moving through the ingestion pipeline"""
+    filename: str
+    status: str = "pending"  # pending, processing, success, unchanged, error
+    file_id: Optional[str] = None
+    chunks_added: int = 0
+    chunks_skipped: int = 0
+    chunks_deleted: int = 0
+    pages_processed: int = 0
+    total_pages: Optional[int] = None
+    error: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["duration"] = self.duration
+        return data
+
+
+class IngestionPipeline:
+    """
+    Stream uploads through read -> extract -> chunk -> embed -> insert.
+
+    Chunks flow in batches of `batch_size` through a queue holding at most
+    `queue_size` batches, so memory per file stays bounded by the queue (PDFs
+    are spooled to a temp file that the extraction workers open by path).
+    Each file is its own unit of work: a failure rolls back only that file's
+    rows.
+
+    With `dedupe`, a file whose hash matches the stored copy of the same
+    source and user is skipped before extraction ("unchanged"). Otherwise
+    chunks whose content hash is already stored are kept instead of
+    re-embedded, and stored chunks that no longer appear in the file are
+    deleted once it completes. Re-ingests of one source are serialized across
+    workers by an advisory lock, waiting at most INGEST_SOURCE_LOCK_TIMEOUT.
+
+    At most INGEST_MAX_CONCURRENT_FILES files are processed at once per
+    process, however many requests or jobs submit them.
+    """
+
+    def __init__(
+        self,
+        doc_service: DocumentService,
+        vector_service: VectorStoreService,
+        batch_size: int = None,
+        queue_size: int = None,
+        dedupe: bool = False
+    ):
+        self.doc_service = doc_service
+        self.vector_service = vector_service
+        self.dedupe = dedupe
+        self.batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        self.queue_size = queue_size or settings.INGEST_QUEUE_SIZE
+
+    async def ingest_file(self, file, content_type: str, user_id: Optional[int], progress: FileProgress) -> FileProgress:
+        """Ingest one file, updating progress in place"""
+        if content_type not in SUPPORTED_CONTENT_TYPES:
+            progress.status = "error"
+            progress.error = f"Unsupported file type: {content_type}"
+            return progress
+
+        source_lock = (
+            self.vector_service.source_lock(progress.filename, user_id) if self.dedupe else contextlib.nullcontext()
+        )
+        try:
+            async with _file_semaphore, source_lock:
+                progress.status = "processing"
+                progress.started_at = time.time()
+                progress.file_id = str(uuid4())
+                try:
+                    progress.status = await self._run(file, content_type, user_id, progress)
+                except Exception as e:
+                    progress.status = "error"
+                    progress.error = str(e)
+                    await self._roll_back(progress, user_id)
+                except BaseException:
+                    # Cancelled (e.g. the client disconnected): the partial file must not stay searchable
+                    progress.status = "error"
+                    progress.error = "cancelled"
+                    await asyncio.shield(self._roll_back(progress, user_id))
+                    raise
+                finally:
+                    progress.finished_at = time.time()
+        except asyncio.TimeoutError as e:
+            # Only the source lock raises here; the pipeline's own errors are handled above
+            progress.status = "error"
+            progress.error = str(e) or f"Timed out waiting for another upload of {progress.filename}"
+
+        return progress
+
+    async def _roll_back(self, progress: FileProgress, user_id: Optional[int]):
+        """Delete the rows inserted for a file that did not complete"""
+        # Runs even when no batch was counted yet: one may have committed just before the failure
+        try:
+            await self.vector_service.delete_file(progress.file_id, user_id)
+        except Exception as cleanup_error:
+            print(f"Warning: Could not roll back {progress.filename}: {cleanup_error}")
+        progress.chunks_added = 0
+
+    def _new_file_hash(self):
+        # Seeded with the chunking parameters: the same bytes chunked differently must be re-ingested
+        file_hash = hashlib.sha256()
+        file_hash.update(f"{self.doc_service.chunk_size}:{self.doc_service.chunk_overlap}\x00".encode("utf-8"))
+        return file_hash
+
+    async def _hash_upload(self, file, file_hash):
+        """Hash the raw bytes of an upload and rewind it"""
+        while True:
+            block = await file.read(settings.INGEST_READ_BLOCK_SIZE)
+            if not block:
+                break
+            file_hash.update(block)
+        await file.seek(0)
+
+    async def _run(self, file, content_type: str, user_id: Optional[int], progress: FileProgress) -> str:
+        """Ingest the file and return its final status"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        file_hash = self._new_file_hash()
+        existing = {}
+        kept: List[tuple] = []
+        if self.dedupe:
+            await self._hash_upload(file, file_hash)
+            stored_hashes = await self.vector_service.get_file_hashes(progress.filename, user_id)
+            if stored_hashes == {file_hash.hexdigest()}:
+                return "unchanged"
+            existing = await self.vector_service.get_chunk_hashes(progress.filename, user_id)
+
+        def on_pages(done: int, total: int):
+            progress.pages_processed = done
+            progress.total_pages = total
+
+        async def produce():
+            index = 0
+            pending: List[tuple] = []
+            # In dedupe mode the bytes were already hashed up front
+            segments = self.doc_service.iter_text_segments(
+                file, content_type, on_pages, None if self.dedupe else file_hash
+            )
+            async for chunks in self.doc_service.iter_chunks(segments):
+                for chunk in chunks:
+                    stored_ids = existing.get(hash_text(chunk))
+                    if stored_ids:
+                        # Unchanged chunk: keep the stored row and its embedding
+                        kept.append((stored_ids.pop(), index))
+                        progress.chunks_skipped += 1
+                    else:
+                        pending.append((index, chunk))
+                    index += 1
+                while len(pending) >= self.batch_size:
+                    batch, pending = pending[:self.batch_size], pending[self.batch_size:]
+                    await queue.put(self._make_documents(batch, progress, content_type, user_id))
+            if pending:
+                await queue.put(self._make_documents(pending, progress, content_type, user_id))
+            await queue.put(None)
+            return index
+
+        async def consume():
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                await self.vector_service.add_documents(batch)
+                progress.chunks_added += len(batch)
+
+        producer = asyncio.ensure_future(produce())
+        consumer = asyncio.ensure_future(consume())
+        try:
+            total_chunks, _ = await asyncio.gather(producer, consumer)
+        except BaseException:
+            producer.cancel()
+            consumer.cancel()
+            raise
+
+        if total_chunks == 0:
+            raise ValueError(f"No text extracted from {progress.filename}")
+
+        if self.dedupe:
+            progress.chunks_deleted = await self.vector_service.sync_file(
+                progress.file_id,
+                progress.filename,
+                user_id,
+                kept,
+                total_chunks,
+                file_hash.hexdigest()
+            )
+        else:
+            await self.vector_service.finalize_file(progress.file_id, total_chunks, file_hash.hexdigest())
+        return "success"
+
+    def _make_documents(
+        self,
+        batch: List[tuple],
+        progress: FileProgress,
+        content_type: str,
+        user_id: Optional[int]
+    ) -> List[Document]:
+        # total_chunks is unknown while streaming; it is recorded when the file completes
+        documents = []
+        for index, chunk in batch:
+            documents.extend(self.doc_service.create_documents(
+                [chunk],
+                progress.filename,
+                content_type,
+                user_id,
+                file_id=progress.file_id,
+                start_index=index,
+                total_chunks=0
+            ))
+        return documents
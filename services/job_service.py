@@ -0,0 +1,158 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+from services.ingestion_service import FileProgress
+from config.settings import get_settings
+
+settings = get_settings()
+
+
+@dataclass
+class IngestionJob:
+    """A background upload and the progress of each of its files"""
+    job_id: str
+    files: List[FileProgress]
+    user_id: Optional[int] = None
+    status: str = "queued"  # queued, running, completed, failed, cancelled
+    error: Optional[str] = None
+    # Releases resources owned by the job (spooled uploads); always awaited once
+    cleanup: Optional[Callable[[], Awaitable[None]]] = field(default=None, repr=False)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def total_chunks_added(self) -> int:
+        return sum(progress.chunks_added for progress in self.files)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "total_chunks_added": self.total_chunks_added,
+            "files": [progress.to_dict() for progress in self.files]
+        }
+
+
+class IngestionJobManager:
+    """
+    Bounded in-process queue of background ingestion jobs.
+
+    At most `concurrency` jobs run at once so ingestion cannot starve the chat
+    endpoints sharing the worker; submissions beyond `max_queue` are rejected.
+    Jobs still running or queued at shutdown are marked cancelled, and every
+    job's cleanup runs however it ends.
+    """
+
+    def __init__(self, concurrency: int = None, max_queue: int = None, retention_seconds: float = None):
+        self.concurrency = concurrency or settings.INGEST_JOB_CONCURRENCY
+        self.max_queue = max_queue or settings.INGEST_JOB_QUEUE_SIZE
+        self.retention_seconds = retention_seconds or settings.INGEST_JOB_RETENTION_SECONDS
+        self.jobs: Dict[str, IngestionJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        """Start the worker tasks"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        """Cancel running jobs and drop queued ones, marking both cancelled"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        while self._queue is not None and not self._queue.empty():
+            job, _ = self._queue.get_nowait()
+            self._mark_cancelled(job)
+            job.finished_at = time.time()
+            await self._cleanup(job)
+
+    def submit(
+        self,
+        files: List[FileProgress],
+        work: Callable[[IngestionJob], Awaitable[None]],
+        user_id: Optional[int] = None,
+        cleanup: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> IngestionJob:
+        """Queue a job; raises asyncio.QueueFull if the queue is at capacity"""
+        if self._queue is None:
+            raise RuntimeError("Ingestion job manager not started")
+        self._prune()
+
+        job = IngestionJob(job_id=str(uuid4()), files=files, user_id=user_id, cleanup=cleanup)
+        self._queue.put_nowait((job, work))
+        self.jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """Look up a job by id"""
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        """Forget finished jobs older than the retention window"""
+        cutoff = time.time() - self.retention_seconds
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job, work = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                await work(job)
+                failed = all(progress.status == "error" for progress in job.files)
+                job.status = "failed" if failed else "completed"
+            except asyncio.CancelledError:
+                self._mark_cancelled(job)
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                print(f"Ingestion job {job.job_id} failed: {e}")
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+                await self._cleanup(job)
+
+    @staticmethod
+    def _mark_cancelled(job: IngestionJob):
+        job.status = "cancelled"
+        job.error = "Cancelled at shutdown"
+        for progress in job.files:
+            if progress.status in ("pending", "processing"):
+                progress.status = "error"
+                progress.error = "cancelled"
+
+    @staticmethod
+    async def _cleanup(job: IngestionJob):
+        cleanup, job.cleanup = job.cleanup, None
+        if cleanup is None:
+            return
+        try:
+            await cleanup()
+        except Exception as e:
+            print(f"Warning: cleanup of ingestion job {job.job_id} failed: {e}")
+
+
+# Global ingestion job manager instance
+job_manager = IngestionJobManager()
+
+
+def get_job_manager() -> IngestionJobManager:
+    """Dependency for getting the ingestion job manager"""
+    return job_manager
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import Callable, List, Optional
+import httpx
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+from config.settings import get_settings
+from core.shared_state import shared_state
+
+settings = get_settings()
+
+MCP_SERVER_NAME = "retailmcp"
+MCP_TOOLS_STATE_KEY = "mcp:tools"
+
+
+def tools_fingerprint(tools: List[BaseTool]) -> str:
+    """Stable hash of tool names, descriptions and argument schemas"""
+    spec = [[tool.name, tool.description, tool.args] for tool in tools]
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def pooled_httpx_client_factory(
+    headers: Optional[dict] = None,
+    timeout: Optional[httpx.Timeout] = None,
+    auth: Optional[httpx.Auth] = None
+) -> httpx.AsyncClient:
+    """httpx client with a bounded keep-alive connection pool for the MCP transport"""
+    return httpx.AsyncClient(
+        headers=headers,
+        timeout=timeout or httpx.Timeout(30.0, read=300.0),
+        auth=auth,
+        follow_redirects=True,
+        limits=httpx.Limits(
+            max_connections=settings.MCP_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.MCP_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=settings.MCP_HTTP_KEEPALIVE_SECONDS
+        )
+    )
+
+
+class MCPConnectionManager:
+    """
+    Keep one persistent MCP session open and supervised.
+
+    A background task opens the session, loads its tools and hands them to
+    `on_tools`, then pings the server every MCP_HEALTH_CHECK_INTERVAL seconds.
+    When the session drops or a health check fails it hands over an empty
+    tool list (the old tools are bound to the dead session), reconnects with
+    exponential backoff and hands over the fresh tool list, so tools are
+    hot-swapped without a restart. All tool calls share the session (and its
+    keep-alive HTTP connection pool) instead of setting up transport per call.
+
+    The loaded tool list's fingerprint is published to the shared state with
+    the time it was loaded as its version. When another worker publishes a
+    different list loaded after this worker's (it reconnected after the server
+    changed its tools), this worker reloads its tools on the next health check
+    instead of waiting for its own session to drop. Such a reload is not
+    published again, so workers that keep seeing different lists reload once
+    per newer publish instead of taking turns forever.
+    """
+
+    def __init__(self, url: str, headers: dict, on_tools: Callable[[List[BaseTool]], None]):
+        self.client = MultiServerMCPClient(
+            {
+                MCP_SERVER_NAME: {
+                    "url": url,
+                    "transport": "streamable_http",
+                    "headers": headers,
+                    "httpx_client_factory": pooled_httpx_client_factory
+                }
+            }
+        )
+        self.on_tools = on_tools
+        self.connected = asyncio.Event()
+        self.tool_count = 0
+        self.fingerprint: Optional[str] = None
+        self.tool_names: List[str] = []
+        # Version of the newest published tool list this worker has loaded or reloaded for
+        self.tools_version: Optional[float] = None
+        self.reconnects = 0
+        self.last_error: Optional[str] = None
+        self.last_health_check: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, wait: float = None):
+        """Start the supervisor and wait up to `wait` seconds for the first connection"""
+        self._task = asyncio.create_task(self._supervise())
+        wait = settings.MCP_CONNECT_TIMEOUT if wait is None else wait
+        try:
+            await asyncio.wait_for(self.connected.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            print(f"Warning: MCP server not reachable yet ({self.last_error}), retrying in the background")
+
+    async def stop(self):
+        """Stop the supervisor and close the session"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.connected.clear()
+        self._drop_tools()
+
+    async def _supervise(self):
+        delay = settings.MCP_RECONNECT_BASE_DELAY
+        while True:
+            try:
+                # The session context must be entered and exited in this task
+                async with self.client.session(MCP_SERVER_NAME) as session:
+                    await self._load_tools(session)
+                    self.connected.set()
+                    self.last_error = None
+                    delay = settings.MCP_RECONNECT_BASE_DELAY
+                    print(f"Successfully loaded {self.tool_count} tools from MCP server")
+
+                    while True:
+                        await asyncio.sleep(settings.MCP_HEALTH_CHECK_INTERVAL)
+                        await asyncio.wait_for(session.send_ping(), timeout=settings.MCP_HEALTH_CHECK_TIMEOUT)
+                        self.last_health_check = time.time()
+                        await self._sync_tools(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Includes exception groups raised by the transport's task group
+                self.last_error = str(e) or type(e).__name__
+                if self.connected.is_set():
+                    self.reconnects += 1
+                self.connected.clear()
+                self._drop_tools()
+                print(f"Warning: MCP connection lost or unavailable: {self.last_error}; reconnecting in {delay:.1f}s")
+
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, settings.MCP_RECONNECT_MAX_DELAY)
+
+    async def _load_tools(self, session, publish: bool = True):
+        """Load the session's tools, hand them over and (unless syncing) publish their fingerprint"""
+        # Tools are bound to the session, so they are handed over even when unchanged
+        tools = await load_mcp_tools(session)
+        self.tool_count = len(tools)
+        self.fingerprint = tools_fingerprint(tools)
+        self.tool_names = [tool.name for tool in tools]
+        self.on_tools(tools)
+        if publish:
+            self.tools_version = time.time()
+            await self._publish_tools()
+
+    def _drop_tools(self):
+        """Withdraw the tools of a closed session so the agent stops offering them"""
+        if self.tool_names:
+            self.tool_count = 0
+            self.tool_names = []
+            self.on_tools([])
+
+    async def _publish_tools(self):
+        try:
+            await shared_state.set(
+                MCP_TOOLS_STATE_KEY,
+                {"fingerprint": self.fingerprint, "tools": self.tool_names, "version": self.tools_version}
+            )
+        except Exception as e:
+            print(f"Warning: could not publish MCP tool list: {e}")
+
+    async def _sync_tools(self, session):
+        """Reload tools when another worker has published a different, newer tool list"""
+        if not shared_state.shared:
+            return
+        try:
+            published = await shared_state.get(MCP_TOOLS_STATE_KEY)
+        except Exception as e:
+            print(f"Warning: could not read shared MCP tool list: {e}")
+            return
+        if published is None:
+            # Nothing published yet (first connect raced shared state setup, or it expired)
+            await self._publish_tools()
+        elif published["fingerprint"] != self.fingerprint and published.get("version", 0) > (self.tools_version or 0):
+            print("MCP tool list changed on another worker, reloading tools")
+            self.tools_version = published["version"]
+            await self._load_tools(session, publish=False)
+
+    def status(self) -> dict:
+        """Connection state for health checks"""
+        return {
+            "connected": self.connected.is_set(),
+            "tools": self.tool_count,
+            "fingerprint": self.fingerprint,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+            "last_health_check": self.last_health_check
+        }
@@ -0,0 +1,81 @@
+from typing import List
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
+from config.settings import get_settings
+from services.vector_store_service import VectorStoreService
+
+settings = get_settings()
+
+RAG_TOOL_NAME = "search_documents"
+
+RAG_TOOL_DESCRIPTION = (
+    "Search the documents the current user has uploaded (catalogs, manuals, policies, etc.) "
+    "and return the most relevant passages. Use it for questions about the content of those documents."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for budgeting"""
+    return (len(text) + 3) // 4
+
+
+def format_documents(documents: List[Document], token_budget: int) -> str:
+    """Render retrieved chunks, trimming them to fit the token budget"""
+    if not documents:
+        return "No relevant documents found."
+
+    parts = []
+    remaining = token_budget
+    for idx, doc in enumerate(documents, start=1):
+        header = f"[{idx}] {doc.metadata.get('source', 'document')}\n"
+        available = remaining - estimate_tokens(header)
+        if available <= 0:
+            break
+
+        content = doc.page_content
+        if estimate_tokens(content) > available:
+            content = content[:available * 4].rstrip() + " ..."
+        parts.append(header + content)
+        remaining -= estimate_tokens(header + content)
+
+    return "\n\n".join(parts)
+
+
+def build_retrieval_tool(vector_service: VectorStoreService) -> StructuredTool:
+    """
+    Build the in-process retrieval tool for the agent.
+
+    The caller's user_id and a per-turn memo dict are read from the run
+    config (config["configurable"]), so one tool instance serves every user
+    and repeated retrievals within a turn skip the vector store entirely.
+    """
+
+    async def search_documents(query: str, config: RunnableConfig) -> str:
+        configurable = config.get("configurable", {}) if config else {}
+        user_id = configurable.get("user_id")
+        memo = configurable.get("retrieval_memo")
+        if user_id is None:
+            # An unscoped filter would search every user's documents
+            return "Document search is not available for this conversation."
+
+        memo_key = " ".join(query.lower().split())
+        if memo is not None and memo_key in memo:
+            return memo[memo_key]
+
+        documents = await vector_service.similarity_search(
+            query,
+            k=settings.RAG_TOOL_K,
+            filter_metadata={"user_id": user_id}
+        )
+        result = format_documents(documents, settings.RAG_TOOL_TOKEN_BUDGET)
+
+        if memo is not None:
+            memo[memo_key] = result
+        return result
+
+    return StructuredTool.from_function(
+        coroutine=search_documents,
+        name=RAG_TOOL_NAME,
+        description=RAG_TOOL_DESCRIPTION
+    )
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from langchain_core.tools import BaseTool, StructuredTool
+from config.settings import get_settings
+from core.metrics import TOOL_CACHE_ENTRIES, TOOL_CACHE_LOOKUPS
+from core.shared_state import SharedStateBackend, shared_state
+
+settings = get_settings()
+
+# Tools whose names start with one of these verbs are treated as mutating and
+# never cached, even if they appear in the TTL allow-list
+MUTATING_VERBS = {
+    "create", "update", "delete", "remove", "add", "set", "place", "cancel",
+    "submit", "insert", "upsert", "edit", "post", "put", "patch", "apply", "redeem",
+}
+
+
+def canonicalize_args(args: Dict[str, Any]) -> str:
+    """Stable string form of tool arguments (key order and whitespace independent)"""
+    return json.dumps(args, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def is_mutating(tool_name: str) -> bool:
+    """Guess from the tool name (snake_case, kebab-case or camelCase) whether a tool changes state"""
+    words = re.findall(r"[a-z]+|[A-Z][a-z]*", tool_name)
+    return bool(words) and words[0].lower() in MUTATING_VERBS
+
+
+@dataclass
+class _InFlightCall:
+    """A tool call shared by every concurrent caller with the same arguments"""
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class ToolResultCache:
+    """
+    TTL/LRU cache for MCP tool results.
+
+    Only tools in the allow-list (tool name -> TTL seconds) are cached and
+    mutating tools never are. Concurrent identical calls share a single
+    in-flight request (single-flight) that runs in its own task, so a
+    cancelled caller does not cancel it for the others; it is only cancelled
+    once every caller has gone. Failures are not cached.
+
+    When the shared state backend is shared between workers, JSON-serializable
+    results are written through to it and checked before calling the tool, so
+    one worker's result serves all of them.
+    """
+
+    def __init__(self, ttls: Dict[str, float] = None, max_size: int = None, shared: SharedStateBackend = None):
+        self.ttls = dict(settings.MCP_TOOL_CACHE_TTLS if ttls is None else ttls)
+        self.max_size = max_size or settings.MCP_TOOL_CACHE_MAX_SIZE
+        self.shared = shared or shared_state
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, _InFlightCall] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bypassed = 0
+        self.shared_hits = 0
+
+    def ttl_for(self, tool_name: str) -> Optional[float]:
+        """TTL for a tool, or None if its results must not be cached"""
+        if is_mutating(tool_name):
+            return None
+        return self.ttls.get(tool_name)
+
+    async def call(self, tool_name: str, args: Dict[str, Any], func: Callable[[], Awaitable[Any]]) -> Any:
+        """Return a cached result or run func, sharing in-flight calls"""
+        ttl = self.ttl_for(tool_name)
+        if not ttl:
+            self.bypassed += 1
+            TOOL_CACHE_LOOKUPS.labels(result="bypassed").inc()
+            return await func()
+
+        key = f"{tool_name}\x00{canonicalize_args(args)}"
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                TOOL_CACHE_LOOKUPS.labels(result="hit").inc()
+                return value
+            del self._entries[key]
+            TOOL_CACHE_ENTRIES.set(len(self._entries))
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            TOOL_CACHE_LOOKUPS.labels(result="coalesced").inc()
+        else:
+            self.misses += 1
+            TOOL_CACHE_LOOKUPS.labels(result="miss").inc()
+            inflight = _InFlightCall(asyncio.create_task(self._fetch(key, ttl, func)))
+            self._inflight[key] = inflight
+            inflight.task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        inflight.waiters += 1
+        try:
+            return await asyncio.shield(inflight.task)
+        finally:
+            inflight.waiters -= 1
+            if inflight.waiters == 0 and not inflight.task.done():
+                # Every caller was cancelled; nobody needs the result
+                inflight.task.cancel()
+
+    async def _fetch(self, key: str, ttl: float, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run a shared call (or read another worker's result) and cache it"""
+        value = await self._shared_get(key)
+        if value is not None:
+            self.shared_hits += 1
+            TOOL_CACHE_LOOKUPS.labels(result="shared_hit").inc()
+        else:
+            value = await func()
+            await self._shared_put(key, value, ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        TOOL_CACHE_ENTRIES.set(len(self._entries))
+        return value
+
+    @staticmethod
+    def _shared_key(key: str) -> str:
+        return "tool:" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    async def _shared_get(self, key: str) -> Any:
+        """Result cached by another worker, or None"""
+        if not self.shared.shared:
+            return None
+        try:
+            payload = await self.shared.get(self._shared_key(key))
+        except Exception as e:
+            print(f"Warning: shared tool cache read failed: {e}")
+            return None
+        if payload is None:
+            return None
+        # Tools with response_format="content_and_artifact" return tuples
+        return tuple(payload["value"]) if payload["tuple"] else payload["value"]
+
+    async def _shared_put(self, key: str, value: Any, ttl: float):
+        """Write a result through to the shared backend if it is JSON-serializable"""
+        if not self.shared.shared:
+            return
+        payload = {"tuple": isinstance(value, tuple), "value": list(value) if isinstance(value, tuple) else value}
+        try:
+            json.dumps(payload)
+        except (TypeError, ValueError):
+            return
+        try:
+            await self.shared.set(self._shared_key(key), payload, ttl)
+        except Exception as e:
+            print(f"Warning: shared tool cache write failed: {e}")
+
+    def clear(self):
+        """Drop every cached result"""
+        self._entries.clear()
+        TOOL_CACHE_ENTRIES.set(0)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and size"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "bypassed": self.bypassed,
+            "shared_hits": self.shared_hits,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "cached_tools": sorted(name for name in self.ttls if not is_mutating(name))
+        }
+
+
+def wrap_tool(tool: BaseTool, cache: ToolResultCache) -> BaseTool:
+    """Wrap an MCP StructuredTool so its calls go through the cache"""
+    if not isinstance(tool, StructuredTool) or tool.coroutine is None:
+        return tool
+
+    original = tool.coroutine
+
+    async def cached_call(**kwargs):
+        return await cache.call(tool.name, kwargs, lambda: original(**kwargs))
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=cached_call,
+        response_format=tool.response_format,
+        metadata=tool.metadata
+    )
+
+
+def wrap_tools(tools: List[BaseTool], cache: ToolResultCache) -> List[BaseTool]:
+    """Wrap every tool returned by MultiServerMCPClient.get_tools()"""
+    return [wrap_tool(tool, cache) for tool in tools]
@@ -0,0 +1,166 @@
+import asyncio
+import inspect
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+from config.settings import get_settings
+from core.metrics import TOOL_ERRORS, TOOL_SECONDS
+from core.tracing import tracer
+
+settings = get_settings()
+
+
+class ToolStepTimings:
+    """Per-turn record of tool call timings, grouped by ReAct step"""
+
+    def __init__(self):
+        self.calls: List[dict] = []
+
+    def record(self, step: Any, tool_name: str, started: float, finished: float, status: str):
+        self.calls.append({
+            "step": step,
+            "tool": tool_name,
+            "started": started,
+            "finished": finished,
+            "status": status
+        })
+
+    def summary(self) -> List[dict]:
+        """Wall-clock vs. sequential time of each step's tool calls"""
+        steps: Dict[Any, List[dict]] = defaultdict(list)
+        for call in self.calls:
+            steps[call["step"]].append(call)
+
+        result = []
+        for step, calls in steps.items():
+            wall = max(call["finished"] for call in calls) - min(call["started"] for call in calls)
+            sequential = sum(call["finished"] - call["started"] for call in calls)
+            result.append({
+                "step": step,
+                "calls": [
+                    {
+                        "tool": call["tool"],
+                        "status": call["status"],
+                        "ms": round((call["finished"] - call["started"]) * 1000, 1)
+                    }
+                    for call in calls
+                ],
+                "wall_ms": round(wall * 1000, 1),
+                "sequential_ms": round(sequential * 1000, 1),
+                "saved_ms": round((sequential - wall) * 1000, 1)
+            })
+        return result
+
+
+class ToolExecutor:
+    """
+    Bound concurrent tool calls and time each one out.
+
+    LangGraph's ToolNode already runs the tool calls of one LLM step
+    concurrently; this caps how many of one agent run's calls run at once
+    (TOOL_MAX_CONCURRENCY, through the semaphore from run_slots() in the run
+    config) and gives every call its own deadline (TOOL_CALL_TIMEOUT, which
+    includes waiting for a slot), so one slow tool does not hold up the
+    others. The cap is per run so busy requests cannot starve each other.
+    A timed-out call is reported back to the model as a tool error.
+    """
+
+    def __init__(self, max_concurrency: int = None, timeout: float = None):
+        self.max_concurrency = max_concurrency or settings.TOOL_MAX_CONCURRENCY
+        self.timeout = timeout or settings.TOOL_CALL_TIMEOUT
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.wall_seconds = 0.0
+        self.sequential_seconds = 0.0
+
+    def run_slots(self) -> asyncio.Semaphore:
+        """Concurrency cap for the tool calls of one agent run (put it in the run config)"""
+        return asyncio.Semaphore(self.max_concurrency)
+
+    async def run(self, tool_name: str, func: Callable[[], Awaitable[Any]], config: Optional[RunnableConfig]) -> Any:
+        """Run one tool call under the run's concurrency cap and a per-call timeout"""
+        started = time.perf_counter()
+        status = "ok"
+        slots = (config or {}).get("configurable", {}).get("tool_slots")
+        try:
+            with tracer.span("agent.tool", tool=tool_name):
+                return await asyncio.wait_for(self._call(func, slots), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            status = "timeout"
+            self.timeouts += 1
+            raise ToolException(f"Tool '{tool_name}' timed out after {self.timeout:g}s")
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception:
+            status = "error"
+            self.errors += 1
+            raise
+        finally:
+            self.calls += 1
+            TOOL_SECONDS.labels(tool=tool_name).observe(time.perf_counter() - started)
+            if status != "ok":
+                TOOL_ERRORS.labels(tool=tool_name, status=status).inc()
+            timings = (config or {}).get("configurable", {}).get("tool_timings")
+            if timings is not None:
+                step = (config or {}).get("metadata", {}).get("langgraph_step")
+                timings.record(step, tool_name, started, time.perf_counter(), status)
+
+    @staticmethod
+    async def _call(func: Callable[[], Awaitable[Any]], slots: Optional[asyncio.Semaphore]) -> Any:
+        if slots is None:
+            return await func()
+        async with slots:
+            return await func()
+
+    def record_turn(self, timings: ToolStepTimings):
+        """Add a finished turn's step timings to the running totals"""
+        for step in timings.summary():
+            self.wall_seconds += step["wall_ms"] / 1000
+            self.sequential_seconds += step["sequential_ms"] / 1000
+
+    def stats(self) -> dict:
+        """Call counters and total time saved by running calls concurrently"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "sequential_seconds": round(self.sequential_seconds, 3),
+            "saved_seconds": round(self.sequential_seconds - self.wall_seconds, 3)
+        }
+
+
+def wrap_tool(tool: BaseTool, executor: ToolExecutor) -> BaseTool:
+    """Route a StructuredTool's calls through the executor"""
+    if not isinstance(tool, StructuredTool) or tool.coroutine is None:
+        return tool
+
+    original = tool.coroutine
+    # In-process tools (e.g. document search) read the run config themselves
+    wants_config = "config" in inspect.signature(original).parameters
+
+    async def executed_call(config: RunnableConfig, **kwargs):
+        if wants_config:
+            return await executor.run(tool.name, lambda: original(config=config, **kwargs), config)
+        return await executor.run(tool.name, lambda: original(**kwargs), config)
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=executed_call,
+        response_format=tool.response_format,
+        metadata=tool.metadata,
+        handle_tool_error=True
+    )
+
+
+def wrap_tools(tools: List[BaseTool], executor: ToolExecutor) -> List[BaseTool]:
+    """Route every tool's calls through the executor"""
+    return [wrap_tool(tool, executor) for tool in tools]
@@ -1,26 +1,505 @@
-from typing import List, Optional
+from typing import Dict, List, Optional, Set
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
 from langchain_core.documents import Document
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import asyncio
 import asyncpg
+import hashlib
 import json
+import time
+import weakref
+from uuid import uuid4
 from config.settings import get_settings
+from core.shared_state import SharedStateBackend, shared_state
+from core.tracing import traced
+from services.embedding_service import AsyncEmbedder
 
 settings = get_settings()
 
 
+SEARCH_MODES = ("approximate", "oversample", "exact")
+
+# Shared state keys of the query cache's per-scope generation tokens
+QUERY_CACHE_STATE_PREFIX = "query_cache:generation:"
+
+# Seconds between attempts to take a source lock held by another worker
+SOURCE_LOCK_POLL_SECONDS = 0.5
+
+
+@dataclass(frozen=True)
+class SearchOptions:
+    """
+    Recall/speed knobs for similarity_search.
+
+    - approximate: use the ANN index with the given ef_search / probes
+    - oversample: scan VECTOR_OVERSAMPLE_FACTOR times the ef_search / probes
+      and fetch as many times k candidates, keeping the k most similar
+    - exact: disable index scans for a brute-force exact search
+    max_distance drops results whose cosine distance is larger.
+    """
+    mode: str = None
+    ef_search: int = None
+    probes: int = None
+    max_distance: Optional[float] = None
+    
+    def resolve(self) -> "SearchOptions":
+        """Fill unset options from settings"""
+        mode = self.mode or settings.VECTOR_SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unsupported search mode: {mode}")
+        return SearchOptions(
+            mode=mode,
+            ef_search=self.ef_search or settings.HNSW_EF_SEARCH,
+            probes=self.probes or settings.IVFFLAT_PROBES,
+            max_distance=settings.VECTOR_MAX_DISTANCE if self.max_distance is None else self.max_distance
+        )
+    
+    def fetch_count(self, k: int) -> int:
+        """Number of candidates to pull from the index for k results"""
+        return k * settings.VECTOR_OVERSAMPLE_FACTOR if self.mode == "oversample" else k
+
+
+async def apply_search_settings(
+    conn: asyncpg.Connection,
+    options: SearchOptions,
+    fetch_count: int,
+    iterative_scan: bool = False
+):
+    """
+    Set ANN parameters transaction-locally (must run inside a transaction).
+    
+    iterative_scan (pgvector >= 0.8) keeps scanning the index until enough rows
+    pass the filters; rows then come back only roughly ordered.
+    """
+    if options.mode == "exact":
+        await conn.execute("SELECT set_config('enable_indexscan', 'off', true)")
+        return
+    factor = settings.VECTOR_OVERSAMPLE_FACTOR if options.mode == "oversample" else 1
+    # ef_search below the number of requested rows silently truncates HNSW results
+    ef_search = max(options.ef_search * factor, fetch_count)
+    await conn.execute(
+        "SELECT set_config('hnsw.ef_search', $1, true), set_config('ivfflat.probes', $2, true)",
+        str(ef_search),
+        str(options.probes * factor)
+    )
+    if iterative_scan:
+        await conn.execute(
+            "SELECT set_config('hnsw.iterative_scan', 'relaxed_order', true), "
+            "set_config('ivfflat.iterative_scan', 'relaxed_order', true)"
+        )
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+
+    Keys are a hash of (model, dimension, task, text). Lookups go to an
+    in-process LRU first and then to a persistent table in the vector database.
+    
+    Persistent entries older than `ttl_seconds` are deleted periodically.
+    put_later() writes in the background, coalescing the writes of concurrent
+    callers into one statement, so a query-time miss costs no extra round trip.
+    """
+    
+    def __init__(self, max_size: int = None, persistent: bool = None, ttl_seconds: float = None):
+        self.max_size = max_size or settings.EMBEDDING_CACHE_SIZE
+        self.persistent = settings.EMBEDDING_CACHE_PERSISTENT if persistent is None else persistent
+        self.ttl_seconds = settings.EMBEDDING_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.table_name = settings.EMBEDDING_CACHE_TABLE_NAME
+        self.pool: Optional[asyncpg.Pool] = None
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._pending: Dict[str, List[float]] = {}
+        self._writer: Optional[asyncio.Task] = None
+        self._evictor: Optional[asyncio.Task] = None
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evicted = 0
+    
+    async def initialize(self, pool: asyncpg.Pool):
+        """Attach the persistent tier and start expiring it"""
+        if self.persistent:
+            # The table is created by the vector migrations in models/models.py
+            self.pool = pool
+            if self.ttl_seconds > 0 and self._evictor is None:
+                self._evictor = asyncio.create_task(self._evict_periodically())
+    
+    async def close(self):
+        """Stop expiring entries and finish the background writes"""
+        if self._evictor is not None:
+            self._evictor.cancel()
+            await asyncio.gather(self._evictor, return_exceptions=True)
+            self._evictor = None
+        await self.flush()
+    
+    @staticmethod
+    def make_key(text: str, task: str) -> str:
+        """Build the cache key for a text embedded for a given task (document/query)"""
+        raw = f"{settings.EMBEDDING_MODEL}\x00{settings.EMBEDDING_DIMENSION}\x00{task}\x00{text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def _remember(self, key: str, embedding: List[float]):
+        self._lru[key] = embedding
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+    
+    async def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return cached embeddings for the keys that are present in either tier"""
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                found[key] = self._lru[key]
+                self.memory_hits += 1
+            else:
+                missing.append(key)
+        
+        if missing and self.pool:
+            try:
+                async with self.pool.acquire() as conn:
+                    rows = await conn.fetch(
+                        f"SELECT cache_key, embedding FROM {self.table_name} WHERE cache_key = ANY($1::text[])",
+                        missing
+                    )
+                for row in rows:
+                    found[row['cache_key']] = row['embedding']
+                    self._remember(row['cache_key'], row['embedding'])
+                    self.persistent_hits += 1
+            except Exception as e:
+                print(f"Warning: Embedding cache lookup failed: {str(e)}")
+        
+        self.misses += sum(1 for key in missing if key not in found)
+        return found
+    
+    async def put_many(self, items: Dict[str, List[float]]):
+        """Store embeddings in both tiers"""
+        for key, embedding in items.items():
+            self._remember(key, embedding)
+        
+        if items and self.pool:
+            await self._write(items)
+    
+    def put_later(self, items: Dict[str, List[float]]):
+        """Store embeddings in memory now and in the persistent tier in the background"""
+        for key, embedding in items.items():
+            self._remember(key, embedding)
+        
+        if items and self.pool:
+            self._pending.update(items)
+            if self._writer is None or self._writer.done():
+                self._writer = asyncio.create_task(self._write_pending())
+    
+    async def flush(self):
+        """Wait for background writes to finish"""
+        if self._writer is not None:
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+    
+    async def _write_pending(self):
+        # Items queued while a write is in flight go out together in the next one
+        while self._pending:
+            items, self._pending = self._pending, {}
+            await self._write(items)
+    
+    async def _write(self, items: Dict[str, List[float]]):
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.executemany(
+                    f"INSERT INTO {self.table_name} (cache_key, embedding) VALUES ($1, $2) ON CONFLICT (cache_key) DO NOTHING",
+                    list(items.items())
+                )
+        except Exception as e:
+            print(f"Warning: Embedding cache write failed: {str(e)}")
+    
+    async def evict_expired(self) -> int:
+        """Delete persistent entries older than the TTL, in batches; returns the number deleted"""
+        deleted = 0
+        batch_size = settings.EMBEDDING_CACHE_EVICT_BATCH_SIZE
+        while True:
+            async with self.pool.acquire() as conn:
+                status = await conn.execute(
+                    f"""
+                    DELETE FROM {self.table_name} WHERE cache_key IN (
+                        SELECT cache_key FROM {self.table_name}
+                        WHERE created_at < now() - make_interval(secs => $1)
+                        LIMIT $2
+                    )
+                    """,
+                    self.ttl_seconds,
+                    batch_size
+                )
+            count = int(status.split()[-1])
+            deleted += count
+            if count < batch_size:
+                return deleted
+    
+    async def _evict_periodically(self):
+        while True:
+            try:
+                self.evicted += await self.evict_expired()
+            except Exception as e:
+                print(f"Warning: Embedding cache eviction failed: {str(e)}")
+            await asyncio.sleep(settings.EMBEDDING_CACHE_EVICT_INTERVAL_SECONDS)
+    
+    def stats(self) -> dict:
+        """Hit/miss counters for both tiers"""
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+            "memory_size": len(self._lru),
+            "max_size": self.max_size,
+            "persistent": self.pool is not None,
+            "pending_writes": len(self._pending),
+            "evicted": self.evicted
+        }
+
+
+class QueryResultCache:
+    """
+    TTL/LRU cache of similarity_search results.
+
+    Keys are (normalized query, k, filter_metadata). Each entry remembers the
+    user_id its filter is scoped to, so ingesting or clearing one user's
+    documents only drops the entries that could have seen them.
+    
+    Every process keeps its own entries. With a shared state backend,
+    invalidate() also publishes a new generation token for the scope, and
+    scope_version() adds the current tokens to the key, so results cached by
+    one worker are not served after another worker changed the documents.
+    """
+    
+    def __init__(self, max_size: int = None, ttl_seconds: float = None, state: SharedStateBackend = None):
+        self.max_size = settings.QUERY_CACHE_SIZE if max_size is None else max_size
+        self.ttl_seconds = ttl_seconds or settings.QUERY_CACHE_TTL_SECONDS
+        self.state = state or shared_state
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def make_key(query: str, k: int, filter_metadata: Optional[dict], options: SearchOptions = None) -> str:
+        """Build the cache key from the normalized query, k, filter and search options"""
+        normalized = " ".join(query.lower().split())
+        filter_key = json.dumps(filter_metadata or {}, sort_keys=True, default=str)
+        return f"{k}\x00{filter_key}\x00{options!r}\x00{normalized}"
+    
+    @property
+    def generation(self) -> int:
+        """Bumped on every invalidation; lets callers drop results computed before it"""
+        return self._generation
+    
+    def get(self, key: str) -> Optional[List[Document]]:
+        """Return cached documents for key, or None on miss/expiry"""
+        if self.max_size <= 0:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        expires_at, _, documents = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return list(documents)
+    
+    def put(self, key: str, filter_metadata: Optional[dict], documents: List[Document], generation: int):
+        """Store results unless an invalidation happened while they were computed"""
+        if self.max_size <= 0 or generation != self._generation:
+            return
+        user_scope = (filter_metadata or {}).get("user_id")
+        scope = None if user_scope is None else str(user_scope)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, scope, list(documents))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    @staticmethod
+    def _scope_keys(user_id: Optional[int], everything: bool = False) -> List[str]:
+        # Unscoped searches see every user's documents; "all" is only bumped when everything is cleared
+        if everything:
+            return [QUERY_CACHE_STATE_PREFIX + "unscoped", QUERY_CACHE_STATE_PREFIX + "all"]
+        if user_id is None:
+            return [QUERY_CACHE_STATE_PREFIX + "unscoped"]
+        return [QUERY_CACHE_STATE_PREFIX + "unscoped", QUERY_CACHE_STATE_PREFIX + f"user:{user_id}"]
+    
+    async def scope_version(self, filter_metadata: Optional[dict]) -> Optional[str]:
+        """
+        Generation tokens of the filter's scope published by any worker, to
+        append to the cache key ("" without a shared state backend, None when
+        the shared state cannot be read and the cache must be bypassed)
+        """
+        if self.max_size <= 0 or not self.state.shared:
+            return ""
+        user_id = (filter_metadata or {}).get("user_id")
+        if user_id is None:
+            keys = [QUERY_CACHE_STATE_PREFIX + "unscoped"]
+        else:
+            keys = [QUERY_CACHE_STATE_PREFIX + f"user:{user_id}", QUERY_CACHE_STATE_PREFIX + "all"]
+        try:
+            tokens = await asyncio.gather(*(self.state.get(key) for key in keys))
+        except Exception as e:
+            print(f"Warning: could not read query cache generation: {e}")
+            return None
+        return ":".join(token or "0" for token in tokens)
+    
+    async def invalidate(self, user_id: Optional[int] = None, everything: bool = False):
+        """Drop entries affected by a change of user_id's documents (or all) here and in every worker"""
+        if everything:
+            self.invalidate_all()
+        else:
+            self.invalidate_user(user_id)
+        if not self.state.shared:
+            return
+        try:
+            for key in self._scope_keys(user_id, everything):
+                await self.state.set(key, uuid4().hex)
+        except Exception as e:
+            print(f"Warning: could not publish query cache invalidation: {e}")
+    
+    def invalidate_user(self, user_id: Optional[int]):
+        """Drop entries that could include documents owned by user_id (unscoped entries always)"""
+        self._generation += 1
+        scope = None if user_id is None else str(user_id)
+        stale = [
+            key for key, (_, entry_scope, _) in self._entries.items()
+            if entry_scope is None or entry_scope == scope
+        ]
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+    
+    def invalidate_all(self):
+        """Drop every entry"""
+        self._generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+    
+    def stats(self) -> dict:
+        """Hit/miss counters and size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+def _version_tuple(version: str) -> tuple:
+    return tuple(int(part) for part in version.split(".")[:2] if part.isdigit())
+
+
 class VectorStoreService:
     """Manage PostgreSQL vector store operations with pgvector"""
     
     def __init__(self):
-        self.embeddings = GoogleGenerativeAIEmbeddings(model=settings.EMBEDDING_MODEL)
+        # The embedding client is built on first use, keeping its import off the startup path
+        self._embedder: Optional[AsyncEmbedder] = None
+        self.embedding_cache = EmbeddingCache()
+        self.query_cache = QueryResultCache()
         self.table_name = settings.SUPABASE_TABLE_NAME
+        self.iterative_scan = False
         self.initialized = False
+        # Per-source locks of this process, dropped once no task holds or waits for them
+        self._source_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
     
     async def initialize(self, pool: asyncpg.Pool):
         """Initialize the vector store service"""
         self.pool = pool
+        await self.embedding_cache.initialize(pool)
+        async with pool.acquire() as conn:
+            version = await conn.fetchval("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        self.iterative_scan = version is not None and _version_tuple(version) >= (0, 8)
         self.initialized = True
     
+    async def shutdown(self):
+        """Stop the embedding cache's background work"""
+        await self.embedding_cache.close()
+    
+    @property
+    def embedder(self) -> AsyncEmbedder:
+        """Async embedder around the configured embedding model, built on first use"""
+        if self._embedder is None:
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+            
+            self._embedder = AsyncEmbedder(GoogleGenerativeAIEmbeddings(model=settings.EMBEDDING_MODEL))
+        return self._embedder
+    
+    @embedder.setter
+    def embedder(self, embedder: AsyncEmbedder):
+        self._embedder = embedder
+    
+    @traced("vector_store.embed_documents")
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed document texts, only calling the embedder for cache misses"""
+        keys = [EmbeddingCache.make_key(text, "document") for text in texts]
+        cached = await self.embedding_cache.get_many(keys)
+        
+        # Deduplicate misses so repeated chunks are embedded once
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                pending.setdefault(key, text)
+        
+        if pending:
+            new_embeddings = await self.embedder.embed_documents(list(pending.values()))
+            fresh = dict(zip(pending.keys(), new_embeddings))
+            await self.embedding_cache.put_many(fresh)
+            cached.update(fresh)
+        
+        return [cached[key] for key in keys]
+    
+    @traced("vector_store.embed_query")
+    async def embed_query(self, query: str) -> List[float]:
+        """Embed a search query through the cache"""
+        key = EmbeddingCache.make_key(query, "query")
+        cached = await self.embedding_cache.get_many([key])
+        if key in cached:
+            return cached[key]
+        
+        embedding = await self.embedder.embed_query(query)
+        self.embedding_cache.put_later({key: embedding})
+        return embedding
+    
+    @traced("vector_store.embed_queries")
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several search queries through the cache, batching the misses"""
+        keys = [EmbeddingCache.make_key(query, "query") for query in queries]
+        cached = await self.embedding_cache.get_many(keys)
+        
+        pending = {}
+        for key, query in zip(keys, queries):
+            if key not in cached:
+                pending.setdefault(key, query)
+        
+        if pending:
+            new_embeddings = await self.embedder.embed_queries(list(pending.values()))
+            fresh = dict(zip(pending.keys(), new_embeddings))
+            self.embedding_cache.put_later(fresh)
+            cached.update(fresh)
+        
+        return [cached[key] for key in keys]
+    
+    @traced("vector_store.add_documents")
     async def add_documents(self, documents: List[Document]) -> bool:
         """Add documents to PostgreSQL vector store"""
         if not documents:
@@ -28,54 +507,211 @@ class VectorStoreService:
         
         texts = [doc.page_content for doc in documents]
         metadatas = [doc.metadata for doc in documents]
-        embeddings_list = self.embeddings.embed_documents(texts)
+        embeddings_list = await self.embed_documents(texts)
+        
+        records = list(zip(texts, metadatas, embeddings_list))
         
         async with self.pool.acquire() as conn:
-            # Use a transaction for batch insert
+            # Single binary COPY for the whole batch; the transaction keeps it on
+            # one server connection when running behind pgbouncer
             async with conn.transaction():
-                # Insert one by one to avoid prepared statement issues with pgbouncer
-                for text, metadata, embedding in zip(texts, metadatas, embeddings_list):
-                    # Convert embedding list to PostgreSQL vector format string
-                    embedding_str = '[' + ','.join(map(str, embedding)) + ']'
-                    
-                    await conn.execute(
-                        f"INSERT INTO {self.table_name} (content, metadata, embedding) VALUES ($1, $2::jsonb, $3::vector)",
-                        text,
-                        json.dumps(metadata),
-                        embedding_str
-                    )
+                await conn.copy_records_to_table(
+                    self.table_name,
+                    records=records,
+                    columns=["content", "metadata", "embedding"]
+                )
+        
+        for user_id in {metadata.get("user_id") for metadata in metadatas}:
+            await self.query_cache.invalidate(user_id)
         
         return True
     
-    async def similarity_search(self, query: str, k: int = 4, filter_metadata: dict = None) -> List[Document]:
+    @traced("vector_store.similarity_search")
+    async def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter_metadata: dict = None,
+        options: SearchOptions = None
+    ) -> List[Document]:
         """Perform similarity search using the match function"""
         if not self.initialized:
             return []
         
+        options = (options or SearchOptions()).resolve()
+        version = await self.query_cache.scope_version(filter_metadata)
+        cache_key = None
+        if version is not None:
+            cache_key = QueryResultCache.make_key(query, k, filter_metadata, options) + version
+            cached = self.query_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        generation = self.query_cache.generation
+        
         # Generate query embedding
-        query_embedding = self.embeddings.embed_query(query)
+        query_embedding = await self.embed_query(query)
+        fetch_count = options.fetch_count(k)
         
         async with self.pool.acquire() as conn:
-            # Call the match_documents_rag function
+            # Call the match_documents_rag function (vector/jsonb codecs handle encoding)
             filter_json = filter_metadata if filter_metadata else {}
             
-            rows = await conn.fetch(
-                f"SELECT * FROM {settings.SUPABASE_QUERY_NAME}($1::vector, $2, $3::jsonb)",
-                query_embedding,
-                k,
-                filter_json
-            )
-            
-            # Convert to Document objects
-            documents = []
-            for row in rows:
-                doc = Document(
-                    page_content=row['content'],
-                    metadata=row['metadata']
+            # Search settings are SET LOCAL, so they need a transaction
+            async with conn.transaction():
+                search_options = options
+                if options.mode != "exact" and await self._is_small_scope(conn, filter_json):
+                    search_options = replace(options, mode="exact")
+                await apply_search_settings(conn, search_options, fetch_count, self.iterative_scan)
+                rows = await conn.fetch(
+                    f"SELECT * FROM {settings.SUPABASE_QUERY_NAME}($1::vector, $2, $3::jsonb) "
+                    f"WHERE $4::float8 IS NULL OR similarity >= 1 - $4::float8",
+                    query_embedding,
+                    fetch_count,
+                    filter_json,
+                    options.max_distance
                 )
-                documents.append(doc)
-            
-            return documents
+        
+        documents = self._rows_to_documents(rows, options, k)
+        if cache_key is not None:
+            self.query_cache.put(cache_key, filter_metadata, documents, generation)
+        return documents
+    
+    @traced("vector_store.similarity_search_many")
+    async def similarity_search_many(
+        self,
+        queries: List[str],
+        k: int = 4,
+        filters=None,
+        options: SearchOptions = None
+    ) -> List[List[Document]]:
+        """
+        Run several similarity searches with one embedding call and one DB round trip.
+        
+        filters is either a single filter dict applied to every query or a list
+        with one filter per query. Results are returned in query order.
+        """
+        if not self.initialized or not queries:
+            return [[] for _ in queries]
+        
+        if filters is None or isinstance(filters, dict):
+            filters = [filters] * len(queries)
+        if len(filters) != len(queries):
+            raise ValueError("filters must be a dict or a list with one entry per query")
+        
+        options = (options or SearchOptions()).resolve()
+        results: List[Optional[List[Document]]] = [None] * len(queries)
+        versions = await asyncio.gather(*(self.query_cache.scope_version(flt) for flt in filters))
+        cache_keys = [
+            None if version is None else QueryResultCache.make_key(query, k, flt, options) + version
+            for query, flt, version in zip(queries, filters, versions)
+        ]
+        for position, cache_key in enumerate(cache_keys):
+            if cache_key is not None:
+                results[position] = self.query_cache.get(cache_key)
+        
+        missing = [position for position, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        generation = self.query_cache.generation
+        
+        embeddings_list = await self.embed_queries([queries[position] for position in missing])
+        fetch_count = options.fetch_count(k)
+        search_items = [
+            {"embedding": embedding, "filter": filters[position] or {}}
+            for position, embedding in zip(missing, embeddings_list)
+        ]
+        
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                # Queries whose filter matches few rows are searched exactly, in a second batch
+                if options.mode == "exact":
+                    exact = [True] * len(search_items)
+                else:
+                    exact = await self._small_scopes(conn, [item["filter"] for item in search_items])
+                grouped: Dict[int, list] = {}
+                for batch_exact in (False, True):
+                    batch = [item_index for item_index, is_exact in enumerate(exact) if is_exact == batch_exact]
+                    if not batch:
+                        continue
+                    search_options = replace(options, mode="exact") if batch_exact else options
+                    await apply_search_settings(conn, search_options, fetch_count, self.iterative_scan)
+                    # One LATERAL call of the match function per query vector
+                    rows = await conn.fetch(
+                        f"SELECT q.idx, m.* "
+                        f"FROM jsonb_array_elements($1::jsonb) WITH ORDINALITY AS q(item, idx) "
+                        f"CROSS JOIN LATERAL {settings.SUPABASE_QUERY_NAME}("
+                        f"(q.item->>'embedding')::vector, $2, q.item->'filter') AS m "
+                        f"WHERE $3::float8 IS NULL OR m.similarity >= 1 - $3::float8 "
+                        f"ORDER BY q.idx, m.similarity DESC",
+                        [search_items[item_index] for item_index in batch],
+                        fetch_count,
+                        options.max_distance
+                    )
+                    for row in rows:
+                        grouped.setdefault(batch[row['idx'] - 1], []).append(row)
+        
+        for item_index, position in enumerate(missing):
+            documents = self._rows_to_documents(grouped.get(item_index, []), options, k)
+            if cache_keys[position] is not None:
+                self.query_cache.put(cache_keys[position], filters[position], documents, generation)
+            results[position] = documents
+        
+        return results
+    
+    async def _is_small_scope(self, conn: asyncpg.Connection, filter_json: dict) -> bool:
+        """
+        Whether a filter matches few enough rows to search them exactly.
+        
+        Without iterative index scans the ANN index returns about ef_search
+        candidates before the filter applies, so a filter matching a small
+        share of the table can leave fewer than k rows.
+        """
+        return (await self._small_scopes(conn, [filter_json]))[0]
+    
+    async def _small_scopes(self, conn: asyncpg.Connection, filters: List[dict]) -> List[bool]:
+        """_is_small_scope for several filters, counted in one statement (each distinct filter once)"""
+        small = [False] * len(filters)
+        if self.iterative_scan or settings.VECTOR_EXACT_SEARCH_MAX_ROWS <= 0:
+            return small
+        distinct: Dict[str, dict] = {}
+        for filter_json in filters:
+            if filter_json:
+                distinct.setdefault(json.dumps(filter_json, sort_keys=True, default=str), filter_json)
+        if not distinct:
+            return small
+        keys = list(distinct)
+        # Same predicate as the match function
+        rows = await conn.fetch(
+            f"SELECT f.idx, (SELECT count(*) FROM (SELECT 1 FROM {self.table_name} t "
+            f"WHERE (f.item->>'user_id' IS NULL OR t.user_id = (f.item->>'user_id')::bigint) "
+            f"AND t.metadata @> (f.item - 'user_id') LIMIT $2) s) AS matched "
+            f"FROM jsonb_array_elements($1::jsonb) WITH ORDINALITY AS f(item, idx)",
+            [distinct[key] for key in keys],
+            settings.VECTOR_EXACT_SEARCH_MAX_ROWS + 1
+        )
+        small_keys = {keys[row['idx'] - 1] for row in rows if row['matched'] <= settings.VECTOR_EXACT_SEARCH_MAX_ROWS}
+        return [
+            bool(filter_json) and json.dumps(filter_json, sort_keys=True, default=str) in small_keys
+            for filter_json in filters
+        ]
+    
+    @staticmethod
+    def _rows_to_documents(rows, options: SearchOptions, k: int) -> List[Document]:
+        """Convert match function rows to Documents, best match first"""
+        # similarity is the exact cosine similarity of each candidate; iterative
+        # scans return rows only roughly ordered and oversample fetches extra rows
+        rows = sorted(rows, key=lambda row: row['similarity'], reverse=True)[:k]
+        
+        # Convert to Document objects
+        documents = []
+        for row in rows:
+            doc = Document(
+                page_content=row['content'],
+                metadata=row['metadata']
+            )
+            documents.append(doc)
+        
+        return documents
     
     async def clear_all_documents(self, user_id: Optional[int] = None) -> bool:
         """Clear documents from PostgreSQL (optionally filter by user_id)"""
@@ -84,26 +720,160 @@ class VectorStoreService:
                 if user_id:
                     # Delete only user's documents
                     await conn.execute(
-                        f"DELETE FROM {self.table_name} WHERE metadata->>'user_id' = $1",
-                        str(user_id)
+                        f"DELETE FROM {self.table_name} WHERE user_id = $1",
+                        user_id
                     )
+                    await self.query_cache.invalidate(user_id)
                 else:
                     # Delete all documents
                     await conn.execute(f"DELETE FROM {self.table_name}")
+                    await self.query_cache.invalidate(everything=True)
             
             return True
             
         except Exception as e:
             raise Exception(f"Error clearing documents: {str(e)}")
     
+    async def finalize_file(self, file_id: str, total_chunks: int, file_hash: Optional[str] = None):
+        """Record the final chunk count (and file hash) on every row of a streamed file"""
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                f"UPDATE {self.table_name} "
+                f"SET metadata = metadata || jsonb_build_object('total_chunks', $2::int, 'file_hash', $3::text) "
+                f"WHERE metadata->>'file_id' = $1",
+                file_id,
+                total_chunks,
+                file_hash
+            )
+    
+    async def get_file_hashes(self, source: str, user_id: Optional[int] = None) -> Set[Optional[str]]:
+        """Distinct file hashes stored for a source owned by user_id (None for rows without one)"""
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                f"SELECT DISTINCT metadata->>'file_hash' AS file_hash FROM {self.table_name} "
+                f"WHERE metadata->>'source' = $1 AND user_id IS NOT DISTINCT FROM $2",
+                source,
+                user_id
+            )
+        return {row['file_hash'] for row in rows}
+    
+    @asynccontextmanager
+    async def source_lock(self, source: str, user_id: Optional[int] = None, timeout: float = None):
+        """
+        Serialize re-ingests of one user's source across tasks and workers.
+        
+        Tasks of this process queue on an asyncio.Lock. Across workers, a
+        transaction-level advisory lock is taken in a transaction kept open
+        until the block exits, so it is released with that transaction on the
+        backend that took it, also behind pgbouncer transaction pooling.
+        Raises asyncio.TimeoutError if the source is still locked after
+        `timeout` seconds (INGEST_SOURCE_LOCK_TIMEOUT).
+        """
+        timeout = settings.INGEST_SOURCE_LOCK_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        digest = hashlib.sha256(f"{user_id}\x00{source}".encode("utf-8")).digest()
+        key = int.from_bytes(digest[:8], "big", signed=True)
+        local = self._source_locks.setdefault(key, asyncio.Lock())
+        await asyncio.wait_for(local.acquire(), timeout)
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    while not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", key):
+                        if time.monotonic() >= deadline:
+                            raise asyncio.TimeoutError(f"{source} is being ingested by another worker")
+                        await asyncio.sleep(SOURCE_LOCK_POLL_SECONDS)
+                    yield
+        finally:
+            local.release()
+    
+    async def get_chunk_hashes(self, source: str, user_id: Optional[int] = None) -> Dict[str, List[int]]:
+        """Map chunk_hash -> row ids for the stored chunks of a source owned by user_id"""
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                f"SELECT id, metadata->>'chunk_hash' AS chunk_hash FROM {self.table_name} "
+                f"WHERE metadata->>'source' = $1 AND user_id IS NOT DISTINCT FROM $2",
+                source,
+                user_id
+            )
+        
+        hashes: Dict[str, List[int]] = {}
+        for row in rows:
+            if row['chunk_hash']:
+                hashes.setdefault(row['chunk_hash'], []).append(row['id'])
+        return hashes
+    
+    @traced("vector_store.sync_file")
+    async def sync_file(
+        self,
+        file_id: str,
+        source: str,
+        user_id: Optional[int],
+        kept: List[tuple],
+        total_chunks: int,
+        file_hash: Optional[str] = None
+    ) -> int:
+        """
+        Finish an incremental re-ingest of a source in one transaction.
+        
+        Rows in `kept` ((row id, chunk index) pairs) are adopted into file_id,
+        every other stored row of the source that is not part of file_id is
+        deleted as stale, and the file totals are recorded. Returns the number
+        of stale rows deleted.
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if kept:
+                    row_ids, indexes = zip(*kept)
+                    await conn.execute(
+                        f"UPDATE {self.table_name} AS t "
+                        f"SET metadata = t.metadata || jsonb_build_object('file_id', $1::text, 'chunk_index', u.chunk_index) "
+                        f"FROM unnest($2::bigint[], $3::int[]) AS u(id, chunk_index) WHERE t.id = u.id",
+                        file_id,
+                        list(row_ids),
+                        list(indexes)
+                    )
+                
+                status = await conn.execute(
+                    f"DELETE FROM {self.table_name} "
+                    f"WHERE metadata->>'source' = $1 AND user_id IS NOT DISTINCT FROM $2 "
+                    f"AND metadata->>'file_id' IS DISTINCT FROM $3",
+                    source,
+                    user_id,
+                    file_id
+                )
+                
+                await conn.execute(
+                    f"UPDATE {self.table_name} "
+                    f"SET metadata = metadata || jsonb_build_object('total_chunks', $2::int, 'file_hash', $3::text) "
+                    f"WHERE metadata->>'file_id' = $1",
+                    file_id,
+                    total_chunks,
+                    file_hash
+                )
+        
+        deleted = int(status.split()[-1])
+        if deleted:
+            await self.query_cache.invalidate(user_id)
+        return deleted
+    
+    @traced("vector_store.delete_file")
+    async def delete_file(self, file_id: str, user_id: Optional[int] = None):
+        """Delete every row of a file (used to roll back a failed streamed ingest)"""
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                f"DELETE FROM {self.table_name} WHERE metadata->>'file_id' = $1",
+                file_id
+            )
+        await self.query_cache.invalidate(user_id)
+    
     async def get_document_count(self, user_id: Optional[int] = None) -> int:
         """Get total document count in vector store"""
         try:
             async with self.pool.acquire() as conn:
                 if user_id:
                     count = await conn.fetchval(
-                        f"SELECT COUNT(*) FROM {self.table_name} WHERE metadata->>'user_id' = $1",
-                        str(user_id)
+                        f"SELECT COUNT(*) FROM {self.table_name} WHERE user_id = $1",
+                        user_id
                     )
                 else:
                     count = await conn.fetchval(f"SELECT COUNT(*) FROM {self.table_name}")
@@ -0,0 +1,173 @@
+"""
+Shared fixtures.
+
+Settings are read when application modules are imported, so placeholders for
+the required ones are set first. Database tests run against the Postgres
+given by TEST_POSTGRES_HOST/PORT/USER/PASSWORD/DB, or against a throwaway
+server started with pgserver (which bundles pgvector); without either they
+are skipped.
+"""
+import os
+import socket
+import tempfile
+from collections import Counter
+
+for _name, _value in {
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "",
+    "POSTGRES_DB": "postgres",
+    "MCP_SERVER_URL": "",
+    "GOOGLE_GEMINI_MODEL": "test-model",
+    "GOOGLE_API_KEY": "test-key",
+    "GROQ_API_KEY": "test-key",
+    "TRACING_ENABLED": "false",
+    "DB_MIN_POOL_SIZE": "1",
+    "VECTOR_DB_MIN_POOL_SIZE": "1",
+    "DOCUMENT_PROCESS_WORKERS": "0",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import asyncpg
+import httpx
+import pytest
+from config.settings import get_settings
+
+settings = get_settings()
+
+
+@pytest.fixture(scope="session")
+def postgres():
+    """Connection parameters of the test database (also written to settings)"""
+    if os.environ.get("TEST_POSTGRES_HOST"):
+        params = {
+            "host": os.environ["TEST_POSTGRES_HOST"],
+            "port": int(os.environ.get("TEST_POSTGRES_PORT", "5432")),
+            "user": os.environ.get("TEST_POSTGRES_USER", "postgres"),
+            "password": os.environ.get("TEST_POSTGRES_PASSWORD", ""),
+            "database": os.environ.get("TEST_POSTGRES_DB", "postgres"),
+        }
+        server = None
+    else:
+        pgserver = pytest.importorskip("pgserver", reason="set TEST_POSTGRES_HOST or install pgserver")
+        server = pgserver.get_server(tempfile.mkdtemp(prefix="chat-tests-"), cleanup_mode="delete")
+        info = server.get_postmaster_info()
+        # pgserver listens on a unix socket; asyncpg takes its directory as the host
+        params = {
+            "host": str(info.socket_dir or info.hostname),
+            "port": info.port,
+            "user": "postgres",
+            "password": "",
+            "database": "postgres",
+        }
+
+    settings.POSTGRES_HOST = params["host"]
+    settings.POSTGRES_PORT = params["port"]
+    settings.POSTGRES_USER = params["user"]
+    settings.POSTGRES_PASSWORD = params["password"]
+    settings.POSTGRES_DB = params["database"]
+    settings.VECTOR_DB_HOST = ""
+    settings.VECTOR_DB_PORT = params["port"]
+    yield params
+    if server is not None:
+        server.cleanup()
+
+
+@pytest.fixture(scope="session")
+async def databases(postgres):
+    """Chat and vector pools with migrations applied and the vector store initialized"""
+    from core.database import db, vector_db
+    from core.shared_state import shared_state
+    from models.models import run_migrations
+    from services.vector_store_service import vector_store_service
+
+    await run_migrations()
+    await db.connect()
+    await vector_db.connect()
+    await shared_state.initialize(db.get_pool())
+    await vector_store_service.initialize(vector_db.get_pool())
+    yield db, vector_db
+    await vector_store_service.shutdown()
+    await vector_db.disconnect()
+    await db.disconnect()
+
+
+@pytest.fixture
+def vector_store(databases):
+    """The vector store service with a deterministic fake embedder"""
+    from benchmarks.fakes import FakeEmbeddings
+    from services.embedding_service import AsyncEmbedder
+    from services.vector_store_service import vector_store_service
+
+    vector_store_service.embedder = AsyncEmbedder(FakeEmbeddings(settings.EMBEDDING_DIMENSION))
+    return vector_store_service
+
+
+@pytest.fixture
+async def small_pool(databases, postgres):
+    """A two-connection chat pool, for checking how many connections a code path holds"""
+    pool = await asyncpg.create_pool(**postgres, min_size=1, max_size=2)
+    yield pool
+    await pool.close()
+
+
+@pytest.fixture
+def client_for():
+    """Build an HTTP client for the app using the given chat pool and agent"""
+    from core.database import get_db_pool
+    from main import app
+    from services.agent_service import get_agent_service
+
+    def build(pool, agent) -> httpx.AsyncClient:
+        app.dependency_overrides[get_db_pool] = lambda: pool
+        app.dependency_overrides[get_agent_service] = lambda: agent
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    yield build
+    app.dependency_overrides.clear()
+
+
+def free_port() -> int:
+    """A local TCP port nothing listens on right now"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+async def fake_mcp():
+    """The benchmark's fake MCP server on a free local port; yields its URL and call counts"""
+    from benchmarks.fakes import serve_fake_mcp
+
+    calls = Counter()
+    async with serve_fake_mcp(free_port(), latency=0.2, calls=calls) as url:
+        yield url, calls
+
+
+class FakeUpload:
+    """In-memory stand-in for an UploadFile"""
+
+    def __init__(self, content: bytes, filename: str = "notes.txt", content_type: str = "text/plain"):
+        self.content = content
+        self.filename = filename
+        self.content_type = content_type
+        self.position = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        end = len(self.content) if size is None or size < 0 else self.position + size
+        block = self.content[self.position:end]
+        self.position += len(block)
+        return block
+
+    async def seek(self, offset: int):
+        self.position = offset
+
+
+async def create_user(pool, name: str = "test") -> int:
+    """Insert a throwaway user"""
+    async with pool.acquire() as conn:
+        return await conn.fetchval(
+            "INSERT INTO users (username) VALUES ($1) RETURNING user_id",
+            f"{name}-{os.urandom(4).hex()}"
+        )
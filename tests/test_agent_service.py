@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from benchmarks.fakes import FakeChatModel
+from config.settings import get_settings
+from services.agent_service import AgentError, AgentService, AgentTimeoutError
+
+settings = get_settings()
+
+
+class TimingOutChatModel(FakeChatModel):
+    """Chat model whose client gives up long before the agent deadline"""
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise asyncio.TimeoutError("model request timed out")
+
+
+async def build_agent(model) -> AgentService:
+    agent = AgentService()
+    agent._create_llm = lambda: model
+    await agent.initialize()
+    return agent
+
+
+async def test_inner_timeout_in_stream_is_an_agent_error():
+    agent = await build_agent(TimingOutChatModel(latency=0.0, tool_calls=()))
+    try:
+        with pytest.raises(AgentError) as raised:
+            async for _ in agent.stream_response("hello", []):
+                pass
+    finally:
+        await agent.shutdown()
+
+    assert not isinstance(raised.value, AgentTimeoutError)
+    assert "model request timed out" in str(raised.value)
+
+
+async def test_stream_past_the_deadline_is_an_agent_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_TIMEOUT_SECONDS", 0.05)
+    agent = await build_agent(FakeChatModel(latency=1.0, tool_calls=()))
+    try:
+        with pytest.raises(AgentTimeoutError):
+            async for _ in agent.stream_response("hello", []):
+                pass
+    finally:
+        await agent.shutdown()
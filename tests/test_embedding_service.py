@@ -0,0 +1,95 @@
+import asyncio
+import time
+import pytest
+from benchmarks.fakes import FakeEmbeddings
+from services.embedding_service import AsyncEmbedder
+
+
+async def max_loop_lag(coro, interval: float = 0.01) -> tuple:
+    """Run coro while measuring the worst delay of a ticker on the same loop"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - started - interval)
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        done.set()
+        await task
+    return result, max(lags)
+
+
+async def test_slow_batch_does_not_block_event_loop():
+    embedder = AsyncEmbedder(FakeEmbeddings(8, latency=0.5), batch_size=10, max_concurrency=2)
+
+    embeddings, lag = await max_loop_lag(embedder.embed_documents([f"text {idx}" for idx in range(20)]))
+
+    assert len(embeddings) == 20
+    # The embedder sleeps synchronously for 0.5s per batch; it must run in a worker thread
+    assert lag < 0.1
+
+
+async def test_batches_preserve_input_order():
+    fake = FakeEmbeddings(8)
+    embedder = AsyncEmbedder(fake, batch_size=3, max_concurrency=4)
+    texts = [f"text {idx}" for idx in range(10)]
+
+    assert await embedder.embed_documents(texts) == fake.embed_documents(texts)
+
+
+class RateLimitedEmbeddings(FakeEmbeddings):
+    """Fails the first `failures` calls with a quota error"""
+
+    def __init__(self, failures: int):
+        super().__init__(8)
+        self.failures = failures
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED")
+        return super().embed_documents(texts)
+
+
+async def test_rate_limit_errors_are_retried():
+    fake = RateLimitedEmbeddings(failures=2)
+    embedder = AsyncEmbedder(fake, max_retries=3, retry_base_delay=0.01)
+
+    assert len(await embedder.embed_documents(["a", "b"])) == 2
+    assert fake.calls == 3
+
+
+async def test_other_errors_are_not_retried():
+    class Broken(FakeEmbeddings):
+        def embed_documents(self, texts):
+            raise ValueError("bad input")
+
+    embedder = AsyncEmbedder(Broken(8), max_retries=3, retry_base_delay=0.01)
+    with pytest.raises(ValueError):
+        await embedder.embed_documents(["a"])
+
+
+async def test_queries_are_embedded_in_one_batch_with_the_query_task_type():
+    class TaskTypeEmbeddings(FakeEmbeddings):
+        def __init__(self):
+            super().__init__(8)
+            self.calls = []
+
+        def embed_documents(self, texts, task_type=None):
+            self.calls.append((len(texts), task_type))
+            return super().embed_documents(texts)
+
+    fake = TaskTypeEmbeddings()
+    embedder = AsyncEmbedder(fake, batch_size=10)
+
+    embeddings = await embedder.embed_queries(["a", "b", "c"])
+
+    assert embeddings == [fake.embed_query(text) for text in ["a", "b", "c"]]
+    assert fake.calls == [(3, "RETRIEVAL_QUERY")]
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+import pytest
+from config.settings import get_settings
+from services.history_service import HistoryEntry, HistoryService, InMemoryHistoryCache, NullHistoryCache
+
+settings = get_settings()
+
+
+class BlockingPool:
+    """Pool stand-in whose history query waits until `release` is set"""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.reading = asyncio.Event()
+        self.release = asyncio.Event()
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    async def fetchrow(self, query, *args):
+        return None
+
+    async def fetch(self, query, *args):
+        self.reading.set()
+        await self.release.wait()
+        return self.rows
+
+
+def message_row(message_id: int, sender: str, text: str) -> dict:
+    return {"message_id": message_id, "sender": sender, "message_text": text}
+
+
+class SummaryPool:
+    """Pool stand-in holding enough unsummarized messages to trigger a summary"""
+
+    def __init__(self, count: int):
+        self.rows = [message_row(idx, "User", f"message {idx}") for idx in range(1, count + 1)]
+        self.saved = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    async def fetchrow(self, query, *args):
+        return None
+
+    async def fetch(self, query, *args):
+        return self.rows
+
+    async def execute(self, query, *args):
+        self.saved.append(args)
+
+
+async def test_memory_cache_evicts_least_recent_and_idle_sessions(monkeypatch):
+    cache = InMemoryHistoryCache(max_sessions=2, idle_seconds=60)
+    for session_id in (1, 2):
+        await cache.set(session_id, HistoryEntry(summary=None, summarized_until=0))
+    await cache.get(1)
+    await cache.set(3, HistoryEntry(summary=None, summarized_until=0))
+
+    assert await cache.get(2) is None
+    assert await cache.get(1) is not None
+
+    clock = time.monotonic() + 61
+    monkeypatch.setattr(time, "monotonic", lambda: clock)
+    assert await cache.get(3) is None
+    assert cache.stats()["evictions"] == 2
+    assert cache.stats()["sessions"] == 1
+
+
+async def test_null_cache_keeps_nothing():
+    cache = NullHistoryCache()
+    await cache.set(1, HistoryEntry(summary="kept?", summarized_until=0))
+
+    assert await cache.get(1) is None
+
+
+async def test_shutdown_waits_for_summaries_then_cancels_stragglers(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_SUMMARY_ENABLED", True)
+    service = HistoryService(cache=NullHistoryCache())
+    calls = []
+
+    async def summarize(previous, messages):
+        calls.append(previous)
+        if len(calls) > 1:
+            await asyncio.Event().wait()
+        return "summary"
+
+    service.set_summarizer(summarize)
+    quick, stuck = SummaryPool(settings.HISTORY_SUMMARY_THRESHOLD + 1), SummaryPool(settings.HISTORY_SUMMARY_THRESHOLD + 1)
+    service.schedule_summary_update(quick, 1)
+    [quick_task] = service._summary_tasks
+    service.schedule_summary_update(stuck, 2)
+    [stuck_task] = service._summary_tasks - {quick_task}
+
+    await service.shutdown(timeout=0.1)
+
+    assert quick_task.done() and not quick_task.cancelled()
+    assert len(quick.saved) == 1
+    assert stuck_task.cancelled() and stuck.saved == []
+    assert not service._summary_tasks
+
+
+async def test_load_is_cached_without_concurrent_writes():
+    service = HistoryService(cache=InMemoryHistoryCache(max_sessions=10, idle_seconds=60))
+    pool = BlockingPool([message_row(1, "User", "hi")])
+    pool.release.set()
+
+    await service.load(pool, 1)
+
+    assert (await service.cache.get(1)).messages[0][1].content == "hi"
+
+
+async def test_stale_load_is_not_cached_after_its_write_version_is_evicted(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_CACHE_MAX_SESSIONS", 2)
+    service = HistoryService(cache=InMemoryHistoryCache(max_sessions=10, idle_seconds=60))
+    pool = BlockingPool([message_row(1, "User", "hi")])
+
+    load = asyncio.create_task(service.load(pool, 1))
+    await pool.reading.wait()
+    # A write lands for session 1 mid-read, then enough other sessions write to evict its version
+    await service.record_exchange(1, [message_row(2, "AI", "hello")])
+    for session_id in range(2, 8):
+        await service.record_exchange(session_id, [])
+    assert 1 not in service._write_versions
+    pool.release.set()
+    await load
+
+    assert await service.cache.get(1) is None
@@ -0,0 +1,336 @@
+import asyncio
+import hashlib
+import os
+from contextlib import asynccontextmanager
+import asyncpg
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from config.settings import get_settings
+from services import document_service as documents
+from services.document_service import DocumentService
+from services.embedding_service import AsyncEmbedder
+from services.ingestion_service import FileProgress, IngestionPipeline
+from services.vector_store_service import VectorStoreService
+from tests.conftest import FakeUpload
+
+settings = get_settings()
+
+TEST_USERS = (991, 992, 993, 994, 995)
+
+
+@pytest.fixture
+async def store(vector_store):
+    """The vector store with this module's test users' documents removed"""
+    for user_id in TEST_USERS:
+        await vector_store.clear_all_documents(user_id)
+    return vector_store
+
+
+def make_text(paragraphs: int, seed: str = "") -> bytes:
+    return "\n\n".join(
+        f"Paragraph {idx} {seed}: " + " ".join(f"word{idx}_{word}" for word in range(60))
+        for idx in range(paragraphs)
+    ).encode("utf-8")
+
+
+async def count_file_rows(vector_store, file_id: str) -> int:
+    async with vector_store.pool.acquire() as conn:
+        return await conn.fetchval(
+            f"SELECT COUNT(*) FROM {vector_store.table_name} WHERE metadata->>'file_id' = $1",
+            file_id
+        )
+
+
+class CountingEmbeddings(Embeddings):
+    """Returns one fixed unit vector, recording the size of every embedding call"""
+
+    def __init__(self, dimension: int):
+        self.vector = [1.0] + [0.0] * (dimension - 1)
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(len(texts))
+        return [self.vector for _ in texts]
+
+    def embed_query(self, text):
+        return self.vector
+
+
+class StallingVectorStore:
+    """Inserts the first batch for real, then blocks on the next one"""
+
+    def __init__(self, vector_store):
+        self.vector_store = vector_store
+        self.first_batch_done = asyncio.Event()
+
+    async def add_documents(self, documents):
+        if self.first_batch_done.is_set():
+            await asyncio.Event().wait()
+        await self.vector_store.add_documents(documents)
+        self.first_batch_done.set()
+        return True
+
+    def __getattr__(self, attr):
+        return getattr(self.vector_store, attr)
+
+
+async def test_cancelled_ingest_removes_partial_rows(store):
+    stalling = StallingVectorStore(store)
+    pipeline = IngestionPipeline(DocumentService(chunk_size=500, chunk_overlap=50), stalling, batch_size=4)
+    progress = FileProgress(filename="cancelled.txt")
+
+    task = asyncio.create_task(pipeline.ingest_file(FakeUpload(make_text(40)), "text/plain", 991, progress))
+    await asyncio.wait_for(stalling.first_batch_done.wait(), timeout=10)
+    assert await count_file_rows(store, progress.file_id) > 0
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert progress.status == "error"
+    assert await count_file_rows(store, progress.file_id) == 0
+
+
+async def test_failed_ingest_removes_partial_rows(store):
+    class FailingStore(StallingVectorStore):
+        async def add_documents(self, documents):
+            if self.first_batch_done.is_set():
+                raise RuntimeError("insert failed")
+            return await super().add_documents(documents)
+
+    pipeline = IngestionPipeline(DocumentService(chunk_size=500, chunk_overlap=50), FailingStore(store), batch_size=4)
+    progress = await pipeline.ingest_file(FakeUpload(make_text(40)), "text/plain", 992, FileProgress(filename="failed.txt"))
+
+    assert progress.status == "error"
+    assert progress.chunks_added == 0
+    assert await count_file_rows(store, progress.file_id) == 0
+
+
+async def test_file_concurrency_is_capped_across_pipelines():
+    active = 0
+    peak = 0
+
+    class CountingPipeline(IngestionPipeline):
+        async def _run(self, file, content_type, user_id, progress):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.05)
+            active -= 1
+
+    pipelines = [CountingPipeline(DocumentService(), None) for _ in range(3)]
+    await asyncio.gather(*(
+        pipeline.ingest_file(FakeUpload(b"text"), "text/plain", None, FileProgress(filename=f"{idx}.txt"))
+        for pipeline in pipelines
+        for idx in range(2)
+    ))
+
+    assert peak == settings.INGEST_MAX_CONCURRENT_FILES
+
+
+class CountingDocumentService(DocumentService):
+    """Counts how often a file's text is extracted"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.extractions = 0
+
+    def iter_text_segments(self, *args, **kwargs):
+        self.extractions += 1
+        return super().iter_text_segments(*args, **kwargs)
+
+
+async def count_source_rows(store, source: str, user_id: int) -> int:
+    async with store.pool.acquire() as conn:
+        return await conn.fetchval(
+            f"SELECT COUNT(*) FROM {store.table_name} WHERE metadata->>'source' = $1 AND user_id = $2",
+            source,
+            user_id
+        )
+
+
+async def test_unchanged_reupload_is_skipped_before_extraction(store):
+    doc_service = CountingDocumentService(chunk_size=500, chunk_overlap=50)
+    pipeline = IngestionPipeline(doc_service, store, dedupe=True)
+    content = make_text(12, "v1")
+
+    first = await pipeline.ingest_file(FakeUpload(content), "text/plain", 993, FileProgress(filename="same.txt"))
+    second = await pipeline.ingest_file(FakeUpload(content), "text/plain", 993, FileProgress(filename="same.txt"))
+
+    assert first.status == "success" and first.chunks_added > 0
+    assert second.status == "unchanged"
+    assert second.chunks_added == 0
+    assert doc_service.extractions == 1
+    assert await count_source_rows(store, "same.txt", 993) == first.chunks_added
+
+
+async def test_changed_reupload_reuses_unchanged_chunks(store):
+    pipeline = IngestionPipeline(DocumentService(chunk_size=500, chunk_overlap=50), store, dedupe=True)
+    original = make_text(12, "v1")
+    edited = original + b"\n\nA new closing paragraph."
+
+    first = await pipeline.ingest_file(FakeUpload(original), "text/plain", 994, FileProgress(filename="edited.txt"))
+    second = await pipeline.ingest_file(FakeUpload(edited), "text/plain", 994, FileProgress(filename="edited.txt"))
+
+    assert second.status == "success"
+    assert second.chunks_skipped > 0
+    assert second.chunks_added < first.chunks_added
+
+
+async def test_concurrent_identical_uploads_ingest_once(store):
+    pipeline = IngestionPipeline(DocumentService(chunk_size=500, chunk_overlap=50), store, dedupe=True)
+    content = make_text(12, "race")
+
+    results = await asyncio.gather(*(
+        pipeline.ingest_file(FakeUpload(content), "text/plain", 995, FileProgress(filename="race.txt"))
+        for _ in range(2)
+    ))
+
+    assert sorted(progress.status for progress in results) == ["success", "unchanged"]
+    added = sum(progress.chunks_added for progress in results)
+    assert await count_source_rows(store, "race.txt", 995) == added
+
+
+async def test_large_batch_is_embedded_in_batches_and_copied_once(store, monkeypatch):
+    embeddings = CountingEmbeddings(settings.EMBEDDING_DIMENSION)
+    monkeypatch.setattr(store, "embedder", AsyncEmbedder(embeddings, batch_size=100, max_concurrency=4))
+    copies, inserts = [], []
+
+    async def counting_copy(self, table_name, *, records, columns):
+        # Counted, not sent: indexing 10k rows would dominate the test's run time
+        copies.append((table_name, len(records)))
+
+    executemany = asyncpg.Connection.executemany
+
+    async def counting_executemany(self, command, args, **kwargs):
+        inserts.append(len(args))
+        return await executemany(self, command, args, **kwargs)
+
+    monkeypatch.setattr(asyncpg.Connection, "copy_records_to_table", counting_copy)
+    monkeypatch.setattr(asyncpg.Connection, "executemany", counting_executemany)
+    seed = os.urandom(4).hex()
+    chunks = [
+        Document(page_content=f"bulk chunk {seed} {idx}", metadata={"user_id": 996, "source": "bulk.txt"})
+        for idx in range(10_000)
+    ]
+
+    assert await store.add_documents(chunks)
+
+    assert embeddings.calls == [100] * 100
+    assert copies == [(store.table_name, 10_000)]
+    # The embedding cache is filled in one statement too
+    assert inserts == [10_000]
+
+    embeddings.calls.clear()
+    assert await store.add_documents(chunks)
+    assert embeddings.calls == []
+
+
+async def test_pdf_ranges_are_read_from_one_spooled_file(monkeypatch):
+    import fitz
+
+    pdf = fitz.open()
+    for page in range(5):
+        pdf.new_page().insert_text((72, 72), f"Page {page}")
+    content = pdf.tobytes()
+    monkeypatch.setattr(settings, "PDF_PAGES_PER_TASK", 2)
+
+    calls = []
+    run_in_pool = documents.run_in_pool
+
+    async def recording_run_in_pool(func, *args):
+        calls.append(args)
+        return await run_in_pool(func, *args)
+
+    monkeypatch.setattr(documents, "run_in_pool", recording_run_in_pool)
+    file_hash = hashlib.sha256()
+    upload = FakeUpload(content, "pages.pdf", "application/pdf")
+    text = "".join([
+        segment async for segment in DocumentService().iter_text_segments(upload, "application/pdf", file_hash=file_hash)
+    ])
+
+    assert [f"Page {page}" in text for page in range(5)] == [True] * 5
+    assert len(calls) == 4  # page count + three ranges
+    [path] = {args[0] for args in calls}
+    assert isinstance(path, str) and not os.path.exists(path)
+    assert file_hash.hexdigest() == hashlib.sha256(content).hexdigest()
+
+
+class TransactionPooledConnection:
+    """Behaves like a pgbouncer client in transaction mode: statements outside a transaction hop backends"""
+
+    def __init__(self, backends: list):
+        self.backends = backends
+        self._turn = 0
+        self._pinned = None
+
+    def _backend(self):
+        if self._pinned is not None:
+            return self._pinned
+        self._turn += 1
+        return self.backends[self._turn % len(self.backends)]
+
+    async def execute(self, query, *args):
+        return await self._backend().execute(query, *args)
+
+    async def fetchval(self, query, *args):
+        return await self._backend().fetchval(query, *args)
+
+    @asynccontextmanager
+    async def transaction(self):
+        self._pinned = self._backend()
+        try:
+            async with self._pinned.transaction():
+                yield
+        finally:
+            self._pinned = None
+
+
+class TransactionPooledPool:
+    def __init__(self, backends: list):
+        self.backends = backends
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield TransactionPooledConnection(self.backends)
+
+
+@pytest.fixture
+async def backends(postgres):
+    connections = [await asyncpg.connect(**postgres) for _ in range(2)]
+    yield connections
+    for connection in connections:
+        await connection.close()
+
+
+async def test_source_lock_is_released_when_statements_hop_backends(backends):
+    service = VectorStoreService()
+    service.pool = TransactionPooledPool(backends)
+
+    async with service.source_lock("hop.txt", 991):
+        pass
+
+    pids = [connection.get_server_pid() for connection in backends]
+    held = await backends[0].fetchval(
+        "SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = ANY($1::int[])", pids
+    )
+    assert held == 0
+    # The next upload of the same source is not blocked by a leaked lock
+    async with service.source_lock("hop.txt", 991, timeout=1):
+        pass
+
+
+async def test_source_lock_wait_is_bounded_across_workers(databases):
+    _, vector_db = databases
+    # Separate instances stand in for two worker processes
+    holder, waiter = VectorStoreService(), VectorStoreService()
+    holder.pool = waiter.pool = vector_db.get_pool()
+
+    async with holder.source_lock("busy.txt", 991):
+        with pytest.raises(asyncio.TimeoutError):
+            async with waiter.source_lock("busy.txt", 991, timeout=0.2):
+                pass
+
+    async with waiter.source_lock("busy.txt", 991, timeout=1):
+        pass
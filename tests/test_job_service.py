@@ -0,0 +1,50 @@
+import asyncio
+from services.ingestion_service import FileProgress
+from services.job_service import IngestionJobManager
+
+
+class Cleanup:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+
+
+async def test_jobs_complete_and_clean_up():
+    manager = IngestionJobManager(concurrency=1)
+    await manager.start()
+    cleanup = Cleanup()
+
+    async def work(job):
+        job.files[0].status = "success"
+
+    job = manager.submit([FileProgress(filename="a.txt")], work, cleanup=cleanup)
+    await manager._queue.join()
+    await manager.stop()
+
+    assert job.status == "completed"
+    assert cleanup.calls == 1
+
+
+async def test_stop_cancels_running_and_queued_jobs():
+    manager = IngestionJobManager(concurrency=1)
+    await manager.start()
+    started = asyncio.Event()
+    running_cleanup, queued_cleanup = Cleanup(), Cleanup()
+
+    async def hang(job):
+        job.files[0].status = "processing"
+        started.set()
+        await asyncio.Event().wait()
+
+    running = manager.submit([FileProgress(filename="running.txt")], hang, cleanup=running_cleanup)
+    queued = manager.submit([FileProgress(filename="queued.txt")], hang, cleanup=queued_cleanup)
+    await started.wait()
+    await manager.stop()
+
+    for job, cleanup in ((running, running_cleanup), (queued, queued_cleanup)):
+        assert job.status == "cancelled"
+        assert job.finished_at is not None
+        assert job.files[0].status == "error"
+        assert cleanup.calls == 1
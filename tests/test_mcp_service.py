@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+from langchain_core.tools import StructuredTool
+from benchmarks.fakes import FAKE_MCP_TOOLS, serve_fake_mcp
+from config.settings import get_settings
+from core.shared_state import InMemorySharedState
+from services import mcp_service
+from services.mcp_service import MCPConnectionManager
+from tests.conftest import free_port
+
+settings = get_settings()
+
+
+@pytest.fixture
+def fast_supervision(monkeypatch):
+    monkeypatch.setattr(settings, "MCP_HEALTH_CHECK_INTERVAL", 0.1)
+    monkeypatch.setattr(settings, "MCP_HEALTH_CHECK_TIMEOUT", 1.0)
+    monkeypatch.setattr(settings, "MCP_RECONNECT_BASE_DELAY", 0.1)
+    monkeypatch.setattr(settings, "MCP_RECONNECT_MAX_DELAY", 0.2)
+
+
+async def wait_for(predicate, timeout: float = 10.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.05)
+
+
+async def test_tools_are_withdrawn_on_disconnect_and_restored_on_reconnect(fast_supervision):
+    port = free_port()
+    handed_over = []
+    manager = MCPConnectionManager(f"http://127.0.0.1:{port}/mcp", {}, handed_over.append)
+    try:
+        async with serve_fake_mcp(port, latency=0.0):
+            await manager.start(wait=10)
+            assert sorted(tool.name for tool in handed_over[-1]) == sorted(FAKE_MCP_TOOLS)
+
+        # Server gone: the next health check fails and the tools are withdrawn
+        await wait_for(lambda: handed_over[-1] == [])
+        assert not manager.status()["connected"]
+        assert manager.status()["tools"] == 0
+
+        async with serve_fake_mcp(port, latency=0.0):
+            await wait_for(lambda: manager.connected.is_set())
+            assert sorted(tool.name for tool in handed_over[-1]) == sorted(FAKE_MCP_TOOLS)
+            result = await handed_over[-1][0].ainvoke({"user_id": 1})
+            assert result
+            assert manager.status()["reconnects"] == 1
+    finally:
+        await manager.stop()
+
+    assert handed_over[-1] == []
+
+
+def tool_list(*names: str) -> list:
+    return [StructuredTool.from_function(lambda: "ok", name=name, description=f"{name} tool") for name in names]
+
+
+async def test_workers_seeing_different_tool_lists_stop_reloading(monkeypatch):
+    state = InMemorySharedState()
+    state.shared = True
+    monkeypatch.setattr(mcp_service, "shared_state", state)
+    # The "session" is the tool list the server gives that worker
+    loads = []
+
+    async def load_mcp_tools(session):
+        loads.append(session)
+        return session
+
+    monkeypatch.setattr(mcp_service, "load_mcp_tools", load_mcp_tools)
+    first = MCPConnectionManager("http://unused/mcp", {}, lambda tools: None)
+    second = MCPConnectionManager("http://unused/mcp", {}, lambda tools: None)
+    first_tools, second_tools = tool_list("get_orders"), tool_list("get_orders", "get_invoices")
+
+    await first._load_tools(first_tools)
+    await asyncio.sleep(0.01)
+    await second._load_tools(second_tools)
+    for _ in range(5):
+        await first._sync_tools(first_tools)
+        await second._sync_tools(second_tools)
+
+    # One reload of the older worker, then both keep their lists
+    assert len(loads) == 3
+    assert (await state.get(mcp_service.MCP_TOOLS_STATE_KEY))["fingerprint"] == second.fingerprint
+
+
+async def test_newer_tool_list_from_another_worker_is_loaded(monkeypatch):
+    state = InMemorySharedState()
+    state.shared = True
+    monkeypatch.setattr(mcp_service, "shared_state", state)
+    server_tools = tool_list("get_orders")
+
+    async def load_mcp_tools(session):
+        return server_tools
+
+    monkeypatch.setattr(mcp_service, "load_mcp_tools", load_mcp_tools)
+    handed_over = []
+    stale = MCPConnectionManager("http://unused/mcp", {}, handed_over.append)
+    fresh = MCPConnectionManager("http://unused/mcp", {}, lambda tools: None)
+    await stale._load_tools(None)
+
+    # The server changed its tools and another worker reconnected
+    server_tools = tool_list("get_orders", "get_invoices")
+    await asyncio.sleep(0.01)
+    await fresh._load_tools(None)
+    await stale._sync_tools(None)
+
+    assert [tool.name for tool in handed_over[-1]] == ["get_orders", "get_invoices"]
+    assert stale.fingerprint == fresh.fingerprint
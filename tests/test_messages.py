@@ -0,0 +1,162 @@
+import asyncio
+import json
+import time
+import pytest
+from config.settings import get_settings
+from services.agent_service import AgentStepLimitError
+from tests.conftest import create_user
+
+settings = get_settings()
+
+
+class SlowAgent:
+    """Agent stand-in whose reply takes `delay` seconds"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def get_response(self, message, chat_history, user_id=None, session_id=None, timings=None):
+        await asyncio.sleep(self.delay)
+        return f"echo: {message}"
+
+
+class StreamingAgent:
+    """Agent stand-in for the SSE endpoint: streams `events`, then raises `error` if given"""
+
+    def __init__(self, events: list, error: Exception = None):
+        self.events = events
+        self.error = error
+
+    async def get_response(self, message, chat_history, user_id=None, session_id=None, timings=None):
+        if self.error:
+            raise self.error
+        return "ok"
+
+    async def stream_response(self, message, chat_history, user_id=None, session_id=None):
+        for event in self.events:
+            yield event
+        if self.error:
+            raise self.error
+
+
+class HangingAgent:
+    """Agent stand-in that streams one token, then waits on a model call that never returns"""
+
+    def __init__(self):
+        self.cancelled = asyncio.Event()
+
+    async def stream_response(self, message, chat_history, user_id=None, session_id=None):
+        yield {"event": "token", "data": {"content": "Hel"}}
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+def sse_events(body: str) -> list:
+    """(event, data) pairs of a server-sent event stream"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def test_concurrent_chats_do_not_exhaust_pool(small_pool, client_for):
+    """20 chats through a 2-connection pool finish in about one agent run, not ten"""
+    delay = 0.3
+    chats = 20
+    user_id = await create_user(small_pool, "pool")
+
+    async with client_for(small_pool, SlowAgent(delay)) as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post(f"{settings.API_V1_PREFIX}/messages/", json={"user_id": user_id, "message": f"hi {idx}"})
+            for idx in range(chats)
+        ))
+        elapsed = time.perf_counter() - started
+
+    assert [response.status_code for response in responses] == [200] * chats
+    # Holding a connection across the agent run would serialize it: chats / 2 * delay = 3s
+    assert elapsed < chats / 2 * delay / 2
+
+    session_ids = [response.json()["session_id"] for response in responses]
+    async with small_pool.acquire() as conn:
+        saved = await conn.fetchval("SELECT COUNT(*) FROM messages WHERE session_id = ANY($1::int[])", session_ids)
+    assert saved == chats * 2
+
+
+async def test_step_limit_is_a_server_error(small_pool, client_for):
+    user_id = await create_user(small_pool, "limit")
+    agent = StreamingAgent([], AgentStepLimitError("Agent stopped after 8 steps"))
+
+    async with client_for(small_pool, agent) as client:
+        response = await client.post(f"{settings.API_V1_PREFIX}/messages/", json={"user_id": user_id, "message": "hi"})
+
+    assert response.status_code == 500
+    assert response.json()["detail"]["code"] == "agent_step_limit"
+
+
+@pytest.mark.parametrize("error", [RuntimeError("Agent not initialized"), ValueError("bad tool output")])
+async def test_stream_reports_unexpected_errors(small_pool, client_for, error):
+    user_id = await create_user(small_pool, "stream")
+    agent = StreamingAgent([{"event": "token", "data": {"content": "Hel"}}], error)
+
+    async with client_for(small_pool, agent) as client:
+        response = await client.post(f"{settings.API_V1_PREFIX}/messages/stream", json={"user_id": user_id, "message": "hi"})
+
+    assert response.status_code == 200
+    assert sse_events(response.text) == [("token", {"content": "Hel"}), ("error", {"code": "internal_error", "message": "Internal server error"})]
+
+
+async def test_stream_reports_save_failures(small_pool, client_for):
+    agent = StreamingAgent([{"event": "done", "data": {"content": "Hello"}}])
+
+    async with client_for(small_pool, agent) as client:
+        # No such user: creating the session violates its foreign key
+        response = await client.post(f"{settings.API_V1_PREFIX}/messages/stream", json={"user_id": -1, "message": "hi"})
+
+    assert sse_events(response.text) == [("error", {"code": "internal_error", "message": "Internal server error"})]
+
+
+async def test_stream_cancels_the_run_when_the_client_disconnects_mid_step():
+    from core.database import get_db_pool
+    from main import app
+    from services.agent_service import get_agent_service
+
+    agent = HangingAgent()
+    app.dependency_overrides[get_db_pool] = lambda: None
+    app.dependency_overrides[get_agent_service] = lambda: agent
+    path = f"{settings.API_V1_PREFIX}/messages/stream"
+    # ASGI 2.4 servers leave disconnect detection to the app: Starlette does not watch for it
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"test"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000), "server": ("test", 80),
+    }
+    body = json.dumps({"user_id": 1, "message": "hi"}).encode()
+    requested, gone = asyncio.Event(), asyncio.Event()
+    chunks = []
+
+    async def receive():
+        if not requested.is_set():
+            requested.set()
+            return {"type": "http.request", "body": body, "more_body": False}
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks.append(message["body"].decode())
+            # The client leaves after the first token, while the agent is mid-step
+            gone.set()
+
+    try:
+        await asyncio.wait_for(app(scope, receive, send), timeout=5)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert agent.cancelled.is_set()
+    assert sse_events("".join(chunks)) == [("token", {"content": "Hel"})]
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from prometheus_client import REGISTRY
+from benchmarks.fakes import FAKE_MCP_TOOLS, FakeChatModel
+from config.settings import get_settings
+from core.metrics import render
+from core.shared_state import InMemorySharedState
+from services.agent_service import AgentService
+from services.document_service import extract_pdf_range
+from services.history_service import HistoryService, InMemoryHistoryCache
+from services.tool_cache import ToolResultCache
+from services.tool_executor import ToolExecutor
+from tests.conftest import create_user
+
+settings = get_settings()
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def snapshot(*series) -> dict:
+    return {series_key: sample(series_key[0], **dict(series_key[1:])) for series_key in series}
+
+
+@pytest.fixture
+async def fake_agent(fake_mcp, monkeypatch):
+    """A real agent on the fake chat model, with the fake MCP server's tools"""
+    url, _ = fake_mcp
+    monkeypatch.setattr(settings, "MCP_SERVER_URL", url)
+    agent = AgentService()
+    agent._create_llm = lambda: FakeChatModel(latency=0.01)
+    await agent.initialize()
+    yield agent
+    await agent.shutdown()
+
+
+async def test_chat_workload_moves_agent_tool_and_db_metrics(databases, client_for, fake_agent):
+    db, _ = databases
+    pool = db.get_pool()
+    user_id = await create_user(pool, "metrics")
+    series = [
+        ("llm_request_seconds_count",),
+        ("agent_steps_count",),
+        ("agent_run_seconds_count", ("outcome", "ok")),
+        ("db_pool_acquire_seconds_count", ("pool", "chat")),
+        ("db_query_seconds_count", ("pool", "chat"), ("operation", "INSERT")),
+        *[("tool_call_seconds_count", ("tool", tool)) for tool in FAKE_MCP_TOOLS],
+    ]
+    before = snapshot(*series)
+    chats = 3
+
+    async with client_for(pool, fake_agent) as client:
+        responses = await asyncio.gather(*(
+            client.post(f"{settings.API_V1_PREFIX}/messages/", json={"user_id": user_id, "message": f"orders {idx}"})
+            for idx in range(chats)
+        ))
+        exposition = (await client.get("/metrics")).text
+
+    assert [response.status_code for response in responses] == [200] * chats
+    moved = {key: value - before[key] for key, value in snapshot(*series).items()}
+    # The fake model calls the tools, then answers: two model calls per run
+    assert moved[("llm_request_seconds_count",)] == 2 * chats
+    assert moved[("agent_steps_count",)] == chats
+    assert moved[("agent_run_seconds_count", ("outcome", "ok"))] == chats
+    for tool in FAKE_MCP_TOOLS:
+        assert moved[("tool_call_seconds_count", ("tool", tool))] == chats
+    assert moved[("db_pool_acquire_seconds_count", ("pool", "chat"))] >= chats
+    assert moved[("db_query_seconds_count", ("pool", "chat"), ("operation", "INSERT"))] >= chats
+    assert sample("db_pool_connections", pool="chat", state="max") == pool.get_max_size()
+    assert "llm_request_seconds_bucket" in exposition
+    assert 'db_pool_connections{pool="chat",state="in_use"}' in exposition
+
+
+async def test_embedding_pdf_and_tool_error_metrics(vector_store, tmp_path):
+    embed_calls = sample("embedding_request_seconds_count", kind="documents")
+    embedded_texts = sample("embedding_batch_size_sum", kind="documents")
+    pdf_pages = sample("pdf_extract_page_seconds_count")
+    timeouts = sample("tool_call_errors_total", tool="slow", status="timeout")
+
+    texts = [f"metrics text {os.urandom(4).hex()}" for _ in range(3)]
+    await vector_store.embed_documents(texts)
+
+    import fitz
+
+    pdf = fitz.open()
+    for page in range(2):
+        pdf.new_page().insert_text((72, 72), f"Page {page}")
+    pdf.save(tmp_path / "sample.pdf")
+    await extract_pdf_range(str(tmp_path / "sample.pdf"), 0, 2, 2)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(Exception):
+        await ToolExecutor(timeout=0.01).run("slow", slow, None)
+
+    assert sample("embedding_request_seconds_count", kind="documents") == embed_calls + 1
+    assert sample("embedding_batch_size_sum", kind="documents") == embedded_texts + 3
+    assert sample("pdf_extract_page_seconds_count") == pdf_pages + 2
+    assert sample("tool_call_errors_total", tool="slow", status="timeout") == timeouts + 1
+
+
+async def test_history_and_tool_cache_stats_are_exported(databases):
+    db, _ = databases
+    series = [
+        ("history_cache_lookups_total", ("result", "hit")),
+        ("history_cache_lookups_total", ("result", "miss")),
+        ("tool_cache_lookups_total", ("result", "hit")),
+        ("tool_cache_lookups_total", ("result", "miss")),
+        ("tool_cache_lookups_total", ("result", "bypassed")),
+    ]
+    before = snapshot(*series)
+    history = HistoryService(cache=InMemoryHistoryCache(max_sessions=10, idle_seconds=60))
+    tools = ToolResultCache(ttls={"get_orders": 60}, shared=InMemorySharedState())
+
+    async def fetch():
+        return "orders"
+
+    for _ in range(2):
+        await history.load(db.get_pool(), 10**9)
+        await tools.call("get_orders", {"page": 1}, fetch)
+    await tools.call("create_order", {}, fetch)
+
+    moved = {key: value - before[key] for key, value in snapshot(*series).items()}
+    assert list(moved.values()) == [1, 1, 1, 1, 1]
+    assert sample("history_cache_sessions") == 1
+    assert sample("tool_cache_entries") == 1
+    exposition = render().decode()
+    assert 'history_cache_lookups_total{result="hit"}' in exposition
+    assert 'tool_cache_lookups_total{result="miss"}' in exposition
+
+
+def test_multiprocess_mode_sums_workers(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    record = "from core.metrics import LLM_ERRORS; LLM_ERRORS.inc(2)"
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", record], env=env, check=True)
+
+    rendered = subprocess.run(
+        [sys.executable, "-c", "import sys; from core.metrics import render; sys.stdout.write(render().decode())"],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+
+    assert "llm_errors_total 4.0" in rendered
+
+
+def test_gunicorn_config_only_clears_metric_files(tmp_path):
+    (tmp_path / "counter_1234.db").write_bytes(b"stale")
+    (tmp_path / "notes.txt").write_text("not ours")
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path), "WEB_CONCURRENCY": "1"}
+
+    config = os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py")
+    subprocess.run([sys.executable, "-c", f"import runpy; runpy.run_path({config!r})"], env=env, check=True)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["notes.txt"]
@@ -0,0 +1,73 @@
+import os
+from urllib.parse import quote
+import asyncpg
+import pytest
+from config.settings import get_settings
+from core.database import connect_for_migrations
+from models.models import ConcurrentIndex, apply_migrations, run_migrations
+
+settings = get_settings()
+
+
+@pytest.fixture
+async def scratch_table(databases):
+    """An empty table plus a migration scope of its own"""
+    db, _ = databases
+    pool = db.get_pool()
+    suffix = os.urandom(4).hex()
+    table, scope = f"scratch_{suffix}", f"test-{suffix}"
+    async with pool.acquire() as conn:
+        await conn.execute(f"CREATE TABLE {table} (value INTEGER)")
+    yield pool, table, scope
+    async with pool.acquire() as conn:
+        await conn.execute(f"DROP TABLE {table}")
+        await conn.execute("DELETE FROM schema_migrations WHERE scope = $1", scope)
+
+
+async def test_concurrent_index_replaces_invalid_leftover(scratch_table):
+    pool, table, scope = scratch_table
+    index = ConcurrentIndex(f"idx_{table}_value", f"ON {table} (value)")
+    async with pool.acquire() as conn:
+        # A failed concurrent build leaves an invalid index behind
+        await conn.execute(f"INSERT INTO {table} VALUES (1), (1)")
+        with pytest.raises(asyncpg.UniqueViolationError):
+            await conn.execute(f"CREATE UNIQUE INDEX CONCURRENTLY {index.name} ON {table} (value)")
+
+    async with pool.acquire() as conn:
+        await apply_migrations(conn, [(1, "index value", [index])], scope)
+
+    async with pool.acquire() as conn:
+        valid = await conn.fetchval("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", index.name)
+        unique = await conn.fetchval("SELECT indisunique FROM pg_index WHERE indexrelid = to_regclass($1)", index.name)
+        applied = await conn.fetchval("SELECT count(*) FROM schema_migrations WHERE scope = $1", scope)
+    assert valid is True
+    assert unique is False
+    assert applied == 1
+
+
+async def test_migration_lock_is_released(scratch_table):
+    pool, table, scope = scratch_table
+    async with pool.acquire() as conn:
+        await apply_migrations(conn, [(1, "add column", [f"ALTER TABLE {table} ADD COLUMN note TEXT"])], scope)
+
+    async with pool.acquire() as conn:
+        held = await conn.fetchval("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory'")
+    assert held == 0
+
+
+@pytest.mark.parametrize("vector", [False, True])
+async def test_migrations_connect_through_the_migrations_dsn(postgres, databases, monkeypatch, vector):
+    dsn = (
+        f"postgresql://{postgres['user']}@/{postgres['database']}"
+        f"?host={quote(postgres['host'], safe='')}&port={postgres['port']}&application_name=migrations"
+    )
+    monkeypatch.setattr(settings, "MIGRATIONS_DSN", dsn)
+
+    conn = await connect_for_migrations(vector)
+    try:
+        # The vector store shares the chat database here, so both use MIGRATIONS_DSN
+        assert await conn.fetchval("SELECT current_setting('application_name')") == "migrations"
+    finally:
+        await conn.close()
+    # Already applied: a no-op that leaves no lock behind
+    await run_migrations()
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import pytest
+from core.shared_state import InMemorySharedState, create_shared_state
+
+
+@pytest.fixture(params=["memory", "postgres"])
+def backend(request):
+    """Each shared state backend, the postgres one on the test chat database"""
+    state = create_shared_state(request.param)
+    if state.shared:
+        db, _ = request.getfixturevalue("databases")
+        state.pool = db.get_pool()
+    return state
+
+
+def unique_key(name: str) -> str:
+    return f"test:{name}:{os.urandom(4).hex()}"
+
+
+async def test_values_round_trip_and_can_be_deleted(backend):
+    key = unique_key("round-trip")
+    value = {"tools": ["a", "b"], "version": 1.5, "nested": {"ok": True}}
+
+    assert await backend.get(key) is None
+    await backend.set(key, value)
+    assert await backend.get(key) == value
+
+    await backend.set(key, [1, 2])
+    assert await backend.get(key) == [1, 2]
+
+    await backend.delete(key)
+    assert await backend.get(key) is None
+
+
+async def test_entries_expire_after_their_ttl(backend):
+    expiring, lasting = unique_key("expiring"), unique_key("lasting")
+    await backend.set(expiring, "soon gone", ttl=0.1)
+    await backend.set(lasting, "kept")
+
+    assert await backend.get(expiring) == "soon gone"
+    await asyncio.sleep(0.2)
+
+    assert await backend.get(expiring) is None
+    assert await backend.get(lasting) == "kept"
+
+
+async def test_memory_backend_drops_least_recently_used_entries():
+    state = InMemorySharedState(max_entries=2)
+    await state.set("a", 1)
+    await state.set("b", 2)
+    await state.get("a")
+    await state.set("c", 3)
+
+    assert [await state.get(key) for key in ("a", "b", "c")] == [1, None, 3]
+    assert state.stats() == {"backend": "InMemorySharedState", "shared": False, "entries": 2}
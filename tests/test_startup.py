@@ -0,0 +1,9 @@
+from benchmarks.bench_startup import DEFERRED_MODULES, IMPORT_BUDGET_MS, measure_import
+
+
+def test_importing_main_stays_within_budget_and_defers_heavy_modules():
+    runs = [measure_import() for _ in range(3)]
+
+    assert [run["eager"] for run in runs] == [[]] * len(runs), f"imported eagerly, expected deferred: {DEFERRED_MODULES}"
+    # Best of three, so a busy machine does not fail the budget
+    assert min(run["seconds"] for run in runs) * 1000 <= IMPORT_BUDGET_MS
@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from core.shared_state import InMemorySharedState
+from services.tool_cache import ToolResultCache, wrap_tools
+
+
+@pytest.fixture
+async def cached_tools(fake_mcp):
+    """The fake server's tools wrapped in a result cache allowing get_user_orders"""
+    url, calls = fake_mcp
+    client = MultiServerMCPClient({"fake": {"url": url, "transport": "streamable_http"}})
+    cache = ToolResultCache(ttls={"get_user_orders": 60}, shared=InMemorySharedState())
+    tools = {tool.name: tool for tool in wrap_tools(await client.get_tools(), cache)}
+    return tools, cache, calls
+
+
+async def test_identical_concurrent_calls_reach_the_server_once(cached_tools):
+    tools, cache, calls = cached_tools
+
+    results = await asyncio.gather(*(tools["get_user_orders"].ainvoke({"user_id": 7}) for _ in range(5)))
+
+    assert len(set(map(str, results))) == 1
+    assert calls["get_user_orders"] == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+async def test_cancelled_leader_does_not_cancel_waiters(cached_tools):
+    tools, cache, calls = cached_tools
+    leader = asyncio.create_task(tools["get_user_orders"].ainvoke({"user_id": 8}))
+    await asyncio.sleep(0.05)
+    waiters = [asyncio.create_task(tools["get_user_orders"].ainvoke({"user_id": 8})) for _ in range(3)]
+    await asyncio.sleep(0.05)
+
+    leader.cancel()
+    results = await asyncio.gather(*waiters)
+
+    assert leader.cancelled()
+    assert len(results) == 3
+    assert calls["get_user_orders"] == 1
+    # The shared call completed and was cached for later callers
+    await tools["get_user_orders"].ainvoke({"user_id": 8})
+    assert calls["get_user_orders"] == 1
+
+
+async def test_call_is_cancelled_once_every_caller_is_gone():
+    started = asyncio.Event()
+    finished = []
+
+    async def slow_call():
+        started.set()
+        await asyncio.sleep(10)
+        finished.append(True)
+
+    cache = ToolResultCache(ttls={"get_user_orders": 60}, shared=InMemorySharedState())
+    callers = [asyncio.create_task(cache.call("get_user_orders", {"user_id": 1}, slow_call)) for _ in range(2)]
+    await started.wait()
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert not cache._inflight
+    assert not finished
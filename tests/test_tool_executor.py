@@ -0,0 +1,84 @@
+import asyncio
+import time
+import pytest
+from langchain_core.tools import StructuredTool, ToolException
+from services.tool_executor import ToolExecutor, ToolStepTimings, wrap_tools
+
+
+class ConcurrencyProbe:
+    """Tool body that sleeps and records the peak number of overlapping calls"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+
+    async def __call__(self):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            return "done"
+        finally:
+            self.running -= 1
+
+
+def run_config(executor: ToolExecutor, timings: ToolStepTimings = None) -> dict:
+    return {"configurable": {"tool_slots": executor.run_slots(), "tool_timings": timings}}
+
+
+async def test_concurrency_is_capped_per_run():
+    executor = ToolExecutor(max_concurrency=2, timeout=5)
+    probe = ConcurrencyProbe(0.1)
+    config = run_config(executor)
+
+    await asyncio.gather(*(executor.run("probe", probe, config) for _ in range(6)))
+
+    assert probe.peak == 2
+
+
+async def test_runs_do_not_share_slots():
+    executor = ToolExecutor(max_concurrency=2, timeout=5)
+    probe = ConcurrencyProbe(0.2)
+    configs = [run_config(executor) for _ in range(3)]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(executor.run("probe", probe, config) for config in configs for _ in range(2)))
+
+    assert probe.peak == 6
+    assert time.perf_counter() - started < 0.35
+
+
+async def test_timeout_includes_waiting_for_a_slot():
+    executor = ToolExecutor(max_concurrency=1, timeout=0.3)
+    config = run_config(executor)
+    slow = asyncio.create_task(executor.run("slow", ConcurrencyProbe(0.25), config))
+    await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    with pytest.raises(ToolException):
+        # Waits ~0.24s for the slot, then would need another 1s
+        await executor.run("queued", ConcurrencyProbe(1.0), config)
+
+    assert time.perf_counter() - started < 0.45
+    assert await slow == "done"
+    assert executor.stats()["timeouts"] == 1
+
+
+async def test_wrapped_tools_use_the_run_config():
+    executor = ToolExecutor(max_concurrency=1, timeout=5)
+    probe = ConcurrencyProbe(0.05)
+
+    async def lookup(query: str) -> str:
+        """Look something up"""
+        return await probe()
+
+    tool = wrap_tools([StructuredTool.from_function(coroutine=lookup)], executor)[0]
+    timings = ToolStepTimings()
+    config = run_config(executor, timings)
+
+    results = await asyncio.gather(*(tool.ainvoke({"query": str(idx)}, config=config) for idx in range(3)))
+
+    assert results == ["done"] * 3
+    assert probe.peak == 1
+    assert [call["status"] for call in timings.calls] == ["ok"] * 3
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import time
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from config.settings import get_settings
+from core.tracing import OpenTelemetrySpanExporter, Span, SpanExporter, TraceMiddleware, Tracer
+
+settings = get_settings()
+
+
+class RecordingExporter(SpanExporter):
+    def __init__(self):
+        self.ended = []
+
+    def on_end(self, span: Span):
+        self.ended.append(span)
+
+
+async def test_root_span_ends_after_the_streamed_body():
+    exporter = RecordingExporter()
+    body_done = []
+
+    async def chunks():
+        for chunk in ("one ", "two"):
+            await asyncio.sleep(0.05)
+            yield chunk
+        body_done.append(time.time())
+
+    app = FastAPI()
+    app.add_middleware(TraceMiddleware, tracer=Tracer(enabled=True, sample_rate=1.0, exporter=exporter))
+    app.get("/stream")(lambda: StreamingResponse(chunks(), media_type="text/plain"))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/stream")
+
+    [root] = exporter.ended
+    assert response.text == "one two"
+    assert response.headers[settings.TRACE_HEADER] == root.trace_id
+    assert root.name == "GET /stream"
+    assert root.attributes["http.status_code"] == 200
+    assert root.end >= body_done[0]
+
+
+def test_otel_exporter_evicts_spans_that_never_end():
+    exporter = OpenTelemetrySpanExporter()
+    tracer = Tracer(enabled=True, sample_rate=1.0, exporter=exporter)
+    abandoned = Span("abandoned", os.urandom(16).hex(), None, {}, start=time.time() - 2 * settings.TRACING_SPAN_MAX_AGE_SECONDS)
+    exporter.on_start(abandoned)
+
+    with tracer.span("request"):
+        tracer.start_span("callback")
+
+    assert abandoned.span_id not in exporter._spans
+    assert len(exporter._spans) == 1
@@ -0,0 +1,240 @@
+import asyncio
+import os
+import random
+import pytest
+from prometheus_client import REGISTRY
+from langchain_core.documents import Document
+from config.settings import get_settings
+from core.shared_state import PostgresSharedState
+from services.vector_store_service import EmbeddingCache, QueryResultCache, SearchOptions, VectorStoreService, apply_search_settings
+
+settings = get_settings()
+
+BIG_USER = 981
+SMALL_USER = 982
+SHRUNK_USER = 983
+CACHED_USER = 984
+RARE_SOURCE = {"user_id": BIG_USER, "source": "rare.txt"}
+
+
+def random_unit_vector(rng: random.Random) -> list:
+    vector = [rng.gauss(0, 1) for _ in range(settings.EMBEDDING_DIMENSION)]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+
+@pytest.fixture(scope="module")
+async def corpus(databases):
+    """
+    One user owning most of the table (plus a rare source), one owning a tiny
+    share of it, and one whose documents were mostly deleted after the last
+    ANALYZE, so the planner expects many rows and picks the ANN index.
+    """
+    from services.vector_store_service import vector_store_service as store
+
+    users = (BIG_USER, SMALL_USER, SHRUNK_USER)
+    rng = random.Random(7)
+    for user_id in users:
+        await store.clear_all_documents(user_id)
+    groups = ((BIG_USER, "big.txt", 3000), (BIG_USER, "rare.txt", 20), (SMALL_USER, "small.txt", 30), (SHRUNK_USER, "old.txt", 3000))
+    records = []
+    for user_id, source, count in groups:
+        for idx in range(count):
+            metadata = {"user_id": user_id, "source": source, "chunk_index": idx}
+            records.append((f"user {user_id} {source} chunk {idx}", metadata, random_unit_vector(rng)))
+    async with store.pool.acquire() as conn:
+        # Keep the statistics stale for the shrunk user
+        await conn.execute(f"ALTER TABLE {store.table_name} SET (autovacuum_enabled = false)")
+        await conn.copy_records_to_table(store.table_name, records=records, columns=["content", "metadata", "embedding"])
+        await conn.execute(f"ANALYZE {store.table_name}")
+        await conn.execute(
+            f"DELETE FROM {store.table_name} WHERE user_id = $1 AND (metadata->>'chunk_index')::int >= 20",
+            SHRUNK_USER
+        )
+    yield store, rng
+    for user_id in users:
+        await store.clear_all_documents(user_id)
+    async with store.pool.acquire() as conn:
+        await conn.execute(f"ALTER TABLE {store.table_name} RESET (autovacuum_enabled)")
+
+
+async def exact_top_k(store, embedding: list, filter_metadata: dict, k: int) -> list:
+    async with store.pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_indexscan = off")
+            rows = await conn.fetch(
+                f"SELECT content FROM {store.table_name} WHERE metadata @> $1::jsonb "
+                f"ORDER BY embedding <=> $2::vector LIMIT $3",
+                filter_metadata,
+                embedding,
+                k
+            )
+    return [row['content'] for row in rows]
+
+
+async def search(store, embedding: list, filter_metadata: dict, k: int, options: SearchOptions) -> list:
+    async def embed_query(query):
+        return embedding
+
+    store.query_cache.invalidate_all()
+    original, store.embed_query = store.embed_query, embed_query
+    try:
+        documents = await store.similarity_search("probe", k=k, filter_metadata=filter_metadata, options=options)
+    finally:
+        store.embed_query = original
+    return [document.page_content for document in documents]
+
+
+@pytest.mark.parametrize(
+    "filter_metadata",
+    [{"user_id": SMALL_USER}, {"user_id": BIG_USER}, {"user_id": SHRUNK_USER}, RARE_SOURCE]
+)
+async def test_filtered_approximate_search_recall(corpus, filter_metadata):
+    """Filtered searches keep their recall even when the filter matches a tiny share of the table"""
+    store, rng = corpus
+    k = 5
+    found = expected = 0
+    for _ in range(10):
+        embedding = random_unit_vector(rng)
+        exact = await exact_top_k(store, embedding, filter_metadata, k)
+        approximate = await search(store, embedding, filter_metadata, k, SearchOptions(mode="approximate"))
+        found += len(set(exact) & set(approximate))
+        expected += len(exact)
+
+    assert found / expected >= 0.9
+
+
+async def test_results_are_ranked_by_similarity(corpus):
+    store, rng = corpus
+    embedding = random_unit_vector(rng)
+
+    results = await search(store, embedding, RARE_SOURCE, 5, SearchOptions(mode="approximate"))
+
+    assert results == await exact_top_k(store, embedding, RARE_SOURCE, 5)
+
+
+async def test_batch_search_matches_exact_results_in_query_order(corpus, vector_store):
+    store, _ = corpus
+    fake = vector_store.embedder.embeddings
+    queries = ["first question", "second question", "third question", "fourth question"]
+    filters = [{"user_id": SMALL_USER}, RARE_SOURCE, {"user_id": SHRUNK_USER}, {"user_id": SMALL_USER}]
+    store.query_cache.invalidate_all()
+
+    results = await store.similarity_search_many(queries, k=5, filters=filters, options=SearchOptions(mode="approximate"))
+
+    expected = [await exact_top_k(store, fake.embed_query(query), flt, 5) for query, flt in zip(queries, filters)]
+    assert [[document.page_content for document in documents] for documents in results] == expected
+
+
+async def test_batch_search_counts_scopes_in_one_statement(corpus, vector_store, monkeypatch):
+    store, rng = corpus
+    monkeypatch.setattr(settings, "VECTOR_EXACT_SEARCH_MAX_ROWS", 100)
+    filters = [{"user_id": BIG_USER}, {"user_id": SMALL_USER}, RARE_SOURCE, {"user_id": SHRUNK_USER}] * 2
+    queries = [f"scope question {idx}" for idx in range(len(filters))]
+    await store.embed_queries(queries)
+    await store.embedding_cache.flush()
+    store.query_cache.invalidate_all()
+    labels = {"pool": "vector", "operation": "SELECT"}
+    before = REGISTRY.get_sample_value("db_query_seconds_count", labels) or 0.0
+
+    await store.similarity_search_many(queries, k=5, filters=filters, options=SearchOptions(mode="approximate"))
+
+    # One scope count for all eight queries, then the approximate batch (the big
+    # user: set_config, search) and the exact batch (indexscan off, set_config, search)
+    assert REGISTRY.get_sample_value("db_query_seconds_count", labels) - before == 6
+
+
+@pytest.mark.parametrize("k", [0, -1, 10_000])
+async def test_search_rejects_out_of_range_k(client_for, databases, k):
+    db, _ = databases
+    async with client_for(db.get_pool(), None) as client:
+        response = await client.post(f"{settings.API_V1_PREFIX}/documents/search", json={"queries": ["q"], "k": k})
+
+    assert response.status_code == 422
+
+
+async def test_oversample_widens_the_index_scan(databases):
+    _, vector_db = databases
+    options = SearchOptions(mode="oversample", ef_search=40, probes=2).resolve()
+    async with vector_db.get_pool().acquire() as conn:
+        async with conn.transaction():
+            await apply_search_settings(conn, options, options.fetch_count(5))
+            ef_search = await conn.fetchval("SELECT current_setting('hnsw.ef_search')")
+            probes = await conn.fetchval("SELECT current_setting('ivfflat.probes')")
+
+    assert options.fetch_count(5) == 5 * settings.VECTOR_OVERSAMPLE_FACTOR
+    assert int(ef_search) == 40 * settings.VECTOR_OVERSAMPLE_FACTOR
+    assert int(probes) == 2 * settings.VECTOR_OVERSAMPLE_FACTOR
+
+
+async def test_query_cache_is_invalidated_across_workers(databases, vector_store):
+    db, vector_db = databases
+    state = PostgresSharedState()
+    await state.initialize(db.get_pool())
+    # Two service instances with their own caches stand in for two worker processes
+    workers = []
+    for _ in range(2):
+        worker = VectorStoreService()
+        worker.query_cache = QueryResultCache(max_size=100, state=state)
+        worker.embedder = vector_store.embedder
+        await worker.initialize(vector_db.get_pool())
+        workers.append(worker)
+    searcher, ingester = workers
+    scope = {"user_id": CACHED_USER}
+    await ingester.clear_all_documents(CACHED_USER)
+    await ingester.add_documents([Document(page_content="cached chunk", metadata={"user_id": CACHED_USER, "source": "c.txt"})])
+
+    assert len(await searcher.similarity_search("cached chunk", k=2, filter_metadata=scope)) == 1
+    assert len(await searcher.similarity_search("cached chunk", k=2, filter_metadata=scope)) == 1
+    assert searcher.query_cache.hits == 1
+
+    await ingester.clear_all_documents(CACHED_USER)
+
+    assert await searcher.similarity_search("cached chunk", k=2, filter_metadata=scope) == []
+    for worker in workers:
+        await worker.shutdown()
+
+
+async def test_embedding_cache_writes_in_the_background_and_expires(databases, monkeypatch):
+    _, vector_db = databases
+    pool = vector_db.get_pool()
+    cache = EmbeddingCache(persistent=True, ttl_seconds=3600)
+    cache.pool = pool
+    writes = []
+    write = cache._write
+
+    async def recording_write(items):
+        writes.append(len(items))
+        await write(items)
+
+    monkeypatch.setattr(cache, "_write", recording_write)
+    keys = [EmbeddingCache.make_key(f"expiring {os.urandom(4).hex()}", "query") for _ in range(3)]
+    embedding = [1.0] + [0.0] * (settings.EMBEDDING_DIMENSION - 1)
+
+    async def stored() -> int:
+        async with pool.acquire() as conn:
+            return await conn.fetchval(f"SELECT count(*) FROM {cache.table_name} WHERE cache_key = ANY($1::text[])", keys)
+
+    for key in keys:
+        cache.put_later({key: embedding})
+    assert await stored() == 0
+    assert await cache.get_many(keys) == {key: embedding for key in keys}
+    await cache.flush()
+    # Misses queued before the writer ran go out in one statement
+    assert writes == [3]
+    assert await stored() == 3
+
+    async with pool.acquire() as conn:
+        await conn.execute(
+            f"UPDATE {cache.table_name} SET created_at = now() - interval '2 hours' WHERE cache_key = ANY($1::text[])",
+            keys[:2]
+        )
+    await cache.initialize(pool)
+    for _ in range(100):
+        if cache.evicted:
+            break
+        await asyncio.sleep(0.05)
+    await cache.close()
+
+    assert cache.evicted == 2
+    assert await stored() == 1